@@ -1,16 +1,36 @@
+# Only hook registration happens at import; everything else loads on first
+# use so the add-on adds as little as possible to Anki's startup.
+import time
+
+_start = time.perf_counter()
+
 from pathlib import Path
+import hashlib
+import json
 import re
 from aqt import mw, gui_hooks
 from aqt.qt import QAction, QMessageBox
 from aqt.editor import Editor
 from aqt.webview import WebContent
 
-from .shiki import store, get_config, generate_config_json
-from .settings import show_settings
+from . import timing
 
 ADDON_DIR = Path(__file__).parent
+# Shared across profiles; user_files survives add-on updates
+OBJECTS_DIR = ADDON_DIR / "user_files" / "objects"
+# The renderer imports CONFIG_FILE, which re-exports a content-hashed module
+CONFIG_FILE = "_config.js"
+# Renderer file names by the names templates use, written by the build
+ASSETS = "assets.json"
+# Published files with a content hash in their name (and the fixed names
+# earlier versions used); media copies the add-on no longer has are pruned
+HASHED = ("_config-*.js", "_tokens-*.css", "_review*.js", "_review*.css")
+# Seconds between connectivity checks while downloads wait for the network
+RETRY_INTERVAL = 120
 NOTETYPE = "Anki Markdown"
 NOTETYPE_CLOZE = "Anki Markdown Cloze"
+# Hidden field holding pre-rendered HTML when `prerender` is on (basic notes only)
+SNAPSHOT_FIELD = "Rendered"
 MENU = "Anki Markdown"
 
 
@@ -49,18 +69,35 @@ def html_to_markdown(content: str) -> str:
 
 
 def on_munge_html(txt: str, editor: Editor) -> str:
-    """Convert HTML to markdown before saving."""
+    """Convert HTML to markdown before saving, and queue the note's snapshot."""
     if not editor.note:
         return txt
-    if not is_anki_markdown(editor.note.note_type()):
+    notetype = editor.note.note_type()
+    if not is_anki_markdown(notetype):
         return txt
+    if notetype["name"] == NOTETYPE and has_snapshot(notetype):
+        from .prerender import schedule
+
+        schedule(editor)
     return html_to_markdown(txt)
 
 
+def show_settings():
+    from .settings import show_settings
+
+    show_settings()
+
+
 def on_profile_loaded():
     # Download any missing language/theme files
-    _, errors = store.sync(get_config())
-    if errors:
+    with timing.span("shiki sync"):
+        from .shiki import store, get_config, forget_config
+
+        _, errors = store.sync(get_config(), backoff=True)
+    if store.waiting():
+        # Offline: finish quietly once the network is back instead of nagging
+        retry_downloads()
+    elif errors:
         details = "\n".join(f"- {err}" for err in errors)
         QMessageBox.warning(
             mw,
@@ -70,18 +107,63 @@ def on_profile_loaded():
             f"{details}",
         )
     # Sync all media files to collection.media
-    sync_media()
+    with timing.span("media sync"):
+        sync_media(publish_config())
     # Create/update note types with current config
-    ensure_notetype()
-    ensure_cloze_notetype()
+    with timing.span("note types"):
+        ensure_notetype()
+        ensure_cloze_notetype()
     # Register web exports and settings action
     mw.addonManager.setWebExports(__name__, r"(web/.*|_.*)")
     mw.addonManager.setConfigAction(__name__, show_settings)
+    mw.addonManager.setConfigUpdatedAction(__name__, forget_config)
     add_menu()
 
 
+_retry_timer = None
+
+
+def retry_downloads():
+    """Poll esm.sh in the background and download what failed offline once it answers."""
+    global _retry_timer
+    if _retry_timer:
+        return
+    from .shiki import store, get_config
+
+    busy = False
+
+    def tick():
+        nonlocal busy
+        if busy or not mw.col:
+            return
+        busy = True
+        config = get_config()
+        mw.taskman.run_in_background(lambda: store.retry(config), done)
+
+    def done(future):
+        global _retry_timer
+        nonlocal busy
+        busy = False
+        try:
+            downloaded = future.result()
+        except Exception:
+            return
+        if downloaded is None:
+            return
+        _retry_timer.stop()
+        _retry_timer = None
+        if downloaded and mw.col:
+            # New themes change the token stylesheet
+            sync_media(publish_config())
+
+    _retry_timer = mw.progress.timer(RETRY_INTERVAL * 1000, tick, True, False, parent=mw)
+
+
 def sync_media(removed: list[str] = None):
-    """Copy web assets to collection.media (force overwrite).
+    """Materialize web assets in collection.media from the shared object store.
+
+    Files already linked to the current object cost a stat, so switching
+    profiles is near-instant and every profile shares one copy on disk.
 
     Args:
         removed: Optional list of filenames that were removed and should be deleted.
@@ -96,10 +178,58 @@ def sync_media(removed: list[str] = None):
                 media_file.unlink()
 
     # Sync current files
-    files = [f for f in ADDON_DIR.glob("_*") if f.is_file()]
-    mw.col.media.trash_files([f.name for f in files])
-    for file in files:
-        mw.col.media.add_file(str(file))
+    from .objects import ObjectStore
+    from .shiki import store
+
+    files = [f for f in [*ADDON_DIR.glob("_*"), *store.dir.glob("_*")] if f.is_file()]
+    ObjectStore(OBJECTS_DIR).materialize(files, media_dir)
+
+    # Hashed files this or another add-on version left in the media folder
+    current = {f.name for f in files}
+    for pattern in HASHED:
+        for media_file in media_dir.glob(pattern):
+            if media_file.name not in current:
+                media_file.unlink()
+
+
+def publish_config() -> list[str]:
+    """Write the config as `_config-<hash>.js` plus the `_config.js` pointer.
+
+    The hashed module never changes, so webviews can cache it; only the
+    one-line pointer changes with the config. With `classes` on, the theme
+    token colors go to `_tokens-<hash>.css` and the config names it along
+    with the colors it covers. Returns stale files removed.
+    """
+    from .shiki import generate_config_json, get_config, store, token_css
+
+    extra = {}
+    config = get_config()
+    colors = store.token_colors(config) if config.get("classes") else None
+    if colors:
+        css = token_css(colors["light"], colors["dark"])
+        sheet = f"_tokens-{hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]}.css"
+        write_if_changed(ADDON_DIR / sheet, css)
+        extra["tokens"] = {"href": sheet, **colors}
+
+    module = f"export default {generate_config_json(**extra)};\n"
+    name = f"_config-{hashlib.sha256(module.encode('utf-8')).hexdigest()[:12]}.js"
+    write_if_changed(ADDON_DIR / name, module)
+    write_if_changed(ADDON_DIR / CONFIG_FILE, f'export {{ default }} from "./{name}";\n')
+
+    current = {name, extra.get("tokens", {}).get("href")}
+    removed = []
+    for stale in [*ADDON_DIR.glob("_config-*.js"), *ADDON_DIR.glob("_tokens-*.css")]:
+        if stale.name not in current:
+            stale.unlink()
+            removed.append(stale.name)
+    return removed
+
+
+def write_if_changed(path: Path, text: str):
+    """Leave unchanged files alone so their mtime (and media sync state) holds."""
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return
+    path.write_text(text, encoding="utf-8")
 
 
 def add_menu():
@@ -115,14 +245,39 @@ def add_menu():
     mw._anki_md_menu = act
 
 
-def get_template(name: str) -> str:
-    """Read template and inject current config."""
+_SNAPSHOT_RE = re.compile(r"^<!-- snapshot: (\w+) -->\n", re.MULTILINE)
+
+
+def get_template(name: str, snapshot: bool = False) -> str:
+    """Read a template, pointing it at the current content-hashed renderer files.
+
+    Config lives in `_config.js`, so templates only change with the renderer.
+    With snapshot=True, the note's pre-rendered field is shown ahead of the
+    live wrapper.
+    """
     template = read(f"templates/{name}")
-    config_json = generate_config_json()
-    # Inject config JSON into template
-    config_script = f'<script type="application/json" id="anki-md-config">{config_json}</script>'
-    # Insert config script at the beginning of template
-    return config_script + "\n" + template
+    for plain, hashed in asset_names().items():
+        template = template.replace(f"./{plain}", f"./{hashed}")
+    host = f'<div class="anki-md-snapshots" data-side="\\1">{{{{{SNAPSHOT_FIELD}}}}}</div>\n' if snapshot else ""
+    return _SNAPSHOT_RE.sub(host, template)
+
+
+def has_snapshot(model: dict) -> bool:
+    return any(f["name"] == SNAPSHOT_FIELD for f in model["flds"])
+
+
+def asset_names() -> dict[str, str]:
+    """Hashed renderer file names from the build; empty for unhashed dev builds."""
+    try:
+        return json.loads(read(ASSETS))
+    except (OSError, ValueError):
+        return {}
+
+
+def save_if_changed(mm, model: dict, before: str):
+    """Save a note type only if it changed, so Anki doesn't sync it to every device."""
+    if json.dumps(model, sort_keys=True) != before:
+        mm.save(model)
 
 
 DEFAULT_CSS = (
@@ -149,16 +304,34 @@ DEFAULT_CSS = (
 )
 
 
-def ensure_notetype():
+def add_snapshot_field(mm, model: dict):
+    """Add the collapsed, unsearched field snapshots are stored in."""
+    field = mm.new_field(SNAPSHOT_FIELD)
+    field["collapsed"] = True
+    field["excludeFromSearch"] = True
+    mm.add_field(model, field)
+
+
+def ensure_notetype(add_snapshot: bool = False):
+    """Create or update the note type.
+
+    add_snapshot adds the snapshot field to an existing note type. That is a
+    schema change (Anki asks before the next one-way sync), so only the
+    settings dialog asks for it; disabling prerender later keeps the field.
+    """
     mm = mw.col.models
     m = mm.by_name(NOTETYPE)
 
     if m:
-        m["tmpls"][0]["qfmt"] = get_template("front.html")
-        m["tmpls"][0]["afmt"] = get_template("back.html")
+        before = json.dumps(m, sort_keys=True)
+        if add_snapshot and not has_snapshot(m):
+            add_snapshot_field(mm, m)
+        snapshot = has_snapshot(m)
+        m["tmpls"][0]["qfmt"] = get_template("front.html", snapshot)
+        m["tmpls"][0]["afmt"] = get_template("back.html", snapshot)
         for f in m["flds"]:
             f["plainText"] = True
-        mm.save(m)
+        save_if_changed(mm, m, before)
         return
 
     m = mm.new(NOTETYPE)
@@ -169,10 +342,15 @@ def ensure_notetype():
     back = mm.new_field("Back")
     back["plainText"] = True
     mm.add_field(m, back)
+    from .shiki import get_config
+
+    snapshot = bool(get_config().get("prerender"))
+    if snapshot:
+        add_snapshot_field(mm, m)
 
     t = mm.new_template("Default")
-    t["qfmt"] = get_template("front.html")
-    t["afmt"] = get_template("back.html")
+    t["qfmt"] = get_template("front.html", snapshot)
+    t["afmt"] = get_template("back.html", snapshot)
     mm.add_template(m, t)
 
     mm.add(m)
@@ -197,11 +375,12 @@ def ensure_cloze_notetype():
     m = mm.by_name(NOTETYPE_CLOZE)
 
     if m:
+        before = json.dumps(m, sort_keys=True)
         m["type"] = 1
         m["tmpls"][0]["qfmt"] = get_template("cloze-front.html")
         m["tmpls"][0]["afmt"] = get_template("cloze-back.html")
         fix_cloze_fields(mm, m)
-        mm.save(m)
+        save_if_changed(mm, m, before)
         return
 
     from anki.stdmodels import StockNotetypeKind
@@ -237,7 +416,23 @@ def on_editor_load_note(editor: Editor):
         editor.web.eval("window.ankiMdDeactivate && ankiMdDeactivate()")
 
 
+def on_media_check_did_finish(output):
+    from .media import on_media_check_did_finish
+
+    on_media_check_did_finish(output)
+
+
+def on_reviewer_did_show_question(card):
+    from .prewarm import on_show_question
+
+    on_show_question(card)
+
+
 gui_hooks.profile_did_open.append(on_profile_loaded)
 gui_hooks.editor_will_munge_html.append(on_munge_html)
 gui_hooks.webview_will_set_content.append(on_webview_set_content)
 gui_hooks.editor_did_load_note.append(on_editor_load_note)
+gui_hooks.media_check_did_finish.append(on_media_check_did_finish)
+gui_hooks.reviewer_did_show_question.append(on_reviewer_did_show_question)
+
+timing.record("import", (time.perf_counter() - _start) * 1000)
@@ -0,0 +1,74 @@
+"""Apply a config change by running only the stages it affects.
+
+Saving settings compares the old config with the new one:
+
+- languages (or shallow mode): sync grammars, which also fetches missing
+  themes and retries failed downloads, then clean up unused files
+- themes only: fetch the new themes, then clean up
+- anything: publish the config module and sync media. Flags like cardless
+  and worker reach cards this way, so templates stay as they are
+- prerender: refresh both Anki Markdown note types (the snapshot field
+  changes the basic templates)
+- prerender on, with languages, themes, prerender or classes changed:
+  render snapshots again
+"""
+
+STAGES = ("languages", "themes", "cleanup", "config", "notetypes", "prerender")
+
+
+def flag(config: dict, key: str) -> bool:
+    return bool(config.get(key))
+
+
+def plan(old: dict, new: dict, failed: bool = False) -> list[str]:
+    """Stages that take the add-on from old to new config, in run order.
+
+    failed=True means earlier downloads failed, so grammars sync even if
+    languages are unchanged; saving settings is how users retry.
+    """
+    langs = (
+        failed
+        or set(old.get("languages", [])) != set(new.get("languages", []))
+        or flag(old, "shallow") != flag(new, "shallow")
+    )
+    themes = old.get("themes") != new.get("themes")
+    prerender = flag(old, "prerender") != flag(new, "prerender")
+    # Snapshots hold token markup, inline styles or classes
+    classes = flag(old, "classes") != flag(new, "classes")
+    stages = {
+        "languages": langs,
+        "themes": themes and not langs,
+        "cleanup": langs or themes,
+        "config": old != new or langs,
+        "notetypes": prerender,
+        "prerender": flag(new, "prerender") and (langs or themes or prerender or classes),
+    }
+    return [stage for stage in STAGES if stages[stage]]
+
+
+# Anki glue (lazy-import aqt)
+
+
+def apply(old: dict, new: dict, parent=None) -> tuple[list[str], list[str], list[str]]:
+    """Run the stages plan() picks. Returns (downloaded, removed, errors)."""
+    from aqt import mw
+    from . import ensure_cloze_notetype, ensure_notetype, publish_config, sync_media
+    from .prerender import refresh
+    from .shiki import store
+
+    stages = plan(old, new, failed=bool(store.read_failures()))
+    downloaded, removed, errors = [], [], []
+    if "languages" in stages or "themes" in stages:
+        downloaded, errors = store.sync(new, langs="languages" in stages)
+    if "cleanup" in stages:
+        removed = store.cleanup(new)
+    if "config" in stages:
+        # Removed files are deleted from media too
+        sync_media(removed + publish_config())
+    if "notetypes" in stages:
+        ensure_notetype()
+        ensure_cloze_notetype()
+    if "prerender" in stages:
+        # Snapshots made with the old languages or themes are stale now
+        refresh(parent or mw, fresh=True)
+    return downloaded, removed, errors
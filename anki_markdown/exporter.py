@@ -0,0 +1,257 @@
+"""Export Anki Markdown notes to a directory of markdown files.
+
+Files use the format importer.py reads: frontmatter with the deck (and, with
+one file per note, the tags), then Front, `<!-- back -->` and Back. With one
+file per deck, each note starts with `<!-- note: <note id> -->`, in note id
+order. Decks map to directories, so the layout stays stable and diff-friendly.
+
+Notes are read from the database in chunks of ids and files are streamed to
+disk, so memory doesn't grow with the collection. An index in the target
+directory records each note's mod time and file and each file's hash; later
+exports only read changed notes and only rewrite files whose content changed.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Iterator
+import hashlib
+import html
+import json
+import os
+import re
+
+INDEX = ".anki-markdown-export.json"
+CHUNK = 1000
+LAYOUTS = ("note", "deck")
+# Bump when the file format changes so every file is written again
+FORMAT = 1
+
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_UNSAFE_RE = re.compile(r'[\x00-\x1f/\\:*?"<>|]')
+
+
+def decode(text: str) -> str:
+    """Field HTML to the markdown the renderer sees."""
+    return html.unescape(_BR_RE.sub("\n", text)).strip("\n")
+
+
+def deck_dir(deck: str) -> Path:
+    """Directory for a deck: one safe path component per deck level."""
+    parts = [_UNSAFE_RE.sub("_", part).strip(" .") or "_" for part in deck.split("::")]
+    return Path(*parts)
+
+
+def deck_files(decks: dict[str, int]) -> dict[str, str]:
+    """File for each deck name, given deck ids by name, for one file per deck.
+
+    Names that sanitize to the same path (ignoring case, which some file
+    systems do) get their deck id appended, so no deck overwrites another.
+    """
+    paths = {name: deck_dir(name) for name in decks}
+    taken = Counter(path.as_posix().casefold() for path in paths.values())
+    out = {}
+    for name, path in paths.items():
+        stem = path.name if taken[path.as_posix().casefold()] == 1 else f"{path.name} ({decks[name]})"
+        out[name] = (path.parent / f"{stem}.md").as_posix()
+    return out
+
+
+def render_fields(flds: str) -> str:
+    fields = [decode(text) for text in flds.split("\x1f")] + ["", ""]
+    return f"{fields[0]}\n\n<!-- back -->\n\n{fields[1]}\n" if fields[1] else f"{fields[0]}\n"
+
+
+def render_note(deck: str, tags: str, flds: str) -> str:
+    """One file per note."""
+    meta = f"deck: {deck}\n" + (f"tags: {tags.strip()}\n" if tags.strip() else "")
+    return f"---\n{meta}---\n\n{render_fields(flds)}"
+
+
+def chunks(ids: list[int], size: int) -> Iterator[list[int]]:
+    for i in range(0, len(ids), size):
+        yield ids[i : i + size]
+
+
+class Writer:
+    """Write a file through a temp file, keeping the old one if content is unchanged."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp = path.with_name(f".{path.name}.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = self.tmp.open("w", encoding="utf-8", newline="\n")
+        self.hash = hashlib.sha256()
+
+    def write(self, text: str):
+        self.file.write(text)
+        self.hash.update(text.encode("utf-8"))
+
+    def finish(self, old: str = None) -> tuple[str, bool]:
+        """Returns (content hash, whether the file was written)."""
+        self.file.close()
+        hash = self.hash.hexdigest()
+        if hash == old and self.path.exists():
+            self.tmp.unlink()
+            return hash, False
+        os.replace(self.tmp, self.path)
+        return hash, True
+
+
+class Exporter:
+    """Incremental export into one directory."""
+
+    def __init__(self, target: Path, layout: str = "note"):
+        if layout not in LAYOUTS:
+            raise ValueError(f"unknown layout: {layout}")
+        self.target = target
+        self.layout = layout
+        self.path = target / INDEX
+
+    def read(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"notes": {}, "files": {}}
+        if data.get("format") != FORMAT or data.get("layout") != self.layout:
+            return {"notes": {}, "files": {}}
+        return data
+
+    def write(self, data: dict):
+        self.target.mkdir(parents=True, exist_ok=True)
+        tmp = self.target / f".{INDEX}.tmp"
+        tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def rows(self, db, ids: list[int]) -> Iterator[tuple[int, str, str]]:
+        """(note id, fields, tags) for ids, fetched a chunk at a time, in id order."""
+        for chunk in chunks(sorted(ids), CHUNK):
+            batch = ",".join(str(nid) for nid in chunk)
+            yield from sorted(db.all(f"select id, flds, tags from notes where id in ({batch})"))
+
+    def delete(self, files: dict[str, str], rel: str):
+        files.pop(rel, None)
+        path = self.target / rel
+        path.unlink(missing_ok=True)
+        # Drop directories the export emptied
+        for parent in path.parents:
+            if parent == self.target or not parent.is_relative_to(self.target):
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+    def run(self, db, mids: list[int], decks: dict[int, str], full: bool = False) -> dict[str, int]:
+        """Export notes of the given notetypes.
+
+        `db` is the collection database and `decks` maps deck id to name. A
+        note belongs to the deck of its first card (the home deck, if the card
+        is in a filtered deck). Returns counts of "written", "deleted" and
+        "unchanged" files.
+        """
+        data = {"notes": {}, "files": {}} if full else self.read()
+        seen, files = data["notes"], data["files"]
+        ids = ",".join(str(int(mid)) for mid in mids) or "0"
+        mods = dict(db.all(f"select id, mod from notes where mid in ({ids})"))
+        homes = {
+            nid: did
+            for nid, did, _ord in db.all(
+                "select nid, case when odid then odid else did end, min(ord) from cards"
+                f" where nid in (select id from notes where mid in ({ids})) group by nid"
+            )
+        }
+        deck = {nid: decks.get(homes.get(nid), "Default") for nid in mods}
+        if self.layout == "note":
+            count = self.by_note(db, mods, deck, seen, files)
+        else:
+            ids = {name: did for did, name in decks.items()}
+            count = self.by_deck(db, mods, deck, seen, files, ids)
+        self.write({"format": FORMAT, "layout": self.layout, "notes": seen, "files": files})
+        return count
+
+    def by_note(self, db, mods, deck, seen, files) -> dict[str, int]:
+        count = {"written": 0, "deleted": 0, "unchanged": 0}
+        rel = {nid: (deck_dir(deck[nid]) / f"{nid}.md").as_posix() for nid in mods}
+
+        for key in [key for key in seen if int(key) not in mods]:
+            self.delete(files, seen.pop(key)[1])
+            count["deleted"] += 1
+
+        changed = [nid for nid in mods if seen.get(str(nid)) != [mods[nid], rel[nid]]]
+        count["unchanged"] = len(mods) - len(changed)
+        for nid, flds, tags in self.rows(db, changed):
+            old = seen.get(str(nid))
+            if old and old[1] != rel[nid]:
+                self.delete(files, old[1])
+            out = Writer(self.target / rel[nid])
+            out.write(render_note(deck[nid], tags, flds))
+            files[rel[nid]], written = out.finish(files.get(rel[nid]))
+            count["written" if written else "unchanged"] += 1
+            seen[str(nid)] = [mods[nid], rel[nid]]
+        return count
+
+    def by_deck(self, db, mods, deck, seen, files, ids) -> dict[str, int]:
+        count = {"written": 0, "deleted": 0, "unchanged": 0}
+        paths = deck_files({name: ids.get(name, 0) for name in sorted(set(deck.values()))})
+        rel = {nid: paths[deck[nid]] for nid in mods}
+        members: dict[str, list[int]] = {}
+        for nid, path in rel.items():
+            members.setdefault(path, []).append(nid)
+
+        # Files with an added, edited, moved or deleted note
+        dirty = set()
+        for key, (mod, path) in seen.items():
+            nid = int(key)
+            if nid not in mods or mods[nid] != mod or rel[nid] != path:
+                dirty.add(path)
+        dirty.update(rel[nid] for nid in mods if str(nid) not in seen)
+        count["unchanged"] = len(set(members) - dirty)
+
+        for path in sorted(dirty):
+            if path not in members:
+                self.delete(files, path)
+                count["deleted"] += 1
+                continue
+            nids = members[path]
+            out = Writer(self.target / path)
+            out.write(f"---\ndeck: {deck[nids[0]]}\n---\n")
+            for nid, flds, _tags in self.rows(db, nids):
+                out.write(f"\n<!-- note: {nid} -->\n\n{render_fields(flds)}")
+            files[path], written = out.finish(files.get(path))
+            count["written" if written else "unchanged"] += 1
+
+        data = {str(nid): [mods[nid], rel[nid]] for nid in mods}
+        seen.clear()
+        seen.update(data)
+        return count
+
+
+# Anki glue (lazy-import aqt)
+
+
+def export_collection(col, target: Path, layout: str, full: bool = False) -> dict[str, int]:
+    """Export every Anki Markdown note in a collection. Safe to run in a background op."""
+    from . import NOTETYPE, NOTETYPE_CLOZE
+
+    models = (col.models.by_name(name) for name in (NOTETYPE, NOTETYPE_CLOZE))
+    mids = [model["id"] for model in models if model]
+    decks = {d.id: d.name for d in col.decks.all_names_and_ids()}
+    return Exporter(target, layout).run(col.db, mids, decks, full)
+
+
+def export_folder(parent, target: Path, layout: str):
+    from aqt import mw
+    from aqt.operations import QueryOp
+    from aqt.utils import tooltip
+
+    def done(count):
+        tooltip(
+            f"Wrote {count['written']}, deleted {count['deleted']}, kept {count['unchanged']} file(s).",
+            parent=parent,
+        )
+
+    QueryOp(
+        parent=parent or mw,
+        op=lambda col: export_collection(col, target, layout),
+        success=done,
+    ).with_progress("Exporting notes").run_in_background()
@@ -0,0 +1,318 @@
+"""Import a directory of markdown files as Anki Markdown notes.
+
+Each `.md` file holds one or more notes. An optional frontmatter block sets
+the deck and tags; `<!-- note -->` starts the next note and `<!-- back -->`
+separates Front from Back (or Text from Extra, for notes with cloze tags):
+
+    ---
+    deck: Spanish::Verbs
+    tags: spanish verb
+    ---
+
+    What does **ser** mean?
+
+    <!-- back -->
+
+    To be (permanent traits).
+
+    <!-- note: estar -->
+
+    {{c1::Estar}} is used for temporary states.
+
+A sidecar index records each file's stat and hash and each note's id and
+hash, so a re-import only parses changed files and only writes changed notes.
+"""
+
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+
+# Notes per collection operation
+BATCH = 500
+# Bump when parsing changes so every file is parsed again
+FORMAT = 1
+
+_MARKER_RE = re.compile(r"^<!--\s*(note|back)(?:\s*:\s*(.*?))?\s*-->\s*$")
+_FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_CLOZE_RE = re.compile(r"\{\{c\d+::")
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def frontmatter(lines: list[str]) -> tuple[dict[str, str], list[str]]:
+    """Split a leading `---` block of `key: value` lines from the body."""
+    if not lines or lines[0].strip() != "---":
+        return {}, lines
+    for end in range(1, len(lines)):
+        if lines[end].strip() == "---":
+            meta = {}
+            for line in lines[1:end]:
+                key, sep, value = line.partition(":")
+                if sep:
+                    meta[key.strip().lower()] = value.strip()
+            return meta, lines[end + 1 :]
+    return {}, lines
+
+
+def parse(text: str, rel: str, deck: str) -> list[dict]:
+    """Notes in one file.
+
+    `rel` is the file's path below the import root (it prefixes note keys)
+    and `deck` the deck used when the file doesn't set one. Each note is
+    {"key", "cloze", "fields", "deck", "tags", "hash"}.
+    """
+    meta, lines = frontmatter(text.replace("\r\n", "\n").split("\n"))
+    deck = meta.get("deck") or deck
+    tags = meta.get("tags", "").replace(",", " ").split()
+
+    # Each note as [key, [field lines, ...]]
+    notes: list[list] = [[None, [[]]]]
+    fence = None
+    for line in lines:
+        match = None if fence else _MARKER_RE.match(line)
+        if match and match.group(1) == "note":
+            notes.append([match.group(2) or None, [[]]])
+        elif match and len(notes[-1][1]) < 2:
+            notes[-1][1].append([])
+        else:
+            notes[-1][1][-1].append(line)
+            if m := _FENCE_RE.match(line):
+                if fence is None:
+                    fence = m.group(1)
+                elif m.group(1).startswith(fence) and not line.strip().strip(fence[0]):
+                    fence = None
+
+    out = []
+    seen = set()
+    for n, (key, parts) in enumerate(notes):
+        fields = ["\n".join(part).strip("\n") for part in parts] + [""] * (2 - len(parts))
+        if not fields[0].strip():
+            continue
+        key = f"{rel}#{key or len(out) + 1}"
+        if key in seen:
+            key = f"{key}~{n}"
+        seen.add(key)
+        note = {"key": key, "cloze": bool(_CLOZE_RE.search(fields[0])), "fields": fields, "deck": deck, "tags": tags}
+        note["hash"] = digest(json.dumps(note, sort_keys=True).encode("utf-8"))
+        out.append(note)
+    return out
+
+
+def default_deck(root: Path, rel: Path) -> str:
+    """Deck named after the import root and the file's subdirectories."""
+    return "::".join([root.name or "Default", *rel.parent.parts])
+
+
+def walk(root: Path):
+    """Markdown files below root in a stable order, skipping hidden entries."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for name in sorted(filenames):
+            if name.endswith(".md") and not name.startswith("."):
+                yield Path(dirpath) / name
+
+
+class Plan:
+    """Notes to add, update and remove to bring a collection in line with a directory."""
+
+    def __init__(self):
+        self.add: list[dict] = []
+        # (note id, note)
+        self.update: list[tuple[int, dict]] = []
+        # Note id by key
+        self.remove: dict[str, int] = {}
+        self.files: dict[str, list] = {}
+        self.scanned = 0
+        self.parsed = 0
+
+    def __bool__(self):
+        return bool(self.add or self.update or self.remove)
+
+
+class Importer:
+    """Incremental import of one directory, tracked in a JSON sidecar index."""
+
+    def __init__(self, root: Path, path: Path):
+        self.root = root
+        self.path = path
+
+    def read(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {"files": {}, "notes": {}}
+        if data.get("format") != FORMAT or data.get("root") != str(self.root):
+            return {"files": {}, "notes": {}}
+        return data
+
+    def write(self, data: dict):
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def scan(self, full: bool = False) -> Plan:
+        """Compare the directory with the index.
+
+        Unchanged files are only stat'ed; full=True parses every file again.
+        """
+        data = self.read()
+        files, notes = ({} if full else data["files"]), data["notes"]
+        plan = Plan()
+        keys = set()
+
+        for file in walk(self.root):
+            rel = file.relative_to(self.root).as_posix()
+            st = file.stat()
+            now = [st.st_size, st.st_mtime_ns]
+            old = files.get(rel)
+            plan.scanned += 1
+            if old and old[:2] == now:
+                plan.files[rel] = old
+                keys.update(old[3])
+                continue
+            raw = file.read_bytes()
+            hash = digest(raw)
+            if old and old[2] == hash:
+                plan.files[rel] = [*now, hash, old[3]]
+                keys.update(old[3])
+                continue
+
+            plan.parsed += 1
+            parsed = parse(raw.decode("utf-8", "replace"), rel, default_deck(self.root, Path(rel)))
+            for note in parsed:
+                known = notes.get(note["key"])
+                if not known:
+                    plan.add.append(note)
+                elif known[1] != note["hash"]:
+                    plan.update.append((known[0], note))
+            keys.update(note["key"] for note in parsed)
+            plan.files[rel] = [*now, hash, [note["key"] for note in parsed]]
+
+        plan.remove = {key: val[0] for key, val in notes.items() if key not in keys}
+        return plan
+
+    def commit(self, plan: Plan, added: dict[str, int], removed: bool = True):
+        """Record an applied plan.
+
+        `added` maps keys of new (or re-created) notes to their ids. With
+        removed=False the notes were kept, so the next import offers them again.
+        """
+        notes = self.read()["notes"]
+        if removed:
+            for key in plan.remove:
+                notes.pop(key, None)
+        for nid, note in plan.update:
+            notes[note["key"]] = [nid, note["hash"]]
+        for note in plan.add + [note for _nid, note in plan.update]:
+            if note["key"] in added:
+                notes[note["key"]] = [added[note["key"]], note["hash"]]
+        self.write({"format": FORMAT, "root": str(self.root), "files": plan.files, "notes": notes})
+
+
+# Anki glue (lazy-import aqt)
+
+
+def index_path(root: Path) -> Path:
+    """The open profile's index for one import directory."""
+    from aqt import mw
+
+    name = hashlib.sha1(str(root).encode("utf-8")).hexdigest()[:12]
+    return Path(mw.pm.profileFolder()) / f"anki-markdown-import-{name}.json"
+
+
+def apply(col, plan: Plan, remove: bool = True):
+    """Write a plan to the collection as one undoable step.
+
+    Returns (OpChanges, ids of added notes by key). Updated notes that were
+    deleted in Anki or changed between basic and cloze are added again.
+    """
+    from anki.collection import AddNoteRequest
+    from anki.errors import NotFoundError
+    from . import NOTETYPE, NOTETYPE_CLOZE
+
+    models = {False: col.models.by_name(NOTETYPE), True: col.models.by_name(NOTETYPE_CLOZE)}
+    pos = col.add_custom_undo_entry("Import Markdown Folder")
+    add = list(plan.add)
+    drop = list(plan.remove.values()) if remove else []
+    decks: dict[str, int] = {}
+
+    def deck_id(name: str) -> int:
+        if name not in decks:
+            decks[name] = col.decks.id(name)
+        return decks[name]
+
+    moves: dict[int, list[int]] = {}
+    for i in range(0, len(plan.update), BATCH):
+        notes = []
+        for nid, source in plan.update[i : i + BATCH]:
+            try:
+                note = col.get_note(nid)
+            except NotFoundError:
+                add.append(source)
+                continue
+            if note.mid != models[source["cloze"]]["id"]:
+                drop.append(nid)
+                add.append(source)
+                continue
+            note.fields[: len(source["fields"])] = source["fields"]
+            note.tags = source["tags"]
+            notes.append(note)
+            moves.setdefault(deck_id(source["deck"]), []).extend(note.card_ids())
+        if notes:
+            col.update_notes(notes)
+    # The file's deck wins over cards moved in Anki
+    for did, cids in moves.items():
+        col.set_deck(cids, did)
+
+    added: dict[str, int] = {}
+    for i in range(0, len(add), BATCH):
+        requests = []
+        for source in add[i : i + BATCH]:
+            note = col.new_note(models[source["cloze"]])
+            note.fields[: len(source["fields"])] = source["fields"]
+            note.tags = source["tags"]
+            requests.append(AddNoteRequest(note=note, deck_id=deck_id(source["deck"])))
+        col.add_notes(requests)
+        added.update((source["key"], request.note.id) for source, request in zip(add[i : i + BATCH], requests))
+
+    for i in range(0, len(drop), BATCH):
+        col.remove_notes(drop[i : i + BATCH])
+
+    return col.merge_undo_entries(pos), added
+
+
+def import_folder(parent, root: Path):
+    """Import a directory into the open collection, asking before deleting notes."""
+    from aqt import mw
+    from aqt.operations import CollectionOp
+    from aqt.utils import askUser, tooltip
+    from .prerender import refresh
+
+    importer = Importer(root, index_path(root))
+    plan = importer.scan()
+    if not plan:
+        tooltip(f"No changes in {plan.scanned} file(s).", parent=parent)
+        importer.commit(plan, {})
+        return
+    remove = not plan.remove or askUser(
+        f"{len(plan.remove)} note(s) imported from this folder are no longer in it. Delete them from Anki?",
+        parent=parent,
+    )
+    result = {}
+
+    def op(col):
+        changes, result["added"] = apply(col, plan, remove)
+        return changes
+
+    def done(_changes):
+        importer.commit(plan, result["added"], remove)
+        updated = len(plan.update)
+        removed = len(plan.remove) if remove else 0
+        tooltip(f"Added {len(plan.add)}, updated {updated}, removed {removed} note(s).", parent=parent)
+        refresh(parent)
+
+    CollectionOp(parent or mw, op).success(done).run_in_background()
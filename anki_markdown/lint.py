@@ -0,0 +1,188 @@
+"""Collection-wide lint for Anki Markdown notes.
+
+Finds problems the reviewer only reveals one card at a time: code languages
+that aren't installed, malformed cloze tags, and HTML the renderer strips.
+Checks are plain functions over field text, in lint_checks.py, so they can
+run in worker processes; only the glue at the bottom touches Anki.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+from pathlib import Path
+from typing import Optional
+import importlib.util
+import multiprocessing
+import json
+import sys
+import os
+
+# Bump when checks change so cached results are discarded
+RULES = 1
+# Below this many notes, starting workers costs more than it saves
+POOL_MIN = 4000
+CHUNK = 1000
+# Per-profile cache of note mod times and findings
+CACHE = "anki-markdown-lint.json"
+# Workers import the checks by this top-level name from the add-on folder:
+# importing them through the package would run the add-on's __init__, and
+# with it aqt, in every worker
+CHECKS = "lint_checks"
+
+
+def load_checks():
+    """The checks module, registered under the name workers import it by."""
+    path = Path(__file__).with_name(f"{CHECKS}.py")
+    mod = sys.modules.get(CHECKS)
+    if mod is None or getattr(mod, "__file__", None) != str(path):
+        spec = importlib.util.spec_from_file_location(CHECKS, path)
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules[CHECKS] = mod
+        spec.loader.exec_module(mod)
+    return mod
+
+
+checks = load_checks()
+
+
+# Engine
+
+@contextmanager
+def importable(folder: str):
+    """Put folder on sys.path for workers started meanwhile, which copy it.
+
+    Appended, so nothing this process imports meanwhile is shadowed.
+    """
+    added = folder not in sys.path
+    if added:
+        sys.path.append(folder)
+    try:
+        yield
+    finally:
+        if added:
+            sys.path.remove(folder)
+
+
+def pool_ok() -> bool:
+    """Whether worker processes can be spawned from this interpreter.
+
+    Frozen Anki builds run from a binary that can't act as a plain Python.
+    Spawned workers import __main__ again as __mp_main__, which Anki's entry
+    scripts guard against (and `python -m aqt` skips), so only a __main__
+    script that no longer exists rules out a pool.
+    """
+    if getattr(sys, "frozen", False) or not Path(sys.executable).name.lower().startswith("python"):
+        return False
+    main = sys.modules.get("__main__")
+    path = getattr(main, "__file__", None)
+    return getattr(main, "__spec__", None) is not None or not path or Path(path).is_file()
+
+
+def lint(
+    rows: list[tuple[int, int, str]],
+    models: dict[int, tuple[list[str], bool]],
+    langs: frozenset[str],
+    workers: Optional[int] = None,
+) -> dict[int, list[str]]:
+    """Lint rows, spreading chunks across a process pool for large batches.
+
+    Returns problems keyed by note id, for notes that have any.
+    """
+    chunks = [rows[i : i + CHUNK] for i in range(0, len(rows), CHUNK)]
+    if workers is None:
+        workers = (os.cpu_count() or 1) if len(rows) >= POOL_MIN and pool_ok() else 1
+    workers = min(workers, len(chunks))
+
+    out: dict[int, list[str]] = {}
+    if workers > 1:
+        try:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+                # map() submits every chunk, starting the workers, before it returns
+                with importable(str(Path(__file__).parent)):
+                    parts = pool.map(checks.check_chunk, chunks, repeat(models), repeat(langs))
+                for part in parts:
+                    out.update(part)
+            return out
+        except Exception:
+            # Broken or unavailable pool: lint in this process instead
+            out.clear()
+
+    for chunk in chunks:
+        out.update(checks.check_chunk(chunk, models, langs))
+    return out
+
+
+class Linter:
+    """Incremental lint: only notes whose mod time changed since the last run are checked."""
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def read(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def write(self, data: dict):
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def run(
+        self,
+        db,
+        models: dict[int, tuple[list[str], bool]],
+        langs: frozenset[str],
+        full: bool = False,
+    ) -> tuple[dict[int, list[str]], int]:
+        """Lint notes of the given notetypes.
+
+        `db` is the collection database (`all()` returning rows). Results
+        are cached; a change of rules, languages or fields re-lints all.
+        Returns (problems keyed by note id, number of notes checked).
+        """
+        if not models:
+            return {}, 0
+        key = [RULES, sorted(langs), {str(mid): list(val) for mid, val in sorted(models.items())}]
+        data = self.read()
+        seen = {} if full or data.get("key") != key else data.get("notes", {})
+        mids = ",".join(str(int(mid)) for mid in models)
+        mods = {nid: mod for nid, mod in db.all(f"select id, mod from notes where mid in ({mids})")}
+        changed = [nid for nid, mod in mods.items() if seen.get(str(nid), [None])[0] != mod]
+
+        rows: list[tuple[int, int, str]] = []
+        if len(changed) == len(mods):
+            rows = [tuple(row) for row in db.all(f"select id, mid, flds from notes where mid in ({mids})")]
+        else:
+            for i in range(0, len(changed), CHUNK):
+                ids = ",".join(str(nid) for nid in changed[i : i + CHUNK])
+                rows.extend(tuple(row) for row in db.all(f"select id, mid, flds from notes where id in ({ids})"))
+
+        found = lint(rows, models, langs)
+        notes = {nid: val for nid, val in seen.items() if int(nid) in mods}
+        for nid, _mid, _flds in rows:
+            notes[str(nid)] = [mods[nid], found.get(nid, [])]
+        self.write({"key": key, "notes": notes})
+
+        return {int(nid): val[1] for nid, val in notes.items() if val[1]}, len(rows)
+
+
+# Anki glue (lazy-import aqt)
+
+def lint_collection(full: bool = False) -> tuple[dict[int, list[str]], int]:
+    """Lint every Anki Markdown note in the open collection."""
+    from aqt import mw
+    from . import NOTETYPE, NOTETYPE_CLOZE, SNAPSHOT_FIELD
+    from .shiki import store
+
+    models = {}
+    for name in (NOTETYPE, NOTETYPE_CLOZE):
+        model = mw.col.models.by_name(name)
+        if model:
+            names = [None if f["name"] == SNAPSHOT_FIELD else f["name"] for f in model["flds"]]
+            models[model["id"]] = (names, name == NOTETYPE_CLOZE)
+
+    linter = Linter(Path(mw.pm.profileFolder()) / CACHE)
+    return linter.run(mw.col.db, models, frozenset(store.known_langs()), full)
@@ -0,0 +1,133 @@
+"""Checks behind the collection lint, one field's text at a time.
+
+Worker processes import this module on its own, by this top-level name from
+the add-on folder, so it must not import the add-on package.
+"""
+
+from typing import Optional
+import html
+import re
+
+# Mirrors ALLOWED in src/render.ts: every other tag is dropped when rendering
+ALLOWED = re.compile(r"^</?(img|a|b|i|em|strong|br|kbd)(\s[^>]*)?>$", re.IGNORECASE)
+
+_FENCE_RE = re.compile(
+    r"^ {0,3}(?P<fence>`{3,}|~{3,})[ \t]*(?P<lang>[^\s`]*)[^\n]*\n.*?(?:^ {0,3}(?P=fence)[`~]*[ \t]*$|\Z)",
+    re.MULTILINE | re.DOTALL,
+)
+_CODE_RE = re.compile(r"(?<!`)(`+)(?!`).+?(?<!`)\1(?!`)(?:\{\.?(?P<lang>[^{}\s]+)\})?", re.DOTALL)
+_TAG_RE = re.compile(r"<!--.*?-->|</?(?P<name>[A-Za-z][A-Za-z0-9-]*)(?:\s[^<>]*)?/?>", re.DOTALL)
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_CLOZE_RE = re.compile(r"\{\{c(?P<ords>[\d,]+)::|::|\}\}")
+
+
+# Checks
+
+def cloze_tags(text: str) -> tuple[set[int], list[str]]:
+    """Scan cloze markup the way src/cloze.ts parses it.
+
+    Returns (ordinals of closed tags, opening markers of unclosed tags).
+    """
+    found: set[int] = set()
+    # Open tags as [ords, marker, in hint]
+    stack: list[list] = []
+    # Start of the current text run
+    run = 0
+    pos = 0
+
+    while match := _CLOZE_RE.search(text, pos):
+        token = match.group()
+        top = stack[-1] if stack else None
+        at = match.start()
+        pos = at + 1
+
+        if match.group("ords") is not None and not (top and top[2]):
+            ords = {int(n) for n in match.group("ords").split(",") if n}
+            if ords:
+                stack.append([ords, token, False])
+                pos = run = match.end()
+        elif token == "::" and top and not top[2]:
+            top[2] = True
+            pos = run = match.end()
+        elif token == "}}" and top:
+            # `code`{js}}}: the first } closes {lang}, the next two the cloze
+            inside = text.rfind("{", run, at) > max(text.rfind("}", run, at), text.rfind("\n", run, at))
+            if inside and text.startswith("}", match.end()):
+                run = pos
+                continue
+            stack.pop()
+            found |= top[0]
+            pos = run = match.end()
+
+    return found, [tag[1] for tag in stack]
+
+
+def check_field(text: str, langs: frozenset[str], cloze: bool = False) -> list[str]:
+    """Problems in one field's markdown source."""
+    problems = []
+    # Decode the way the reviewer does before rendering
+    text = html.unescape(_BR_RE.sub("\n", text))
+
+    if cloze:
+        ords, unclosed = cloze_tags(text)
+        problems.extend(f"unclosed cloze {marker}" for marker in unclosed)
+        if not ords:
+            problems.append("no cloze deletions")
+        elif missing := sorted(set(range(1, max(ords) + 1)) - ords):
+            problems.append(f"cloze numbers skip {', '.join(f'c{n}' for n in missing)}")
+
+    used = []
+    rest = []
+    last = 0
+    for match in _FENCE_RE.finditer(text) if "```" in text or "~~~" in text else ():
+        used.append(match.group("lang"))
+        rest.append(text[last : match.start()])
+        last = match.end()
+    rest.append(text[last:])
+    text = "\n".join(rest)
+
+    rest = []
+    last = 0
+    for match in _CODE_RE.finditer(text) if "`" in text else ():
+        used.append(match.group("lang") or "")
+        rest.append(text[last : match.start()])
+        last = match.end()
+    rest.append(text[last:])
+    text = " ".join(rest)
+
+    for name in dict.fromkeys(used):
+        if name and name != "text" and name not in langs:
+            problems.append(f"language not installed: {name}")
+
+    stripped = dict.fromkeys(
+        f"<{match.group('name').lower()}>" if match.group("name") else "<!-- -->"
+        for match in (_TAG_RE.finditer(text) if "<" in text else ())
+        if not ALLOWED.match(match.group())
+    )
+    if stripped:
+        problems.append(f"HTML removed when rendering: {', '.join(stripped)}")
+
+    return problems
+
+
+def check_chunk(
+    rows: list[tuple[int, int, str]],
+    models: dict[int, tuple[list[Optional[str]], bool]],
+    langs: frozenset[str],
+) -> dict[int, list[str]]:
+    """Lint (note id, notetype id, joined fields) rows. Runs in worker processes.
+
+    Fields named None hold generated HTML, not markdown, and are skipped.
+    """
+    out = {}
+    for nid, mid, flds in rows:
+        names, cloze = models[mid]
+        problems = []
+        for i, text in enumerate(flds.split("\x1f")):
+            name = names[i] if i < len(names) else f"Field {i + 1}"
+            if name is None:
+                continue
+            problems.extend(f"{name}: {problem}" for problem in check_field(text, langs, cloze and i == 0))
+        if problems:
+            out[nid] = problems
+    return out
@@ -0,0 +1,156 @@
+"""Index of media files referenced by Anki Markdown notes.
+
+Notes reference images as `![](file.png)`, which Anki's media check doesn't
+recognize, so it reports those files as unused. The index maps note id to
+referenced files, refreshed incrementally by mod time when a media check
+finishes, and is used to keep them out of the unused list and its report.
+"""
+
+from pathlib import Path
+from urllib.parse import unquote
+import html
+import json
+import os
+import re
+
+# Per-profile index file
+INDEX = "anki-markdown-media.json"
+BATCH = 1000
+
+_IMAGE_RE = re.compile(r"!\[[^\]]*\]\(\s*(?:<([^<>\n]*)>|([^\s)]+))")
+_IMG_RE = re.compile(r"""<img\s[^>]*?\bsrc\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+_URL_RE = re.compile(r"^(?:[a-z][a-z0-9+.-]*:|/)", re.IGNORECASE)
+# "Unused: name" in a media check report, with a localized label
+_LABEL_RE = re.compile(r"[:：]\s*")
+
+
+def references(text: str) -> set[str]:
+    """Media filenames a field references via markdown images or <img> tags."""
+    text = html.unescape(text)
+    found = set()
+    for match in (*_IMAGE_RE.finditer(text), *_IMG_RE.finditer(text)):
+        src = next(group for group in match.groups() if group is not None)
+        src = unquote(src.strip().split("#")[0].split("?")[0])
+        if src and not _URL_RE.match(src):
+            found.add(src)
+    return found
+
+
+def note_references(flds: str) -> list[str]:
+    """Sorted references across a note's joined fields."""
+    return sorted(set().union(*(references(text) for text in flds.split("\x1f"))))
+
+
+def strip_report(report: str, names: set[str]) -> str:
+    """A media check report without the lines listing these files."""
+    return "\n".join(
+        line for line in report.split("\n") if _LABEL_RE.split(line.strip(), maxsplit=1)[-1] not in names
+    )
+
+
+class MediaIndex:
+    """note id → referenced files, persisted as JSON with each note's mod time."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.notes: dict[str, list] = {}
+        self.key: list = []
+        self.loaded = False
+
+    def load(self):
+        if self.loaded:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.notes = data.get("notes", {})
+            self.key = data.get("key", [])
+        except (OSError, ValueError):
+            self.notes = {}
+        self.loaded = True
+
+    def save(self):
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({"key": self.key, "notes": self.notes}, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def refresh(self, db, mids: list[int], full: bool = False) -> int:
+        """Re-read notes of the given notetypes whose mod time changed.
+
+        Drops deleted notes. Returns the number of notes read.
+        """
+        self.load()
+        key = sorted(mids)
+        if full or key != self.key:
+            self.notes = {}
+            self.key = key
+        if not mids:
+            self.save()
+            return 0
+
+        ids = ",".join(str(int(mid)) for mid in mids)
+        mods = {nid: mod for nid, mod in db.all(f"select id, mod from notes where mid in ({ids})")}
+        changed = [nid for nid, mod in mods.items() if self.notes.get(str(nid), [None])[0] != mod]
+        self.notes = {nid: val for nid, val in self.notes.items() if int(nid) in mods}
+
+        for i in range(0, len(changed), BATCH):
+            batch = ",".join(str(nid) for nid in changed[i : i + BATCH])
+            for nid, flds in db.all(f"select id, flds from notes where id in ({batch})"):
+                self.notes[str(nid)] = [mods[nid], note_references(flds)]
+        self.save()
+        return len(changed)
+
+    def files(self) -> set[str]:
+        """Every file referenced by an indexed note."""
+        self.load()
+        return {name for _mod, names in self.notes.values() for name in names}
+
+    def notes_using(self, filename: str) -> list[int]:
+        """Ids of notes referencing a file."""
+        self.load()
+        return sorted(int(nid) for nid, (_mod, names) in self.notes.items() if filename in names)
+
+
+# Anki glue (lazy-import aqt)
+
+_index: dict[str, MediaIndex] = {}
+
+
+def get_index() -> MediaIndex:
+    """The open profile's index."""
+    from aqt import mw
+
+    path = Path(mw.pm.profileFolder()) / INDEX
+    if str(path) not in _index:
+        _index[str(path)] = MediaIndex(path)
+    return _index[str(path)]
+
+
+def markdown_mids() -> list[int]:
+    from aqt import mw
+    from . import NOTETYPE, NOTETYPE_CLOZE
+
+    models = (mw.col.models.by_name(name) for name in (NOTETYPE, NOTETYPE_CLOZE))
+    return [model["id"] for model in models if model]
+
+
+def refresh_index(full: bool = False) -> MediaIndex:
+    """Bring the index up to date with the collection and return it."""
+    from aqt import mw
+
+    index = get_index()
+    index.refresh(mw.col.db, markdown_mids(), full)
+    return index
+
+
+def on_media_check_did_finish(output):
+    """Keep files used by markdown notes out of the media check's unused list."""
+    used = refresh_index().files()
+    rescued = {name for name in output.unused if name in used}
+    if not rescued:
+        return
+    kept = [name for name in output.unused if name not in rescued]
+    del output.unused[:]
+    output.unused.extend(kept)
+    # Anki's own counts above still include them
+    output.report = strip_report(output.report, rescued)
+    output.report += f"\n\nAnki Markdown: kept {len(rescued)} file(s) used by markdown image links."
@@ -0,0 +1,207 @@
+"""Content-addressed store for the web assets every profile's media folder needs.
+
+Each add-on file (`_review.js`, `_lang-*.js`, ...) is stored once under its
+sha256 and materialized into a media folder as a hardlink, a reflink (copy on
+write clone) or, where the filesystem supports neither, a copy. Profiles then
+share one copy on disk, and re-syncing a profile whose files are already
+linked only costs a stat per file.
+
+Links share an inode, so a write into one media folder (e.g. a media sync
+downloading a file in place) would change the object too. Objects remember
+their size and mtime; one that changed is re-hashed and, if it diverged,
+rebuilt from the add-on file, which relinks every media folder on its next sync.
+"""
+
+from pathlib import Path
+from typing import Optional
+import hashlib
+import shutil
+import json
+import os
+import sys
+
+INDEX = "index.json"
+# Linux FICLONE ioctl
+FICLONE = 0x40049409
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def stamp(path: Path) -> list[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+
+def reflink(src: Path, dst: Path) -> bool:
+    """Clone src to dst sharing blocks copy-on-write (btrfs, XFS, APFS). False if unsupported."""
+    try:
+        if sys.platform == "darwin":
+            import ctypes
+
+            libc = ctypes.CDLL("libc.dylib", use_errno=True)
+            return libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) == 0
+        if sys.platform.startswith("linux"):
+            import fcntl
+
+            with src.open("rb") as s, dst.open("wb") as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return True
+    except (OSError, AttributeError):
+        dst.unlink(missing_ok=True)
+    return False
+
+
+def place(src: Path, dst: Path, copy: bool = True) -> Optional[str]:
+    """Materialize src at dst atomically. Returns "link", "reflink" or "copy".
+
+    With copy=False, returns None instead of copying when neither link works.
+    """
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+        method = "link"
+    except OSError:
+        if reflink(src, tmp):
+            method = "reflink"
+        elif copy:
+            shutil.copyfile(src, tmp)
+            method = "copy"
+        else:
+            return None
+    os.replace(tmp, dst)
+    return method
+
+
+class ObjectStore:
+    def __init__(self, dir: Path):
+        self.dir = dir
+        self._index: Optional[dict] = None
+
+    # Index: "sources" and "targets" cache the hash of add-on files and of
+    # unlinked media copies by (size, mtime); "objects" records each object's
+    # (size, mtime) when it was written.
+
+    @property
+    def index(self) -> dict:
+        if self._index is None:
+            try:
+                self._index = json.loads((self.dir / INDEX).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._index = {}
+            for key in ("sources", "objects", "targets"):
+                self._index.setdefault(key, {})
+        return self._index
+
+    def save(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.dir / f".{INDEX}.tmp"
+        tmp.write_text(json.dumps(self.index, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.dir / INDEX)
+
+    def path(self, hash: str) -> Path:
+        return self.dir / hash[:2] / hash
+
+    def source_hash(self, src: Path) -> str:
+        """Hash of an add-on file, reusing the cached one while its stat is unchanged."""
+        now = stamp(src)
+        cached = self.index["sources"].get(src.name)
+        if cached and cached[:2] == now:
+            return cached[2]
+        hash = file_digest(src)
+        self.index["sources"][src.name] = [*now, hash]
+        return hash
+
+    def intact(self, hash: str) -> bool:
+        """Whether the object exists with its original content."""
+        path = self.path(hash)
+        if not path.exists():
+            return False
+        if self.index["objects"].get(hash) == stamp(path):
+            return True
+        if file_digest(path) != hash:
+            return False
+        self.index["objects"][hash] = stamp(path)
+        return True
+
+    def put(self, src: Path) -> tuple[Path, bool]:
+        """Store one add-on file.
+
+        Returns (object path, whether an existing object had diverged and was rebuilt).
+        """
+        hash = self.source_hash(src)
+        path = self.path(hash)
+        if self.intact(hash):
+            return path, False
+        diverged = hash in self.index["objects"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Always a real copy: the object must not share an inode with the add-on file
+        tmp = path.with_name(f".{hash}.tmp")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, path)
+        self.index["objects"][hash] = stamp(path)
+        return path, diverged
+
+    def same(self, obj: Path, dst: Path) -> Optional[bool]:
+        """True if dst is obj's inode, False if an unlinked file with its content,
+        None if missing or different."""
+        try:
+            if os.path.samefile(obj, dst):
+                return True
+            now = stamp(dst)
+        except OSError:
+            return None
+        cached = self.index["targets"].get(str(dst))
+        if not (cached and cached[:2] == now):
+            if now[0] != obj.stat().st_size:
+                return None
+            cached = [*now, file_digest(dst)]
+            self.index["targets"][str(dst)] = cached
+        return False if cached[2] == obj.name else None
+
+    def materialize(self, files: list[Path], target: Path) -> dict[str, list[str]]:
+        """Make `target` hold the current content of `files`, by filename.
+
+        Returns filenames grouped by what happened: "kept" (already linked,
+        or an identical copy where links are unsupported), "link", "reflink",
+        "copy", plus "repaired" for files whose shared object had diverged.
+        """
+        result: dict[str, list[str]] = {}
+        keep = set()
+        for src in files:
+            obj, repaired = self.put(src)
+            keep.add(obj.name)
+            dst = target / src.name
+            same = self.same(obj, dst)
+            if same:
+                method = "kept"
+            else:
+                # An identical unlinked copy is only replaced if a link saves space
+                method = place(obj, dst, copy=same is None) or "kept"
+                if method == "copy":
+                    self.index["targets"][str(dst)] = [*stamp(dst), obj.name]
+            result.setdefault(method, []).append(src.name)
+            if repaired:
+                result.setdefault("repaired", []).append(src.name)
+
+        self.prune(keep)
+        self.save()
+        return result
+
+    def prune(self, keep: set[str]):
+        """Delete objects no current add-on file maps to. Media folders keep their links."""
+        for hash in list(self.index["objects"]):
+            if hash in keep:
+                continue
+            self.path(hash).unlink(missing_ok=True)
+            del self.index["objects"][hash]
+        sources = self.index["sources"]
+        self.index["sources"] = {name: val for name, val in sources.items() if val[2] in keep}
+        targets = self.index["targets"]
+        self.index["targets"] = {path: val for path, val in targets.items() if val[2] in keep}
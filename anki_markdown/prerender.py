@@ -0,0 +1,259 @@
+"""Pre-render Anki Markdown notes into a stored HTML snapshot.
+
+With `prerender` on, basic notes get a hidden Rendered field holding their
+rendered HTML, tagged with a key of the fields, themes and languages it came
+from. The reviewer keeps a snapshot whose key matches and only highlights
+what's still pending; a stale one is dropped and the card renders live.
+Clients that can't run the renderer still show the snapshot. Cloze notes
+render differently per card and side, so they always render live.
+
+Rendering needs the reviewer bundle, so it runs in a hidden webview. Notes
+go over in batches and only stale snapshots come back.
+"""
+
+from typing import Callable, Iterator, Optional
+import json
+
+# Notes per round trip to the webview
+BATCH = 50
+# Notes per collection write
+WRITE_BATCH = 500
+# Milliseconds of editor quiet before a note's snapshot is rendered
+DELAY = 800
+# Milliseconds before an unanswered render request counts as failed
+TIMEOUT = 60_000
+
+# Loads the reviewer bundle and answers render requests over the bridge
+PAGE = """<script type="module">
+let snapshot;
+try {{
+  ({{ snapshot }} = await import("{url}"));
+}} catch (e) {{
+  console.log(`[anki-md] Failed to load the renderer: ${{e}}`);
+  pycmd("ankimd:failed");
+}}
+if (snapshot) window.ankiMdSnapshot = async (id, notes) => {{
+  let result = null;
+  try {{
+    result = await snapshot(notes);
+  }} catch (e) {{
+    console.log(`[anki-md] Pre-rendering failed: ${{e}}`);
+  }}
+  pycmd(`ankimd:snapshot:${{id}}:${{JSON.stringify(result)}}`);
+}};
+if (snapshot) pycmd("ankimd:ready");
+</script>"""
+
+
+def field_index(names: list[str], name: str) -> Optional[int]:
+    return names.index(name) if name in names else None
+
+
+def request(flds: list[str], index: int) -> list[str]:
+    """[front, back, stored snapshot] for the renderer."""
+    fields = flds + [""] * (max(index, 1) + 1 - len(flds))
+    return [fields[0], fields[1], fields[index]]
+
+
+def chunks(items: list, size: int) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def changed(ids: list[int], results: list[Optional[str]]) -> dict[int, str]:
+    """New snapshots by note id; None marks a snapshot that is still current."""
+    return {nid: html for nid, html in zip(ids, results) if html is not None}
+
+
+# Anki glue (lazy-import aqt)
+
+
+class Renderer:
+    """The reviewer bundle in a hidden webview, rendering snapshots on request."""
+
+    def __init__(self):
+        from aqt import mw
+        from aqt.webview import AnkiWebView
+        from . import asset_names
+
+        self.ready = False
+        # Set once the page can't load the renderer; requests fail at once then
+        self.failed = False
+        self.queue: list[str] = []
+        self.callbacks: dict[int, Callable[[Optional[list]], None]] = {}
+        self.seq = 0
+        # The media folder's copy, like cards: its grammars sit next to it
+        url = f"/{asset_names().get('_review.js', '_review.js')}"
+        self.web = AnkiWebView(parent=mw, title="anki markdown prerender")
+        self.web.set_bridge_command(self.on_message, self)
+        self.web.hide()
+        self.web.stdHtml(PAGE.format(url=url), js=[], context=self)
+
+    def on_message(self, cmd: str):
+        if cmd == "ankimd:ready":
+            self.ready = True
+            for js in self.queue:
+                self.web.eval(js)
+            self.queue.clear()
+        elif cmd == "ankimd:failed":
+            self.fail()
+        elif cmd.startswith("ankimd:snapshot:"):
+            id, _, data = cmd.removeprefix("ankimd:snapshot:").partition(":")
+            done = self.callbacks.pop(int(id), None)
+            if done:
+                done(json.loads(data))
+
+    def fail(self):
+        """Give up on the page: pending requests and later ones get None."""
+        self.failed = True
+        self.queue.clear()
+        callbacks, self.callbacks = self.callbacks, {}
+        for done in callbacks.values():
+            done(None)
+
+    def expire(self, id: int):
+        """Fail a request the page never answered. A page that never got
+        ready is not going to, so everything else fails with it."""
+        if not self.ready:
+            self.fail()
+            return
+        done = self.callbacks.pop(id, None)
+        if done:
+            done(None)
+
+    def render(self, notes: list[list[str]], done: Callable[[Optional[list]], None]):
+        """Render [front, back, stored] notes; `done` gets the new snapshots, or None on failure."""
+        if self.failed:
+            done(None)
+            return
+        from aqt import mw
+
+        self.seq += 1
+        id = self.seq
+        self.callbacks[id] = done
+        mw.progress.timer(TIMEOUT, lambda: self.expire(id), False, False, parent=mw)
+        js = f"ankiMdSnapshot({id}, {json.dumps(notes)})"
+        if self.ready:
+            self.web.eval(js)
+        else:
+            self.queue.append(js)
+
+    def close(self):
+        self.web.deleteLater()
+
+
+_renderer: Optional[Renderer] = None
+_timer = None
+
+
+def renderer(fresh: bool = False) -> Renderer:
+    """The shared renderer; fresh=True reloads it to pick up new config or assets.
+
+    One whose page failed is replaced too, so a later call tries again.
+    """
+    global _renderer
+    if _renderer and (fresh or _renderer.failed):
+        _renderer.close()
+        _renderer = None
+    if not _renderer:
+        _renderer = Renderer()
+    return _renderer
+
+
+def schedule(editor):
+    """Render the editor's note once typing pauses and store its snapshot."""
+    from aqt import mw
+
+    global _timer
+    if _timer:
+        _timer.stop()
+    _timer = mw.progress.timer(DELAY, lambda: render_note(editor), False, False, parent=mw)
+
+
+def render_note(editor):
+    from . import SNAPSHOT_FIELD
+
+    note = editor.note
+    index = field_index(note.keys(), SNAPSHOT_FIELD) if note else None
+    if index is None:
+        return
+
+    def done(results):
+        if not results or results[0] is None or editor.note is not note:
+            return
+        # The editor's next save stores it with the user's edits, so typing
+        # pauses add no writes or undo steps of their own
+        note.fields[index] = results[0]
+
+    renderer().render([request(note.fields, index)], done)
+
+
+def write(col, snapshots: dict[int, str], index: int):
+    """Store snapshots as one undoable step."""
+    from anki.errors import NotFoundError
+
+    pos = col.add_custom_undo_entry("Pre-render Notes")
+    for ids in chunks(list(snapshots), WRITE_BATCH):
+        notes = []
+        for nid in ids:
+            try:
+                note = col.get_note(nid)
+            except NotFoundError:
+                continue
+            note.fields[index] = snapshots[nid]
+            notes.append(note)
+        col.update_notes(notes)
+    return col.merge_undo_entries(pos)
+
+
+def backfill(parent=None, fresh: bool = False):
+    """Render snapshots for every basic note whose stored one is stale.
+
+    Notes are read and rendered a batch at a time; only the new snapshots
+    are kept, and written together at the end as one undo step.
+    """
+    from aqt import mw
+    from aqt.operations import CollectionOp
+    from aqt.utils import tooltip
+    from . import NOTETYPE, SNAPSHOT_FIELD
+
+    model = mw.col.models.by_name(NOTETYPE)
+    index = field_index([f["name"] for f in model["flds"]], SNAPSHOT_FIELD) if model else None
+    if index is None:
+        return
+    ids = [nid for nid, in mw.col.db.all(f"select id from notes where mid = {int(model['id'])} order by id")]
+    batches = list(chunks(ids, BATCH))
+    found: dict[int, str] = {}
+    render = renderer(fresh)
+
+    def step(i: int):
+        if i == len(batches):
+            return finish()
+        rows = dict(mw.col.db.all(f"select id, flds from notes where id in ({','.join(map(str, batches[i]))})"))
+        batch = [nid for nid in batches[i] if nid in rows]
+
+        def done(results):
+            if results is None:
+                tooltip("Pre-rendering failed; cards render live.", parent=parent)
+                return
+            found.update(changed(batch, results))
+            step(i + 1)
+
+        render.render([request(rows[nid].split("\x1f"), index) for nid in batch], done)
+
+    def finish():
+        if not found:
+            return
+        CollectionOp(parent or mw, lambda col: write(col, found, index)).success(
+            lambda _: tooltip(f"Pre-rendered {len(found)} note(s).", parent=parent)
+        ).run_in_background()
+
+    step(0)
+
+
+def refresh(parent=None, fresh: bool = False):
+    """Backfill when prerender is on, e.g. after settings change or an import."""
+    from .shiki import get_config
+
+    if get_config().get("prerender"):
+        backfill(parent, fresh)
@@ -0,0 +1,84 @@
+"""Pre-render the reviewer's next card while the current one is shown.
+
+Desktop Anki keeps the reviewer page, and with it the renderer and its
+caches, alive across cards. Once a question is on screen and the reviewer
+has gone quiet, the next queued card's fields go to the page; the renderer
+parses them, highlights their code in idle slices and caches the result, so
+the next card shows fully highlighted instead of with pending placeholders.
+"""
+
+from typing import Optional
+import json
+
+# Milliseconds after a question is shown before the next card is sent over,
+# so the shown card's own highlighting goes first
+DELAY = 300
+# Renderer call and the fields the templates pass it, by note kind
+CALLS = {"basic": ("prewarm", ("Front", "Back")), "cloze": ("prewarmCloze", ("Text", "Extra"))}
+
+
+def script(url: str, kind: str, fields: dict[str, str], ord: int) -> Optional[str]:
+    """JS that pre-renders one card with the renderer at `url`.
+
+    `kind` is "basic" or "cloze", `fields` the note's fields by name and
+    `ord` the card's 0-based template or cloze index. Returns None for cards
+    without the fields rendering needs.
+    """
+    if kind not in CALLS:
+        return None
+    call, names = CALLS[kind]
+    if not all(name in fields for name in names):
+        return None
+    args = [fields[name] for name in names] + ([ord + 1] if kind == "cloze" else [])
+    return f"import({json.dumps(url)}).then((m) => m.{call}(...{json.dumps(args)})).catch(() => {{}});"
+
+
+# Anki glue (lazy-import aqt)
+
+_timer = None
+# The card last sent, so showing a question again doesn't repeat the work
+_warmed: Optional[int] = None
+
+
+def next_card(col):
+    """The card after the one being reviewed, or None if the queue has no other."""
+    queued = col.sched.get_queued_cards(fetch_limit=2)
+    if len(queued.cards) < 2:
+        return None
+    return col.get_card(queued.cards[1].card.id)
+
+
+def on_show_question(card):
+    """Send the next card to the reviewer page once the shown one settles."""
+    from aqt import mw
+
+    global _timer
+    if _timer:
+        _timer.stop()
+    _timer = mw.progress.timer(DELAY, warm, False, False, parent=mw)
+
+
+def warm():
+    from aqt import mw
+    from . import NOTETYPE, NOTETYPE_CLOZE, asset_names
+
+    global _warmed
+    reviewer = getattr(mw, "reviewer", None)
+    if not mw.col or mw.state != "review" or not reviewer or not reviewer.web:
+        return
+    try:
+        card = next_card(mw.col)
+    except Exception:
+        # Older schedulers have no queue to peek at
+        return
+    if not card or card.id == _warmed:
+        return
+    name = card.note_type()["name"]
+    kinds = {NOTETYPE: "basic", NOTETYPE_CLOZE: "cloze"}
+    if name not in kinds:
+        return
+    url = f"./{asset_names().get('_review.js', '_review.js')}"
+    js = script(url, kinds[name], dict(card.note().items()), card.ord)
+    if js:
+        _warmed = card.id
+        reviewer.web.eval(js)
@@ -0,0 +1,106 @@
+"""Remove add-on files from collection.media that nothing needs any more.
+
+sync_media() deletes what the current cleanup removed and renderer files
+with stale hashes. Grammars and themes orphaned any other way (an
+interrupted sync, a cleanup on another device, renames in old versions)
+stay in media and keep syncing to every device. This pass compares every
+add-on file in media with the files the add-on publishes and the files the
+config needs, and removes the rest once the user has seen the list.
+"""
+
+from fnmatch import fnmatchcase
+from pathlib import Path
+import os
+
+# Media files the add-on owns; anything else in media is left alone
+PATTERNS = ("_lang-*.js", "_theme-*.js", "_review*.js", "_review*.css", "_config-*.js", "_tokens-*.css")
+# Files listed by name in the confirmation; the rest are counted
+SHOWN = 15
+
+
+def owned(name: str) -> bool:
+    return any(fnmatchcase(name, pattern) for pattern in PATTERNS)
+
+
+def scan(media_dir: Path) -> dict[str, int]:
+    """Add-on files in media with their sizes, from one directory listing."""
+    with os.scandir(media_dir) as entries:
+        return {
+            entry.name: entry.stat().st_size
+            for entry in entries
+            if entry.name.startswith("_") and owned(entry.name) and entry.is_file()
+        }
+
+
+def needed(config: dict, deps: set[str]) -> set[str]:
+    """Grammar and theme files the config needs, whether or not they're downloaded."""
+    langs = set(config.get("languages", [])) | deps
+    themes = {config["themes"]["light"], config["themes"]["dark"]}
+    return {f"_lang-{name}.js" for name in langs} | {f"_theme-{name}.js" for name in themes}
+
+
+def extras(files: dict[str, int], keep: set[str]) -> dict[str, int]:
+    """Files not kept, with their sizes, by name."""
+    return {name: files[name] for name in sorted(files) if name not in keep}
+
+
+def summary(found: dict[str, int]) -> str:
+    size = sum(found.values())
+    return f"{len(found)} file(s), {size / 1024:.0f} KB" if size >= 1024 else f"{len(found)} file(s), {size} bytes"
+
+
+def report(found: dict[str, int]) -> str:
+    """The dry-run listing shown before anything is removed."""
+    lines = [f"{name} ({size / 1024:.1f} KB)" for name, size in list(found.items())[:SHOWN]]
+    if len(found) > SHOWN:
+        lines.append(f"… and {len(found) - SHOWN} more")
+    return "\n".join(lines)
+
+
+def remove(media_dir: Path, names: list[str]) -> list[str]:
+    """Delete files from media; ones already gone are skipped. Returns those removed."""
+    removed = []
+    for name in names:
+        try:
+            (media_dir / name).unlink()
+        except FileNotFoundError:
+            continue
+        removed.append(name)
+    return removed
+
+
+# Anki glue (lazy-import aqt)
+
+
+def find() -> tuple[Path, dict[str, int]]:
+    """The media folder and the add-on files in it that nothing needs."""
+    from aqt import mw
+    from . import ADDON_DIR
+    from .shiki import ShikiStore, get_config, store
+
+    media_dir = Path(mw.col.media.dir())
+    config = get_config()
+    roots = set(config.get("languages", []))
+    # Media copies name deps too, for grammars this device failed to download
+    deps = store.collect_deps(roots) | ShikiStore(media_dir).collect_deps(roots)
+    published = {f.name for f in [*ADDON_DIR.glob("_*"), *store.dir.glob("_*")] if f.is_file()}
+    return media_dir, extras(scan(media_dir), published | needed(config, deps))
+
+
+def clean_media(parent=None):
+    """List unused add-on files in media, and remove them once confirmed."""
+    from aqt.utils import askUser, tooltip
+
+    media_dir, found = find()
+    if not found:
+        tooltip("No unused Anki Markdown files in the media folder.", parent=parent)
+        return
+    if not askUser(
+        f"Remove {summary(found)} Anki Markdown no longer uses from the media folder?\n"
+        "Other devices drop them on their next sync.\n\n"
+        f"{report(found)}",
+        parent=parent,
+    ):
+        return
+    removed = remove(media_dir, list(found))
+    tooltip(f"Removed {summary({name: found[name] for name in removed})}.", parent=parent)
@@ -1,5 +1,6 @@
 """Settings dialog for Anki Markdown syntax highlighting configuration."""
 
+import html
 import json
 from pathlib import Path
 import platform
@@ -18,20 +19,25 @@ from aqt.qt import (
     QLabel,
     QLineEdit,
     QCheckBox,
+    QTextBrowser,
+    QFileDialog,
+    QInputDialog,
     QAbstractItemView,
     QMessageBox,
     QApplication,
     Qt,
 )
-from aqt import mw
+from aqt import mw, dialogs
 
 from .shiki import (
     AVAILABLE_LANGS,
     AVAILABLE_THEMES,
     SHIKI_VERSION,
     get_config,
+    set_config,
     store,
 )
+from . import timing
 
 ADDON_DIR = Path(__file__).parent
 ADDON_VERSION = json.loads((ADDON_DIR / "manifest.json").read_text(encoding="utf-8"))["version"]
@@ -93,8 +99,12 @@ def debug_report() -> str:
         f"light theme: {theme.get('light', '-')}",
         f"dark theme: {theme.get('dark', '-')}",
         f"cardless: {config.get('cardless', False)}",
+        f"worker: {config.get('worker', False)}",
+        f"classes: {config.get('classes', False)}",
         "",
         store.debug_text(config),
+        "",
+        timing.report(),
     ]
     return "\n".join(lines)
 
@@ -177,6 +187,14 @@ class ShikiSettingsDialog(QDialog):
         self.info_label = QLabel("")
         self.info_label.setWordWrap(True)
         lang_layout.addWidget(self.info_label)
+
+        self.shallow = QCheckBox("Skip embedded languages")
+        self.shallow.setToolTip(
+            "Don't download grammars only needed for code inside other languages,\n"
+            "like scripts in HTML or fenced code in Markdown. That code shows as plain text\n"
+            "unless its language is selected too."
+        )
+        lang_layout.addWidget(self.shallow)
         layout.addWidget(langs)
 
         # Theme section
@@ -205,6 +223,21 @@ class ShikiSettingsDialog(QDialog):
         self.cardless = QCheckBox("Cardless")
         self.cardless.setToolTip("Remove card border, shadow, and background on wide screens")
         ui_layout.addWidget(self.cardless)
+        self.worker = QCheckBox("Background highlighting")
+        self.worker.setToolTip("Highlight code in a web worker so long code blocks don't block scrolling")
+        ui_layout.addWidget(self.worker)
+        self.classes = QCheckBox("Compact code markup")
+        self.classes.setToolTip(
+            "Color code with classes from one shared stylesheet instead of inline styles on every token.\n"
+            "Makes cards with long code blocks lighter and faster to lay out."
+        )
+        ui_layout.addWidget(self.classes)
+        self.prerender = QCheckBox("Pre-render notes")
+        self.prerender.setToolTip(
+            "Store rendered HTML with each basic note so cards show instantly and in clients without scripts.\n"
+            "Adds a hidden field to the note type, which needs a one-way sync."
+        )
+        ui_layout.addWidget(self.prerender)
         layout.addWidget(ui)
 
         meta = QHBoxLayout()
@@ -223,6 +256,38 @@ class ShikiSettingsDialog(QDialog):
         self.debug = self.link("Debug info", "debug", False)
         self.debug.linkActivated.connect(self.export_debug)
         meta.addWidget(self.debug)
+
+        sep = QLabel("·")
+        sep.setStyleSheet("color: gray; font-size: 11px;")
+        meta.addWidget(sep)
+
+        self.lint = self.link("Lint notes", "lint", False)
+        self.lint.linkActivated.connect(lambda _: show_lint(self))
+        meta.addWidget(self.lint)
+
+        sep = QLabel("·")
+        sep.setStyleSheet("color: gray; font-size: 11px;")
+        meta.addWidget(sep)
+
+        self.import_link = self.link("Import folder", "import", False)
+        self.import_link.linkActivated.connect(lambda _: show_import(self))
+        meta.addWidget(self.import_link)
+
+        sep = QLabel("·")
+        sep.setStyleSheet("color: gray; font-size: 11px;")
+        meta.addWidget(sep)
+
+        self.export_link = self.link("Export folder", "export", False)
+        self.export_link.linkActivated.connect(lambda _: show_export(self))
+        meta.addWidget(self.export_link)
+
+        sep = QLabel("·")
+        sep.setStyleSheet("color: gray; font-size: 11px;")
+        meta.addWidget(sep)
+
+        self.clean_link = self.link("Clean up media", "clean", False)
+        self.clean_link.linkActivated.connect(lambda _: show_clean_media(self))
+        meta.addWidget(self.clean_link)
         layout.addLayout(meta)
 
         # Buttons
@@ -279,7 +344,11 @@ class ShikiSettingsDialog(QDialog):
         if idx >= 0:
             self.dark_theme.setCurrentIndex(idx)
 
+        self.shallow.setChecked(config.get("shallow", False))
         self.cardless.setChecked(config.get("cardless", False))
+        self.worker.setChecked(config.get("worker", False))
+        self.classes.setChecked(config.get("classes", False))
+        self.prerender.setChecked(config.get("prerender", False))
 
         self.update_info()
 
@@ -301,6 +370,17 @@ class ShikiSettingsDialog(QDialog):
         QApplication.clipboard().setText(debug_report())
         QMessageBox.information(self, "Anki Markdown", "Debug info copied to clipboard.")
 
+    def enable_prerender(self) -> bool:
+        """Add the snapshot field. False if the user declined the schema change."""
+        from anki.errors import AbortSchemaModification
+        from . import ensure_notetype
+
+        try:
+            ensure_notetype(add_snapshot=True)
+        except AbortSchemaModification:
+            return False
+        return True
+
     def apply_config(self):
         """Save config and download missing files."""
         langs = self.get_selected_languages()
@@ -314,17 +394,24 @@ class ShikiSettingsDialog(QDialog):
             return
 
         # Build new config
+        old = get_config()
         config = get_config()
         config["languages"] = langs
         config["themes"] = {
             "light": self.light_theme.currentText(),
             "dark": self.dark_theme.currentText(),
         }
+        config["shallow"] = self.shallow.isChecked()
         config["cardless"] = self.cardless.isChecked()
+        config["worker"] = self.worker.isChecked()
+        config["classes"] = self.classes.isChecked()
+        config["prerender"] = self.prerender.isChecked()
+        if config["prerender"] and not self.enable_prerender():
+            config["prerender"] = False
+            self.prerender.setChecked(False)
 
         # Save config
-        addon_name = __name__.split(".")[0]
-        mw.addonManager.writeConfig(addon_name, config)
+        set_config(config)
 
         # Show loading state
         self.apply_btn.setText("Saving...")
@@ -333,19 +420,10 @@ class ShikiSettingsDialog(QDialog):
         QApplication.processEvents()
 
         try:
-            # Download missing files
-            downloaded, errors = store.sync(config)
+            # Only the stages this change affects: downloads, media, note types, snapshots
+            from .configure import apply
 
-            # Cleanup unused files
-            removed = store.cleanup(config)
-
-            # Sync to collection.media (pass removed files to trash from media)
-            from . import sync_media
-            sync_media(removed)
-
-            # Update note type templates
-            from . import ensure_notetype
-            ensure_notetype()
+            downloaded, removed, errors = apply(old, config, mw)
 
             QApplication.restoreOverrideCursor()
 
@@ -372,7 +450,101 @@ class ShikiSettingsDialog(QDialog):
             QMessageBox.critical(self, "Error", f"Failed to sync: {e}")
 
 
+class LintDialog(QDialog):
+    """Lint findings per note, each linking to the note in the browser."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent or mw)
+        self.setWindowTitle("Anki Markdown - Lint")
+        self.setMinimumWidth(560)
+        self.setMinimumHeight(420)
+        self.found: dict[int, list[str]] = {}
+
+        layout = QVBoxLayout(self)
+        self.summary = QLabel("")
+        layout.addWidget(self.summary)
+
+        self.report = QTextBrowser()
+        self.report.setOpenLinks(False)
+        self.report.anchorClicked.connect(lambda url: self.browse(url.toString()))
+        layout.addWidget(self.report)
+
+        buttons = QHBoxLayout()
+        self.browse_all = QPushButton("Show All in Browser")
+        self.browse_all.clicked.connect(
+            lambda: self.browse(f"nid:{','.join(str(nid) for nid in self.found)}")
+        )
+        buttons.addWidget(self.browse_all)
+        recheck = QPushButton("Re-check All")
+        recheck.clicked.connect(lambda: self.run(full=True))
+        buttons.addWidget(recheck)
+        buttons.addStretch()
+        close = QPushButton("Close")
+        close.clicked.connect(self.accept)
+        buttons.addWidget(close)
+        layout.addLayout(buttons)
+
+    def run(self, full: bool = False):
+        """Lint notes changed since the last run (or all) and show the results."""
+        from .lint import lint_collection
+
+        QApplication.setOverrideCursor(Qt.CursorShape.WaitCursor)
+        try:
+            self.found, checked = lint_collection(full)
+        finally:
+            QApplication.restoreOverrideCursor()
+
+        self.summary.setText(
+            f"{len(self.found)} note(s) with problems · checked {checked} changed note(s)"
+        )
+        self.browse_all.setEnabled(bool(self.found))
+        parts = []
+        for nid, problems in sorted(self.found.items()):
+            items = "".join(f"<li>{html.escape(problem)}</li>" for problem in problems)
+            parts.append(f'<p><a href="nid:{nid}">Note {nid}</a></p><ul>{items}</ul>')
+        self.report.setHtml("".join(parts) or "<p>No problems found.</p>")
+
+    def browse(self, search: str):
+        dialogs.open("Browser", mw, search=(search,))
+
+
+def show_lint(parent=None):
+    """Lint Anki Markdown notes and show the report."""
+    dialog = LintDialog(parent)
+    dialog.run()
+    dialog.exec()
+
+
+def show_import(parent=None):
+    """Pick a folder of markdown files and import it."""
+    from .importer import import_folder
+
+    folder = QFileDialog.getExistingDirectory(parent or mw, "Import Markdown Folder")
+    if folder:
+        import_folder(parent, Path(folder))
+
+
+def show_export(parent=None):
+    """Pick a folder and layout and export notes as markdown files."""
+    from .exporter import export_folder
+
+    folder = QFileDialog.getExistingDirectory(parent or mw, "Export Markdown Folder")
+    if not folder:
+        return
+    layouts = {"One file per note": "note", "One file per deck": "deck"}
+    choice, ok = QInputDialog.getItem(parent or mw, "Export Markdown Folder", "Layout:", list(layouts), 0, False)
+    if ok:
+        export_folder(parent, Path(folder), layouts[choice])
+
+
 def show_settings():
     """Show the settings dialog."""
     dialog = ShikiSettingsDialog(mw)
     dialog.exec()
+
+
+def show_clean_media(parent=None):
+    """List unused add-on files in the media folder and offer to remove them."""
+    from .reconcile import clean_media
+
+    clean_media(parent)
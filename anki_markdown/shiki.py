@@ -4,29 +4,93 @@ Downloads language grammars and themes from esm.sh and manages them
 in collection.media for mobile sync.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, partial
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 import urllib.request
+import urllib.error
+import http.client
+import threading
+import socket
+import time
+import hashlib
+import copy
 import ssl
 import json
+import os
 import re
 
 ADDON_DIR = Path(__file__).parent
+# Downloaded grammars and themes with their index and failures. Anki replaces
+# the add-on folder on update but keeps user_files.
+STORE_DIR = ADDON_DIR / "user_files" / "shiki"
 ESM_BASE = "https://esm.sh/@shikijs"
 
-_DATA = json.loads((ADDON_DIR / "shiki-data.json").read_text(encoding="utf-8"))
-SHIKI_VERSION = _DATA["version"]
-AVAILABLE_LANGS = _DATA["languages"]
-AVAILABLE_THEMES = _DATA["themes"]
+INDEX = "shiki-store.json"
+WORKERS = 8
 
+# Failed downloads, kept across sessions so an offline start doesn't retry them all
+FAILURES = "shiki-failures.json"
+# Seconds before a failed file is tried again, doubling per failure up to BACKOFF_MAX
+BACKOFF = 60
+BACKOFF_MAX = 24 * 60 * 60
+# A TCP connect to esm.sh tells "offline" apart in a few seconds, not a 30s fetch timeout
+PROBE_HOST = ("esm.sh", 443)
+PROBE_TIMEOUT = 3
+FETCH_TIMEOUT = 30
+# Shiki's foreground for themes that don't set one, by theme type
+FALLBACK_FG = {"light": "#333333", "dark": "#bbbbbb"}
 
-DEFAULT_CONFIG = json.loads((ADDON_DIR / "config.json").read_text(encoding="utf-8"))
+
+# Bundled data is parsed on first use, not at import, to keep add-on load cheap
+
+@cache
+def _data() -> dict:
+    return json.loads((ADDON_DIR / "shiki-data.json").read_text(encoding="utf-8"))
+
+
+@cache
+def _default_config() -> dict:
+    return json.loads((ADDON_DIR / "config.json").read_text(encoding="utf-8"))
+
+
+def _store() -> "ShikiStore":
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+    return ShikiStore(STORE_DIR)
+
+
+_LAZY = {
+    "SHIKI_VERSION": lambda: _data()["version"],
+    "AVAILABLE_LANGS": lambda: _data()["languages"],
+    "AVAILABLE_THEMES": lambda: _data()["themes"],
+    # sha256 of each upstream module for SHIKI_VERSION, keyed "langs"/"themes" → name
+    "SOURCE_HASHES": lambda: _data().get("hashes", {}),
+    "DEFAULT_CONFIG": _default_config,
+    "store": _store,
+}
+
+
+def __getattr__(name: str):
+    """Resolve the lazy module attributes above on first access."""
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = globals()[name] = _LAZY[name]()
+    return value
 
 
 # Pure functions
 
 _IMPORT_RE = re.compile(r"""from\s*["']\./([^"'.]+)\.mjs["']""")
 _LOCAL_RE = re.compile(r'from"\.\/_lang-([^.]+)\.js"')
+# Grammar JSON is embedded as an escaped string: \"aliases\":[\"js\",\"cjs\"]
+_ALIASES_RE = re.compile(r'\\?"aliases\\?":\s*\[([^\]]*)\]')
+_EMBEDDED_RE = re.compile(r'(\\?"embeddedLangs\\?":\s*\[)([^\]]*)\]')
+# A grammar or theme is the first JSON.parse("...") string in its module
+_GRAMMAR_RE = re.compile(r"""JSON\.parse\((["'])((?:\\.|(?!\1).)*)\1\)""", re.DOTALL)
+_ESCAPE_RE = re.compile(r'\\.|"', re.DOTALL)
+# Default imports are the only ones a pruned dep can be swapped out of
+_DEFAULT_IMPORT_RE = re.compile(r"""import\s*([\w$]+)\s*from\s*["']\./([^"'.]+)\.mjs["'];?""")
 
 def esm_url(kind: str, name: str, version: str) -> str:
     """Generate esm.sh URL for a language or theme module."""
@@ -59,53 +123,453 @@ def rewrite_lang_imports(content: str) -> str:
     )
 
 
+def lang_aliases(content: str) -> list[str]:
+    """Extract the alias names a grammar module registers."""
+    return [
+        name
+        for match in _ALIASES_RE.findall(content)
+        for name in re.findall(r"[^\\\"\s,]+", match)
+    ]
+
+
+def module_text(content: str) -> Optional[str]:
+    """The JSON text a grammar or theme module embeds, or None if it can't be read."""
+    match = _GRAMMAR_RE.search(content)
+    if not match:
+        return None
+    # Turn the JS string literal into a JSON one: \\' is JS-only, a bare " isn't allowed
+    body = _ESCAPE_RE.sub(
+        lambda m: "'" if m.group() == "\\'" else '\\"' if m.group() == '"' else m.group(),
+        match.group(2),
+    )
+    try:
+        return json.loads(f'"{body}"')
+    except ValueError:
+        return None
+
+
+def module_json(content: str) -> Optional[dict]:
+    """The JSON a grammar or theme module embeds, or None if it can't be read."""
+    text = module_text(content)
+    try:
+        return json.loads(text) if text is not None else None
+    except ValueError:
+        return None
+
+
+def extended_scopes(data: dict) -> set[str]:
+    """External scopes a grammar builds on rather than embeds.
+
+    A grammar that extends another (glsl on c) includes it from its top-level
+    patterns, directly or through include-only repository rules. Embedded
+    code (script tags, fenced blocks) is included inside a begin/end or match
+    rule, which this walk doesn't enter.
+    """
+    repository = data.get("repository", {})
+    scopes, seen = set(), set()
+    stack = list(data.get("patterns", []))
+    while stack:
+        rule = stack.pop()
+        include = rule.get("include")
+        if include is None:
+            if "begin" not in rule and "match" not in rule:
+                stack.extend(rule.get("patterns", []))
+        elif include.startswith("#"):
+            key = include[1:]
+            if key not in seen and key in repository:
+                seen.add(key)
+                stack.append(repository[key])
+        elif include not in ("$self", "$base"):
+            scopes.add(include.split("#")[0])
+    return scopes
+
+
+def prunable_deps(content: str) -> list[str]:
+    """Deps imported in a form prune_deps can replace."""
+    return [name for _var, name in _DEFAULT_IMPORT_RE.findall(content)]
+
+
+def prune_deps(content: str, names: set[str]) -> str:
+    """Drop embedded grammars from a raw module.
+
+    Their imports become empty grammar lists and they leave embeddedLangs, so
+    Shiki loads the grammar without them and the embedded code is plain text
+    (or highlighted, if that language is loaded on its own).
+    """
+    content = _DEFAULT_IMPORT_RE.sub(
+        lambda m: f"const {m.group(1)}=[];" if m.group(2) in names else m.group(0),
+        content,
+    )
+
+    def keep(match: re.Match) -> str:
+        quote = '\\"' if match.group(1).startswith("\\") else '"'
+        kept = [name for name in re.findall(r"[^\\\"\s,]+", match.group(2)) if name not in names]
+        return match.group(1) + ",".join(f"{quote}{name}{quote}" for name in kept) + "]"
+
+    return _EMBEDDED_RE.sub(keep, content)
+
+
+_HEX_RE = re.compile(r"^#(?:[0-9a-f]{3,4}|[0-9a-f]{6}|[0-9a-f]{8})$")
+
+
+def theme_colors(theme: dict) -> list[str]:
+    """Hex colors a theme gives tokens, lowercased without the `#`.
+
+    Covers every rule's foreground plus the default one Shiki falls back to.
+    Colors that aren't plain hex (named colors, CSS variables) are left out,
+    so tokens using them keep inline styles.
+    """
+    rules = [*theme.get("settings", []), *theme.get("tokenColors", [])]
+    colors = {rule.get("settings", {}).get("foreground") for rule in rules if isinstance(rule, dict)}
+    ui = theme.get("colors") or {}
+    colors |= {theme.get("fg"), ui.get("editor.foreground"), ui.get("foreground")}
+    colors.add(FALLBACK_FG["dark" if theme.get("type") == "dark" else "light"])
+    return sorted({c.lower()[1:] for c in colors if isinstance(c, str) and _HEX_RE.match(c.lower())})
+
+
+def token_css(light: list[str], dark: list[str]) -> str:
+    """Stylesheet for class-based tokens: `l-<hex>` and `d-<hex>` set the color.
+
+    Dark classes only apply inside a night-mode wrapper, where they outrank
+    the light ones; font style classes live in the reviewer's stylesheet.
+    """
+    rules = [f".shiki span.l-{hex}{{color:#{hex}}}" for hex in light]
+    rules += [f".anki-md-wrapper.night-mode .shiki span.d-{hex}{{color:#{hex}}}" for hex in dark]
+    return "".join(f"{rule}\n" for rule in rules)
+
+
+def read_config(path: Path) -> dict:
+    """A config file over the defaults, merged by top-level key like Anki does."""
+    return {**copy.deepcopy(_default_config()), **json.loads(path.read_text(encoding="utf-8"))}
+
+
+def digest(content: bytes) -> str:
+    """Content hash used to tag stored modules."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def source_hash(content: bytes) -> str:
+    """Hash of the grammar or theme a module embeds.
+
+    esm.sh serves its own minified build of each module, so its bytes never
+    match the npm build scripts/generate.ts hashes; the embedded JSON text
+    does. Modules without readable JSON hash as they are.
+    """
+    text = module_text(content.decode("utf-8"))
+    return digest(text.encode("utf-8")) if text is not None else digest(content)
+
+
+def split_name(filename: str) -> tuple[str, str]:
+    """Split a store filename like _lang-html.js into (kind, name)."""
+    stem = filename.removesuffix(".js")
+    kind, _, name = stem.removeprefix("_").partition("-")
+    return kind, name
+
+
+def is_network_error(e: Exception) -> bool:
+    """Whether a fetch failed for lack of a connection rather than a bad response."""
+    if isinstance(e, urllib.error.HTTPError):
+        return False
+    # A body cut short is a dropped connection, not a bad module
+    return isinstance(e, (Offline, OSError, http.client.IncompleteRead))
+
+
+def backoff_delay(count: int) -> float:
+    """Seconds to wait after the count-th consecutive failure."""
+    return min(BACKOFF * 2 ** (count - 1), BACKOFF_MAX)
+
+
 # I/O
 
+class Offline(Exception):
+    """esm.sh is unreachable, so the download wasn't attempted."""
+
+
 def fetch_module(url: str) -> bytes:
     """Fetch module content from esm.sh."""
     ctx = ssl.create_default_context()
     req = urllib.request.Request(url, headers={"User-Agent": "AnkiMarkdown/1.0"})
-    with urllib.request.urlopen(req, timeout=30, context=ctx) as resp:
+    with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT, context=ctx) as resp:
         return resp.read()
 
 
+def probe(timeout: float = PROBE_TIMEOUT) -> bool:
+    """Whether esm.sh accepts a connection."""
+    try:
+        socket.create_connection(PROBE_HOST, timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+
 # Store
 
 class ShikiStore:
-    def __init__(self, dir: Path, version: str = SHIKI_VERSION):
+    def __init__(self, dir: Path, version: Optional[str] = None, hashes: Optional[dict] = None):
+        data = _data()
         self.dir = dir
-        self.version = version
-
-    def download_lang(self, name: str, _seen: Optional[set[str]] = None):
-        """Download a language grammar, resolving aliases and deps."""
-        if _seen is None:
-            _seen = set()
-        if name in _seen:
+        self.version = version or data["version"]
+        if hashes is None:
+            hashes = data.get("hashes", {}) if self.version == data["version"] else {}
+        self.hashes = hashes
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._seen_lock = threading.Lock()
+        # None until the first fetch of a sync probes the connection
+        self.offline: Optional[bool] = None
+        # Shallow mode keeps grammars other grammars build on, not ones they embed
+        self.shallow = False
+
+    # Index: every stored file is tagged with the Shiki version and the
+    # sha256 of the upstream module it was built from. Grammars fetched in
+    # shallow mode also list the embedded grammars pruned from them.
+
+    def read_index(self) -> dict[str, dict]:
+        """Read the version/hash index for stored files."""
+        try:
+            return json.loads((self.dir / INDEX).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def write_index(self, index: dict[str, dict]):
+        """Atomically replace the index file."""
+        tmp = self.dir / f".{INDEX}.tmp"
+        tmp.write_text(json.dumps(index, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.dir / INDEX)
+
+    def tag(self, files: dict[str, Optional[str]], pruned: Optional[dict[str, Optional[list[str]]]] = None):
+        """Record files as built from this version; None drops an entry.
+
+        `pruned` gives what was pruned from freshly fetched grammars, None for
+        a full fetch. Files not in it (e.g. retagged ones) keep their record.
+        """
+        pruned = pruned or {}
+        with self._lock:
+            index = self.read_index()
+            for filename, hash in files.items():
+                if hash is None:
+                    index.pop(filename, None)
+                    continue
+                entry = {**index.get(filename, {}), "version": self.version, "hash": hash}
+                if filename in pruned:
+                    entry.pop("pruned", None)
+                    if pruned[filename] is not None:
+                        entry["pruned"] = pruned[filename]
+                index[filename] = entry
+            self.write_index(index)
+
+    # Failures: filename → [consecutive failures, retry time, network error],
+    # so an offline start skips files until their backoff runs out.
+
+    def read_failures(self) -> dict[str, list]:
+        try:
+            return json.loads((self.dir / FAILURES).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+
+    def write_failures(self, failures: dict[str, list]):
+        tmp = self.dir / f".{FAILURES}.tmp"
+        tmp.write_text(json.dumps(failures, indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, self.dir / FAILURES)
+
+    def record(self, results: dict[str, Optional[Exception]], now: Optional[float] = None):
+        """Record download outcomes by filename; None is a success and clears the entry."""
+        if not results:
             return
-        _seen.add(name)
-
-        raw = fetch_module(esm_url("lang", name, self.version))
+        now = time.time() if now is None else now
+        with self._lock:
+            failures = self.read_failures()
+            for filename, error in results.items():
+                if error is None:
+                    failures.pop(filename, None)
+                    continue
+                count = failures.get(filename, [0])[0] + 1
+                failures[filename] = [count, now + backoff_delay(count), is_network_error(error)]
+            self.write_failures(failures)
+
+    def deferred(self, now: Optional[float] = None) -> set[str]:
+        """Files whose last download failed and whose retry time hasn't come."""
+        now = time.time() if now is None else now
+        return {name for name, (_count, until, _network) in self.read_failures().items() if until > now}
+
+    def waiting(self) -> list[str]:
+        """Files that last failed for lack of a connection."""
+        return sorted(name for name, (_count, _until, network) in self.read_failures().items() if network)
+
+    def fetch(self, url: str) -> bytes:
+        """Fetch a module, failing fast once this sync found esm.sh unreachable."""
+        with self._probe_lock:
+            if self.offline is None:
+                self.offline = not probe()
+        if self.offline:
+            raise Offline("no connection to esm.sh")
+        try:
+            return fetch_module(url)
+        except Exception as e:
+            if is_network_error(e):
+                self.offline = True
+            raise
+
+    def write(self, filename: str, content: bytes):
+        """Write a store file via rename so readers never see a partial file."""
+        tmp = self.dir / f".{filename}.tmp"
+        tmp.write_bytes(content)
+        os.replace(tmp, self.dir / filename)
+
+    def fetch_lang(self, name: str) -> tuple[bytes, str, list[str], Optional[list[str]]]:
+        """Fetch one grammar, resolving aliases.
+
+        Returns (rewritten content, upstream hash, dependency names, pruned
+        dependency names). Pruned is None outside shallow mode.
+        """
+        raw = self.fetch(esm_url("lang", name, self.version))
 
         canonical = is_alias_module(raw)
         if canonical:
-            raw = fetch_module(esm_url("lang", canonical, self.version))
+            raw = self.fetch(esm_url("lang", canonical, self.version))
 
         text = raw.decode("utf-8")
         deps = lang_deps(text)
-        text = rewrite_lang_imports(text)
+        pruned = None
+        if self.shallow:
+            pruned = self.embedded_deps(text)
+            if pruned:
+                text = prune_deps(text, set(pruned))
+                deps = [dep for dep in deps if dep not in pruned]
+        return rewrite_lang_imports(text).encode("utf-8"), source_hash(raw), deps, pruned
+
+    def embedded_deps(self, text: str) -> list[str]:
+        """Deps a grammar embeds rather than builds on, which shallow mode prunes.
+
+        Most grammars build on nothing, so their deps are only fetched to
+        read their scope when the grammar includes an external scope at its
+        top level. An unreadable grammar keeps all its deps.
+        """
+        deps = sorted(set(prunable_deps(text)))
+        data = module_json(text) if deps else None
+        if data is None:
+            return []
+        extends = extended_scopes(data)
+        if not extends:
+            return deps
+        embedded = []
+        for dep in deps:
+            dep_data = module_json(self.fetch(esm_url("lang", dep, self.version)).decode("utf-8"))
+            if dep_data and dep_data.get("scopeName") not in extends:
+                embedded.append(dep)
+        return embedded
+
+    def fetch_theme(self, name: str) -> tuple[bytes, str]:
+        """Fetch one theme. Returns (content, upstream hash)."""
+        raw = self.fetch(esm_url("theme", name, self.version))
+        return raw, source_hash(raw)
+
+    def download_lang(self, name: str, _seen: Optional[set[str]] = None) -> bool:
+        """Download a language grammar, resolving aliases and deps.
+
+        Returns False if it was skipped, having been fetched as a dep already.
+        """
+        if _seen is None:
+            _seen = set()
+        # Parallel downloads share _seen, so each dep is fetched once
+        with self._seen_lock:
+            if name in _seen:
+                return False
+            _seen.add(name)
 
-        (self.dir / f"_lang-{name}.js").write_text(text, encoding="utf-8")
+        content, hash, deps, pruned = self.fetch_lang(name)
+        filename = f"_lang-{name}.js"
+        self.write(filename, content)
+        self.tag({filename: hash}, {filename: pruned})
 
         for dep in deps:
             self.download_lang(dep, _seen)
+        return True
 
     def download_theme(self, name: str):
         """Download a theme and save to store directory."""
-        raw = fetch_module(esm_url("theme", name, self.version))
-        (self.dir / f"_theme-{name}.js").write_bytes(raw)
+        content, hash = self.fetch_theme(name)
+        filename = f"_theme-{name}.js"
+        self.write(filename, content)
+        self.tag({filename: hash})
+
+    def stale(self) -> list[str]:
+        """Stored files not tagged with this store's Shiki version."""
+        index = self.read_index()
+        files = [*self.dir.glob("_lang-*.js"), *self.dir.glob("_theme-*.js")]
+        return sorted(
+            f.name for f in files
+            if index.get(f.name, {}).get("version") != self.version
+        )
+
+    def upgrade(self, skip: frozenset[str] = frozenset()) -> tuple[list[str], list[str]]:
+        """Bring files from older Shiki versions up to this version.
+
+        Files whose upstream hash matches this version's published hash are
+        retagged without a download; untagged ones (e.g. copied in) are
+        hashed first. The rest (except `skip`) are fetched in
+        parallel and swapped in only after every fetch succeeded, so the old
+        set stays usable until then. Returns (downloaded, errors) lists.
+        """
+        stale = [filename for filename in self.stale() if filename not in skip]
+        if not stale:
+            return [], []
+
+        index = self.read_index()
+        retag = {}
+        fetch = []
+        for filename in stale:
+            kind, name = split_name(filename)
+            want = self.hashes.get(f"{kind}s", {}).get(name)
+            have = index.get(filename, {}).get("hash")
+            if want and have is None:
+                have = source_hash((self.dir / filename).read_bytes())
+            if want and want == have:
+                retag[filename] = have
+            else:
+                fetch.append(filename)
+        if retag:
+            self.tag(retag)
+
+        def get(filename: str) -> tuple[bytes, str, Optional[list[str]]]:
+            kind, name = split_name(filename)
+            if kind == "lang":
+                content, hash, _, pruned = self.fetch_lang(name)
+                return content, hash, pruned
+            return (*self.fetch_theme(name), None)
+
+        results = {}
+        failed = {}
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            futures = {name: pool.submit(get, name) for name in fetch}
+            for filename, future in futures.items():
+                try:
+                    results[filename] = future.result()
+                except Exception as e:
+                    failed[filename] = e
+
+        if failed:
+            self.record(failed)
+            # Files skipped after another fetch found esm.sh unreachable add nothing
+            shown = {name: e for name, e in failed.items() if not isinstance(e, Offline)} or failed
+            return [], [f"Failed to upgrade {filename}: {e}" for filename, e in shown.items()]
+        self.record(dict.fromkeys(results))
+
+        for filename, (content, _, _) in results.items():
+            self.write(filename, content)
+        self.tag(
+            {filename: hash for filename, (_, hash, _) in results.items()},
+            {filename: pruned for filename, (_, _, pruned) in results.items()},
+        )
+        return sorted(results), []
 
     def needs_redownload(self, name: str) -> bool:
-        """Check if a language file is missing, broken, or has missing deps at any depth."""
+        """Check if a language file is missing, broken, or has missing deps at any depth.
+
+        A grammar fetched in the other mode counts as broken too: a pruned one
+        outside shallow mode, or one with deps never checked for pruning in it.
+        """
+        index = self.read_index()
         stack = [name]
         seen = set()
 
@@ -123,7 +587,14 @@ class ShikiStore:
             if _IMPORT_RE.search(text):
                 return True
 
-            stack.extend(_LOCAL_RE.findall(text))
+            deps = _LOCAL_RE.findall(text)
+            entry = index.get(path.name, {})
+            if self.shallow and deps and "pruned" not in entry:
+                return True
+            if not self.shallow and entry.get("pruned"):
+                return True
+
+            stack.extend(deps)
 
         return False
 
@@ -135,6 +606,14 @@ class ShikiStore:
         """Get set of theme names that exist locally."""
         return {f.stem.removeprefix("_theme-") for f in self.dir.glob("_theme-*.js")}
 
+    def known_langs(self) -> set[str]:
+        """Language names the reviewer can highlight: installed grammars and their aliases."""
+        names = set()
+        for f in self.dir.glob("_lang-*.js"):
+            names.add(f.stem.removeprefix("_lang-"))
+            names.update(lang_aliases(f.read_text(encoding="utf-8")))
+        return names
+
     def local_deps(self, name: str) -> list[str]:
         """Get direct local deps for a downloaded language."""
         path = self.dir / f"_lang-{name}.js"
@@ -175,27 +654,74 @@ class ShikiStore:
 
         return deps
 
-    def cleanup(self, config: dict) -> list[str]:
-        """Remove unused language/theme files. Returns removed filenames."""
-        removed = []
+    def unused(self, config: dict) -> list[str]:
+        """Language/theme files the config doesn't need, in cleanup order."""
         roots = set(config.get("languages", []))
         keep = roots | self.collect_deps(roots)
         themes = {config["themes"]["light"], config["themes"]["dark"]}
+        langs = [f.name for f in self.dir.glob("_lang-*.js") if f.stem.removeprefix("_lang-") not in keep]
+        return langs + [f.name for f in self.dir.glob("_theme-*.js") if f.stem.removeprefix("_theme-") not in themes]
 
-        for f in self.dir.glob("_lang-*.js"):
-            name = f.stem.removeprefix("_lang-")
-            if name not in keep:
-                f.unlink()
-                removed.append(f.name)
-
-        for f in self.dir.glob("_theme-*.js"):
-            name = f.stem.removeprefix("_theme-")
-            if name not in themes:
-                f.unlink()
-                removed.append(f.name)
+    def cleanup(self, config: dict) -> list[str]:
+        """Remove unused language/theme files. Returns removed filenames."""
+        removed = self.unused(config)
+        for name in removed:
+            (self.dir / name).unlink()
 
+        if removed:
+            self.tag({name: None for name in removed})
         return removed
 
+    def verify(self, config: dict) -> dict[str, list[str]]:
+        """Check the store can serve the config without downloading.
+
+        Returns problems by kind, all empty for a good store: `missing`
+        selected languages (or their deps) and themes that aren't usable,
+        `stale` files from another Shiki version, `unreadable` modules whose
+        JSON can't be parsed, and files the index doesn't know (`untracked`)
+        or knows without a file (`dangling`).
+        """
+        self.shallow = bool(config.get("shallow"))
+        index = self.read_index()
+        files = {f.name: f for f in [*self.dir.glob("_lang-*.js"), *self.dir.glob("_theme-*.js")]}
+        themes = {config["themes"]["light"], config["themes"]["dark"]}
+        return {
+            "missing": sorted(
+                [f"_lang-{lang}.js" for lang in set(config.get("languages", [])) if self.needs_redownload(lang)]
+                + [f"_theme-{theme}.js" for theme in themes if f"_theme-{theme}.js" not in files]
+            ),
+            "stale": self.stale(),
+            "unreadable": sorted(
+                name for name, f in files.items() if module_json(f.read_text(encoding="utf-8", errors="replace")) is None
+            ),
+            "untracked": sorted(set(files) - set(index)),
+            "dangling": sorted(set(index) - set(files)),
+        }
+
+    def token_colors(self, config: dict) -> Optional[dict[str, list[str]]]:
+        """Token colors of the configured light and dark themes, or None if
+        either isn't downloaded or can't be read."""
+        colors = {}
+        for mode in ("light", "dark"):
+            try:
+                text = (self.dir / f"_theme-{config['themes'][mode]}.js").read_text(encoding="utf-8")
+            except (OSError, KeyError, UnicodeDecodeError):
+                return None
+            data = module_json(text)
+            if not isinstance(data, dict):
+                return None
+            colors[mode] = theme_colors(data)
+        return colors
+
+    def pruned(self) -> dict[str, list[str]]:
+        """Embedded grammars pruned from installed languages in shallow mode."""
+        index = self.read_index()
+        return {
+            name: index[f"_lang-{name}.js"]["pruned"]
+            for name in sorted(self.local_langs())
+            if index.get(f"_lang-{name}.js", {}).get("pruned")
+        }
+
     def debug_data(self, config: dict) -> dict:
         """Summarize local languages and their dependency graph."""
         roots = sorted(set(config.get("languages", [])))
@@ -218,6 +744,9 @@ class ShikiStore:
             "deps": deps,
             "rev": rev,
             "themes": sorted(self.local_themes()),
+            "stale": self.stale(),
+            "shallow": bool(config.get("shallow")),
+            "pruned": self.pruned(),
         }
 
     def debug_text(self, config: dict) -> str:
@@ -230,8 +759,16 @@ class ShikiStore:
             f"missing selected: {', '.join(data['miss']) or '-'}",
             f"dependency-only: {', '.join(data['deps']) or '-'}",
             f"installed themes: {', '.join(data['themes']) or '-'}",
-            "dependency graph:",
+            f"stale (older shiki): {', '.join(data['stale']) or '-'}",
+            f"embedded grammars: {'shallow' if data['shallow'] else 'all'}",
+            "pruned embedded grammars:",
         ]
+        if data["pruned"]:
+            for name, deps in data["pruned"].items():
+                lines.append(f"  - {name}: {', '.join(deps)}")
+        else:
+            lines.append("  -")
+        lines.append("dependency graph:")
         if data["graph"]:
             for name in data["have"]:
                 deps = ", ".join(data["graph"][name]) or "-"
@@ -241,45 +778,111 @@ class ShikiStore:
             lines.append("  -")
         return "\n".join(lines)
 
-    def sync(self, config: dict) -> tuple[list[str], list[str]]:
+    def sync(
+        self, config: dict, backoff: bool = False, langs: bool = True, workers: int = 1
+    ) -> tuple[list[str], list[str]]:
         """Download missing/broken languages and themes.
 
-        Returns (downloaded, errors) lists.
+        Files left by an older Shiki version are upgraded first. The first
+        fetch probes esm.sh, and once a fetch finds it unreachable the rest
+        fail at once (`offline` is then True). With backoff=True, files that
+        failed recently wait for their retry time. With `shallow` set in the
+        config, grammars embedded in others (script tags in html, fenced
+        code in markdown) are pruned; a selected one still highlights since
+        it loads on its own. Grammars are fetched again when the setting
+        changes. langs=False only fetches missing themes. Up to `workers`
+        files download at once, each shared dep only once; results keep
+        config order. Returns (downloaded, errors) lists.
         """
-        downloaded = []
-        errors = []
-
-        for lang in config.get("languages", []):
-            if self.needs_redownload(lang):
-                try:
-                    self.download_lang(lang)
-                    downloaded.append(f"_lang-{lang}.js")
-                except Exception as e:
-                    errors.append(f"Failed to download {lang}: {e}")
+        self.offline = None
+        self.shallow = bool(config.get("shallow"))
+        skip = frozenset(self.deferred()) if backoff else frozenset()
+        downloaded, errors = self.upgrade(skip) if langs else ([], [])
+        results = {}
+        seen: set[str] = set()
+        # filename → (error prefix, download)
+        jobs: dict[str, tuple[str, Callable[[], None]]] = {}
+
+        for lang in config.get("languages", []) if langs else []:
+            filename = f"_lang-{lang}.js"
+            if filename not in skip and filename not in jobs and self.needs_redownload(lang):
+                jobs[filename] = (f"Failed to download {lang}", partial(self.download_lang, lang, seen))
 
         for theme in [config["themes"]["light"], config["themes"]["dark"]]:
-            if not (self.dir / f"_theme-{theme}.js").exists():
+            filename = f"_theme-{theme}.js"
+            if filename not in skip and filename not in jobs and not (self.dir / filename).exists():
+                jobs[filename] = (f"Failed to download theme {theme}", partial(self.download_theme, theme))
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {filename: pool.submit(download) for filename, (_, download) in jobs.items()}
+            for filename, future in futures.items():
                 try:
-                    self.download_theme(theme)
-                    downloaded.append(f"_theme-{theme}.js")
+                    if future.result() is False:
+                        continue
+                    downloaded.append(filename)
+                    results[filename] = None
                 except Exception as e:
-                    errors.append(f"Failed to download theme {theme}: {e}")
+                    errors.append(f"{jobs[filename][0]}: {e}")
+                    results[filename] = e
 
+        self.record(results)
         return downloaded, errors
 
+    def retry(self, config: dict) -> Optional[list[str]]:
+        """Retry downloads that failed offline. Safe to run off the main thread.
 
-# Default instance
-store = ShikiStore(ADDON_DIR)
+        Returns None while esm.sh is still unreachable, else the files
+        downloaded. Reaching esm.sh lifts the backoff of network failures;
+        files that failed with a bad response keep theirs.
+        """
+        if not probe():
+            return None
+        with self._lock:
+            failures = self.read_failures()
+            self.write_failures({name: val for name, val in failures.items() if not val[2]})
+        downloaded, _ = self.sync(config, backoff=True)
+        return None if self.offline else downloaded
 
 
 # Anki glue (lazy-import aqt)
 
+_config: Optional[dict] = None
+
+
 def get_config() -> dict:
-    """Get add-on config, falling back to defaults."""
+    """Get add-on config, falling back to defaults.
+
+    Read from the add-on manager once, then served from memory; each call
+    gets its own copy to change. Outside Anki (no aqt, or no main window)
+    it's the defaults.
+    """
+    global _config
+    if _config is None:
+        try:
+            from aqt import mw
+        except ImportError:
+            mw = None
+        _config = (mw and mw.addonManager.getConfig(__name__.split(".")[0])) or _default_config()
+    return copy.deepcopy(_config)
+
+
+def set_config(config: dict):
+    """Save add-on config and keep the in-memory copy in step."""
+    global _config
     from aqt import mw
-    return mw.addonManager.getConfig(__name__.split(".")[0]) or DEFAULT_CONFIG
+    mw.addonManager.writeConfig(__name__.split(".")[0], config)
+    _config = copy.deepcopy(config)
+
 
+def forget_config(*_):
+    """Drop the in-memory config, e.g. after Anki's config editor saved it."""
+    global _config
+    _config = None
 
-def generate_config_json() -> str:
-    """Generate JSON config string for embedding in templates."""
-    return json.dumps(get_config(), separators=(",", ":"))
+
+def generate_config_json(**extra) -> str:
+    """Generate JSON config string for embedding in templates.
+
+    Keyword arguments add published-only keys, like the token stylesheet.
+    """
+    return json.dumps({**get_config(), **extra}, separators=(",", ":"))
@@ -0,0 +1,54 @@
+"""Startup timing for the add-on.
+
+Records how long importing the package and each startup step took, so the
+add-on's share of Anki's launch time shows up in the debug report. Set
+ANKI_MD_PROFILE=1 to print each step as it finishes, and ANKI_MD_PROFILE=full
+to also print a cProfile summary of it.
+"""
+
+from contextlib import contextmanager
+import os
+import time
+
+MODE = os.environ.get("ANKI_MD_PROFILE", "")
+TOP = 15
+
+# (step, milliseconds) in the order they finished
+spans: list[tuple[str, float]] = []
+
+
+def record(name: str, ms: float):
+    spans.append((name, ms))
+    if MODE:
+        print(f"[anki-md] {name}: {ms:.1f} ms")
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block as one startup step."""
+    profiler = None
+    if MODE == "full":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000)
+        if profiler:
+            import pstats
+
+            profiler.disable()
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(TOP)
+
+
+def report() -> str:
+    """One line per step plus the total, for the debug report."""
+    if not spans:
+        return "startup: -"
+    total = sum(ms for _name, ms in spans)
+    lines = [f"startup: {total:.1f} ms"]
+    lines.extend(f"  - {name}: {ms:.1f} ms" for name, ms in spans)
+    return "\n".join(lines)
@@ -0,0 +1,33 @@
+/**
+ * Time the cloze parser on large notes. Each row doubles the input size;
+ * linear scaling shows up as the time roughly doubling too.
+ */
+import { postProcessCloze, processCloze } from "../src/cloze";
+
+const cases: Record<string, (n: number) => string> = {
+  flat: (n) => "{{c1::alpha}} beta {{c2::gamma::hint}} ".repeat(n),
+  nested: (n) => `${"{{c1::a {{c2::".repeat(n)}x${"}} b}}".repeat(n)}`,
+  unclosed: (n) => "{{c1::a {{c2::b ".repeat(n),
+  code: (n) => "{{c1::`const { a } = b`{js}}} and {{c2::`x`{.ts}::blur}}\n".repeat(n),
+};
+
+function time(fn: () => void): number {
+  const start = performance.now();
+  fn();
+  return performance.now() - start;
+}
+
+for (const [name, make] of Object.entries(cases)) {
+  console.log(name);
+  for (let n = 1000; n <= 16000; n *= 2) {
+    // Fresh text per run so the parse cache doesn't hide the work
+    const text = `${make(n)}${n}`;
+    const ms = time(() => {
+      for (const ord of [1, 2]) {
+        postProcessCloze(processCloze(text, ord, "front"));
+        postProcessCloze(processCloze(text, ord, "back"));
+      }
+    });
+    console.log(`  ${String(text.length).padStart(8)} chars  ${ms.toFixed(1).padStart(8)} ms`);
+  }
+}
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""A local stand-in for esm.sh, for testing and timing Shiki downloads offline.
+
+Serves `@shikijs/{langs,themes}@<version>/es2022/<name>.mjs` from
+node_modules (or any module source) over plain HTTP on localhost, with
+per-request latency, a bandwidth cap, and dropped connections, 5xx
+responses and truncated bodies at seeded rates or for chosen modules.
+Tests start it through the `esm_server` fixture; run directly, it times
+sync, upgrade and cleanup of the add-on's store against it:
+
+    python3 scripts/esm_server.py --latency 0.05 --bandwidth 500000
+    python3 scripts/esm_server.py --reset 0.1 --languages html,markdown
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Optional
+import argparse
+import importlib.util
+import json
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = Path(__file__).parent.parent
+DIST = ROOT / "node_modules" / "@shikijs"
+FAULTS = ("reset", "error", "truncate")
+# Bytes written between bandwidth pauses
+CHUNK = 16 * 1024
+
+_PATH_RE = re.compile(r"^/@shikijs/(langs|themes)@[^/]+/es2022/([^/]+)\.mjs$")
+
+
+def dist(root: Path = DIST) -> Callable[[str, str], Optional[bytes]]:
+    """Module source reading `<root>/{langs,themes}/dist/<name>.mjs`."""
+
+    def source(kind: str, name: str) -> Optional[bytes]:
+        path = root / kind / "dist" / f"{name}.mjs"
+        return path.read_bytes() if path.is_file() else None
+
+    return source
+
+
+class Faults:
+    """How the server misbehaves.
+
+    `latency` is seconds before each response and `bandwidth` caps bytes
+    per second. `reset` drops the connection unanswered, `error` answers
+    503 and `truncate` cuts the body short; each is a share of requests
+    (0-1) drawn from a seeded RNG. `rules` maps module names to a fault
+    that hits every request for them.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        bandwidth: Optional[int] = None,
+        reset: float = 0.0,
+        error: float = 0.0,
+        truncate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.rates = {"reset": reset, "error": error, "truncate": truncate}
+        self.rules: dict[str, str] = {}
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def pick(self, name: str) -> Optional[str]:
+        if name in self.rules:
+            return self.rules[name]
+        with self.lock:
+            roll = self.rng.random()
+        for fault in FAULTS:
+            if roll < self.rates[fault]:
+                return fault
+            roll -= self.rates[fault]
+        return None
+
+
+class EsmServer:
+    """The stand-in server, run on a background thread.
+
+    Every request is logged to `requests` as (module name, fault or None),
+    and `sent` counts body bytes written.
+    """
+
+    def __init__(self, source: Callable[[str, str], Optional[bytes]] = None, faults: Optional[Faults] = None):
+        self.source = source or dist()
+        self.faults = faults or Faults()
+        self.requests: list[tuple[str, Optional[str]]] = []
+        self.sent = 0
+        self.lock = threading.Lock()
+        self.httpd: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    @property
+    def base(self) -> str:
+        """Stands in for shiki.ESM_BASE."""
+        host, port = self.address
+        return f"http://{host}:{port}/@shikijs"
+
+    def start(self) -> "EsmServer":
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop serving; connections are refused from then on, as when offline."""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        match = _PATH_RE.match(handler.path)
+        body = match and self.source(match.group(1), match.group(2))
+        name = match.group(2) if match else handler.path
+        fault = self.faults.pick(name)
+        self.requests.append((name, fault))
+
+        if self.faults.latency:
+            time.sleep(self.faults.latency)
+        if fault == "reset":
+            handler.close_connection = True
+            return
+        if fault == "error" or body is None:
+            handler.send_error(503 if fault == "error" else 404)
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/javascript; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        if fault == "truncate":
+            body = body[: len(body) // 2]
+        for i in range(0, len(body), CHUNK):
+            chunk = body[i : i + CHUNK]
+            handler.wfile.write(chunk)
+            with self.lock:
+                self.sent += len(chunk)
+            if self.faults.bandwidth:
+                time.sleep(len(chunk) / self.faults.bandwidth)
+        handler.close_connection = True
+
+
+# Benchmark
+
+
+def load_shiki():
+    spec = importlib.util.spec_from_file_location("shiki", ROOT / "anki_markdown" / "shiki.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def bench(server: EsmServer, config: dict, out=None):
+    """Time the store's sync stages against the server, one line per stage."""
+    out = out or sys.stdout
+    shiki = load_shiki()
+    shiki.ESM_BASE = server.base
+    shiki.PROBE_HOST = server.address
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dir = Path(tmp)
+        kept = {**config, "languages": config["languages"][: max(1, len(config["languages"]) // 2)]}
+        stages = [
+            ("cold sync", lambda: shiki.ShikiStore(dir).sync(config)),
+            ("warm sync", lambda: shiki.ShikiStore(dir).sync(config)),
+            ("shallow sync", lambda: shiki.ShikiStore(dir).sync({**config, "shallow": True})),
+            ("upgrade", lambda: shiki.ShikiStore(dir, version="next", hashes={}).upgrade()),
+            ("cleanup", lambda: (shiki.ShikiStore(dir).cleanup(kept), [])),
+        ]
+        for label, run in stages:
+            requests, sent = len(server.requests), server.sent
+            start = time.perf_counter()
+            files, errors = run()
+            ms = (time.perf_counter() - start) * 1000
+            size = sum(f.stat().st_size for f in dir.glob("_*.js"))
+            out.write(
+                f"{label:<14}{ms:>9.0f} ms{len(server.requests) - requests:>6} req"
+                f"{(server.sent - sent) / 1024:>9.0f} KiB{len(files):>5} files{len(errors):>4} errors"
+                f"{size / 1024:>9.0f} KiB stored\n"
+            )
+            if errors:
+                for error in errors[:3]:
+                    out.write(f"  {error}\n")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    p.add_argument("--bandwidth", type=int, help="bytes per second per response")
+    p.add_argument("--reset", type=float, default=0.0, help="share of dropped connections")
+    p.add_argument("--error", type=float, default=0.0, help="share of 503 responses")
+    p.add_argument("--truncate", type=float, default=0.0, help="share of truncated bodies")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--languages", help="comma-separated; defaults to the add-on's default config")
+    p.add_argument("--dist", type=Path, default=DIST, help="directory with langs/ and themes/ packages")
+    args = p.parse_args(argv)
+
+    config = json.loads((ROOT / "anki_markdown" / "config.json").read_text(encoding="utf-8"))
+    if args.languages:
+        config["languages"] = [name for name in args.languages.split(",") if name]
+    if not (args.dist / "langs" / "dist").is_dir():
+        print(f"No Shiki packages in {args.dist}; run bun install first.", file=sys.stderr)
+        return 1
+    faults = Faults(args.latency, args.bandwidth, args.reset, args.error, args.truncate, args.seed)
+    with EsmServer(dist(args.dist), faults) as server:
+        bench(server, config)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,7 +4,8 @@
  * Run: bun run generate
  */
 import { bundledLanguagesInfo, bundledThemesInfo } from "shiki";
-import { rmSync, readdirSync } from "fs";
+import { rmSync, readdirSync, readFileSync } from "fs";
+import { createHash } from "crypto";
 
 const ADDON_DIR = "anki_markdown";
 
@@ -29,6 +30,37 @@ const languageNames = [...allLanguages].sort();
 
 const themeNames = bundledThemesInfo.map((t) => t.id).sort();
 
+// sha256 of the grammar or theme each upstream module embeds, so installed
+// stores can tell which files actually changed between Shiki versions.
+// esm.sh rebuilds and minifies modules, so this hashes the embedded JSON
+// text, which both builds share, like source_hash() in shiki.py. Aliases
+// hash their target module.
+const ALIAS = /from\s*["']\.\/([^"'.]+)\.mjs["']/;
+const EMBEDDED = /JSON\.parse\((["'])((?:\\.|(?!\1).)*)\1\)/s;
+
+function source(raw: Buffer): Buffer {
+  const match = raw.toString("utf-8").match(EMBEDDED);
+  // Evaluate the string literal: node_modules is trusted at build time
+  return match ? Buffer.from(new Function(`return ${match[1]}${match[2]}${match[1]}`)() as string, "utf-8") : raw;
+}
+
+function hashes(dir: string, names: string[]) {
+  const out: Record<string, string> = {};
+  for (const name of names) {
+    let raw = readFileSync(`${dir}/${name}.mjs`);
+    const alias = raw.length < 200 ? raw.toString("utf-8").match(ALIAS) : null;
+    if (alias) raw = readFileSync(`${dir}/${alias[1]}.mjs`);
+    out[name] = createHash("sha256").update(source(raw)).digest("hex");
+  }
+  return out;
+}
+
+const langFiles = new Set(readdirSync("node_modules/@shikijs/langs/dist").map((f) => f.replace(/\.mjs$/, "")));
+const sourceHashes = {
+  langs: hashes("node_modules/@shikijs/langs/dist", languageNames.filter((name) => langFiles.has(name))),
+  themes: hashes("node_modules/@shikijs/themes/dist", themeNames),
+};
+
 const config = await Bun.file("config.json").json();
 
 for (const lang of config.languages) {
@@ -49,7 +81,7 @@ for (const theme of [config.themes.light, config.themes.dark]) {
 
 await Bun.write(
   `${ADDON_DIR}/shiki-data.json`,
-  JSON.stringify({ version: shikiVersion, languages: languageNames, themes: themeNames }) + "\n",
+  JSON.stringify({ version: shikiVersion, languages: languageNames, themes: themeNames, hashes: sourceHashes }) + "\n",
 );
 
 await Bun.write(
@@ -58,7 +90,11 @@ await Bun.write(
     {
       languages: config.languages,
       themes: config.themes,
+      shallow: config.shallow ?? false,
       cardless: config.cardless ?? false,
+      worker: config.worker ?? false,
+      classes: config.classes ?? false,
+      prerender: config.prerender ?? false,
     },
     null,
     2,
@@ -68,7 +104,7 @@ await Bun.write(
 const files = readdirSync(ADDON_DIR);
 let cleaned = 0;
 for (const file of files) {
-  if (file.startsWith("_lang-") || file.startsWith("_theme-")) {
+  if (file.startsWith("_lang-") || file.startsWith("_theme-") || file === "shiki-store.json") {
     rmSync(`${ADDON_DIR}/${file}`);
     cleaned++;
   }
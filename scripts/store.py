@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Manage a Shiki store without Anki, for provisioning and CI.
+
+Runs the add-on's store operations against a directory and a config file
+and prints JSON. A store synced once (e.g. per release) can be copied to
+other machines' add-on store folders (user_files/shiki) so they don't
+download anything themselves:
+
+    python3 scripts/store.py sync --dir build/store --config team.json --jobs 16
+    python3 scripts/store.py verify --dir build/store --config team.json
+    python3 scripts/store.py cleanup --dir build/store --config team.json --dry-run
+    python3 scripts/store.py graph
+    python3 scripts/store.py size
+
+The config file holds add-on config keys (languages, themes, shallow); keys
+it leaves out take the add-on's defaults. sync and verify exit with 1 when
+something failed or is wrong.
+"""
+
+from pathlib import Path
+import argparse
+import importlib.util
+import json
+import sys
+
+ROOT = Path(__file__).parent.parent
+ADDON_DIR = ROOT / "anki_markdown"
+STORE_DIR = ADDON_DIR / "user_files" / "shiki"
+
+
+def load_shiki():
+    # The add-on package registers Anki hooks on import, so load shiki.py alone
+    spec = importlib.util.spec_from_file_location("shiki", ADDON_DIR / "shiki.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def sizes(store, config: dict) -> dict:
+    """Bytes stored, by kind and file, and how many of them the config needs."""
+    files = {f.name: f.stat().st_size for f in sorted([*store.dir.glob("_lang-*.js"), *store.dir.glob("_theme-*.js")])}
+    unused = set(store.unused(config))
+    return {
+        "total": sum(files.values()),
+        "langs": sum(size for name, size in files.items() if name.startswith("_lang-")),
+        "themes": sum(size for name, size in files.items() if name.startswith("_theme-")),
+        "needed": sum(size for name, size in files.items() if name not in unused),
+        "files": files,
+    }
+
+
+def run(args, shiki) -> tuple[dict, int]:
+    """Run one command. Returns (JSON report, exit code)."""
+    config = shiki.read_config(args.config) if args.config else shiki.get_config()
+    args.dir.mkdir(parents=True, exist_ok=True)
+    store = shiki.ShikiStore(args.dir)
+
+    if args.command == "sync":
+        downloaded, errors = store.sync(config, workers=args.jobs)
+        removed = store.cleanup(config) if args.cleanup else []
+        return {"downloaded": downloaded, "removed": removed, "errors": errors}, int(bool(errors))
+    if args.command == "verify":
+        problems = store.verify(config)
+        return {"ok": not any(problems.values()), **problems}, int(any(problems.values()))
+    if args.command == "cleanup":
+        removed = store.unused(config) if args.dry_run else store.cleanup(config)
+        return {"removed": removed, "dry_run": args.dry_run}, 0
+    if args.command == "graph":
+        return store.debug_data(config), 0
+    return sizes(store, config), 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("command", choices=["sync", "verify", "cleanup", "graph", "size"])
+    p.add_argument("--dir", type=Path, default=STORE_DIR, help="store directory (default: the add-on's store)")
+    p.add_argument("--config", type=Path, help="config JSON (default: the add-on's defaults)")
+    p.add_argument("--jobs", type=int, default=8, help="parallel downloads for sync")
+    p.add_argument("--cleanup", action="store_true", help="sync: also remove files the config doesn't need")
+    p.add_argument("--dry-run", action="store_true", help="cleanup: only list what would be removed")
+    args = p.parse_args(argv)
+
+    report, code = run(args, load_shiki())
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write("\n")
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
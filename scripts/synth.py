@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""Generate large synthetic Anki Markdown decks for load testing.
+
+Notes are built from the kitchen-sink fixture's notes: code block and inline
+code languages are redrawn from a weighted mix, cloze notes get a chosen
+number of fresh deletions, and back fields can be lengthened by appending
+other templates' bodies. The same seed always yields the same deck.
+
+    python3 scripts/synth.py --notes 100000 --seed 1 -o /tmp/synthetic.apkg
+    python3 scripts/synth.py --notes 20000 --format md -o /tmp/synthetic
+"""
+
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import random
+import re
+import shutil
+import sqlite3
+import string
+import sys
+import tempfile
+import zipfile
+
+ROOT = Path(__file__).parent.parent
+FIXTURE = ROOT / "fixtures" / "kitchen-sink-deck.apkg"
+NOTETYPE = "Anki Markdown"
+NOTETYPE_CLOZE = "Anki Markdown Cloze"
+# Fixed ids and times keep output byte-stable across runs
+BASE_ID = 1_700_000_000_000
+MOD = 1_700_000_000
+DECK_ID = BASE_ID - 1_000_000
+# Notes per file in markdown output
+PER_FILE = 100
+LANGS = "python=3,javascript=3,typescript=2,rust=1,go=1"
+# Zip entry time (zip can't store dates before 1980)
+ZIP_TIME = (2024, 1, 1, 0, 0, 0)
+
+_FENCE_RE = re.compile(r"^(```+|~~~+)([^\s`{}]*)", re.MULTILINE)
+_INLINE_RE = re.compile(r"(`[^`\n]+`)\{\.?[^{}\s]+\}")
+_CLOZE_RE = re.compile(r"\{\{c\d+::((?:(?!\{\{c\d+::).)*?)(?:::(?:(?!\{\{c\d+::).)*?)?\}\}", re.DOTALL)
+# Text a deletion must not cut through: code, cloze tags, links, HTML and callout markers
+_PROTECTED_RE = re.compile(r"```.*?```|~~~.*?~~~|`[^`\n]*`(?:\{[^}]*\})?|\{\{.*?\}\}|\[[^\]]*\]\([^)]*\)|<[^>]+>|\[![A-Z]+\]", re.DOTALL)
+_WORD_RE = re.compile(r"\b[A-Za-z][A-Za-z'-]{3,}\b")
+
+
+def templates(path: Path = FIXTURE) -> tuple[list[list[str]], list[list[str]]]:
+    """(basic, cloze) field lists of the fixture's Anki Markdown notes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        with zipfile.ZipFile(path) as z:
+            z.extract("collection.anki21", tmp)
+        db = sqlite3.connect(Path(tmp) / "collection.anki21")
+        try:
+            models = {int(mid): m["name"] for mid, m in json.loads(db.execute("select models from col").fetchone()[0]).items()}
+            rows = db.execute("select mid, flds from notes order by id").fetchall()
+        finally:
+            db.close()
+    basic = [flds.split("\x1f") for mid, flds in rows if models.get(mid) == NOTETYPE]
+    cloze = [flds.split("\x1f") for mid, flds in rows if models.get(mid) == NOTETYPE_CLOZE]
+    return basic, cloze
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    """`python=3,js=1,rust` → weights by language."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, _, weight = part.partition("=")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def strip_cloze(text: str) -> str:
+    """Cloze markup replaced by its answers, innermost first."""
+    while True:
+        text, n = _CLOZE_RE.subn(lambda m: m.group(1), text)
+        if not n:
+            return text
+
+
+class Generator:
+    def __init__(
+        self,
+        seed: int = 0,
+        langs: dict[str, float] = None,
+        cloze: float = 0.5,
+        deletions: float = 2.0,
+        length: float = 1.0,
+        decks: int = 10,
+    ):
+        self.rng = random.Random(seed)
+        self.langs = langs or parse_mix(LANGS)
+        self.cloze = cloze
+        self.deletions = deletions
+        self.length = length
+        self.decks = [f"Synthetic::Deck {i:03}" for i in range(1, decks + 1)]
+        self.basic, self.clozes = templates()
+        self.bodies = [fields[1] for fields in self.basic + self.clozes if len(fields) > 1 and fields[1].strip()]
+
+    def lang(self) -> str:
+        return self.rng.choices(list(self.langs), weights=list(self.langs.values()))[0]
+
+    def relang(self, text: str) -> str:
+        text = _FENCE_RE.sub(lambda m: m.group(1) + (self.lang() if m.group(2) else ""), text)
+        return _INLINE_RE.sub(lambda m: f"{m.group(1)}{{{self.lang()}}}", text)
+
+    def lengthen(self, text: str) -> str:
+        """Append other notes' bodies; `length` is the mean number of bodies per field."""
+        extra = round(self.rng.expovariate(1 / (self.length - 1))) if self.length > 1 else 0
+        parts = [text] + [self.rng.choice(self.bodies) for _ in range(extra)]
+        return "\n\n".join(part for part in parts if part)
+
+    def add_deletions(self, text: str) -> str:
+        """Wrap random words outside code, links and HTML in fresh cloze tags.
+
+        Short templates cap the count at the words they have.
+        """
+        text = strip_cloze(text)
+        spans, last = [], 0
+        for m in _PROTECTED_RE.finditer(text):
+            spans.append((last, m.start()))
+            last = m.end()
+        spans.append((last, len(text)))
+        words = [m.span() for start, end in spans for m in _WORD_RE.finditer(text, start, end)]
+        if not words:
+            return f"{{{{c1::{text}}}}}"
+        count = max(1, min(len(words), round(self.rng.gauss(self.deletions, self.deletions / 3))))
+        chosen = sorted(self.rng.sample(words, count))
+        ords = list(range(1, count + 1))
+        self.rng.shuffle(ords)
+        for (start, end), ord in sorted(zip(chosen, ords), reverse=True):
+            hint = "::blur" if self.rng.random() < 0.1 else ""
+            text = f"{text[:start]}{{{{c{ord}::{text[start:end]}{hint}}}}}{text[end:]}"
+        return text
+
+    def note(self, n: int) -> tuple[bool, list[str], str, list[str]]:
+        """(is cloze, fields, deck, tags) of note n."""
+        cloze = self.rng.random() < self.cloze
+        fields = list(self.rng.choice(self.clozes if cloze else self.basic)) + [""]
+        front = self.add_deletions(fields[0]) if cloze else fields[0]
+        front, back = self.relang(front), self.relang(fields[1])
+        deck = self.decks[n % len(self.decks)]
+        tags = ["synthetic", f"batch{n // 1000}"]
+        return cloze, [front, self.lengthen(back)], deck, tags
+
+    def notes(self, count: int):
+        for n in range(count):
+            yield self.note(n)
+
+
+def cloze_ords(text: str) -> list[int]:
+    return sorted({int(n) for n in re.findall(r"\{\{c(\d+)::", text)}) or [1]
+
+
+def write_apkg(gen: Generator, count: int, out: Path):
+    """An .apkg with the fixture's notetypes and decks plus the generated notes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        with zipfile.ZipFile(FIXTURE) as z:
+            z.extractall(tmp)
+        db = sqlite3.connect(tmp / "collection.anki21")
+        models = json.loads(db.execute("select models from col").fetchone()[0])
+        mids = {m["name"]: int(mid) for mid, m in models.items()}
+        decks = json.loads(db.execute("select decks from col").fetchone()[0])
+        default = decks["1"]
+        dids = {}
+        for i, name in enumerate(["Synthetic", *gen.decks]):
+            did = DECK_ID + i
+            decks[str(did)] = {**default, "id": did, "name": name, "mod": MOD, "collapsed": False}
+            dids[name] = did
+        db.execute("update col set decks = ?", (json.dumps(decks),))
+        db.execute("delete from notes")
+        db.execute("delete from cards")
+
+        rng = random.Random(gen.rng.random())
+        cid = BASE_ID
+        for n, (cloze, fields, deck, tags) in enumerate(gen.notes(count)):
+            nid = BASE_ID + n
+            guid = "".join(rng.choices(string.ascii_letters + string.digits, k=10))
+            sfld = re.sub(r"<[^>]+>", "", fields[0])
+            csum = int(hashlib.sha1(sfld.encode("utf-8")).hexdigest()[:8], 16)
+            db.execute(
+                "insert into notes values (?, ?, ?, ?, -1, ?, ?, ?, ?, 0, '')",
+                (nid, guid, mids[NOTETYPE_CLOZE if cloze else NOTETYPE], MOD, f" {' '.join(tags)} ", "\x1f".join(fields), sfld, csum),
+            )
+            for ord in [o - 1 for o in cloze_ords(fields[0])] if cloze else [0]:
+                db.execute(
+                    "insert into cards values (?, ?, ?, ?, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+                    (cid, nid, dids[deck], ord, MOD, n),
+                )
+                cid += 1
+        db.commit()
+        db.execute("vacuum")
+        db.close()
+
+        with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
+            for name in ["collection.anki2", "collection.anki21", *json.loads((tmp / "media").read_text()), "media"]:
+                info = zipfile.ZipInfo(name, ZIP_TIME)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                z.writestr(info, (tmp / name).read_bytes())
+
+
+def write_md(gen: Generator, count: int, out: Path):
+    """A folder in the importer's format: one directory per deck, PER_FILE notes per file."""
+    if out.exists():
+        shutil.rmtree(out)
+    files: dict[tuple[str, int], list[str]] = {}
+    for n, (_cloze, fields, deck, tags) in enumerate(gen.notes(count)):
+        body = f"{fields[0]}\n\n<!-- back -->\n\n{fields[1]}" if fields[1] else fields[0]
+        files.setdefault((deck, n // (PER_FILE * len(gen.decks))), []).append(f"<!-- note: {n} -->\n\n{body}\n")
+    for (deck, part), notes in files.items():
+        path = out.joinpath(*deck.split("::")) / f"part-{part:04}.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"---\ndeck: {deck}\ntags: synthetic\n---\n\n" + "\n".join(notes), encoding="utf-8")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    p.add_argument("--notes", type=int, default=10_000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--cloze", type=float, default=0.5, help="share of cloze notes (0-1)")
+    p.add_argument("--deletions", type=float, default=2.0, help="mean cloze deletions per cloze note")
+    p.add_argument("--length", type=float, default=1.0, help="mean template bodies per back field (>= 1)")
+    p.add_argument("--langs", default=LANGS, help="weighted code languages")
+    p.add_argument("--decks", type=int, default=10)
+    p.add_argument("--format", choices=["apkg", "md"], default="apkg")
+    p.add_argument("-o", "--out", type=Path, required=True)
+    args = p.parse_args(argv)
+
+    gen = Generator(args.seed, parse_mix(args.langs), args.cloze, args.deletions, args.length, args.decks)
+    (write_apkg if args.format == "apkg" else write_md)(gen, args.notes, args.out)
+    print(f"✓ {args.notes} notes → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
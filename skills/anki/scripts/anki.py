@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""AnkiConnect client with the same commands as anki.sh.
+
+Needs only the standard library. Requests share one keep-alive connection,
+per-deck lookups are batched into a single `multi` call, and notesInfo /
+cardsInfo are fetched in chunks and printed as each chunk arrives.
+"""
+
+from http.client import HTTPConnection, HTTPException
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlsplit
+import argparse
+import json
+import os
+import sys
+
+URL = os.environ.get("ANKI_URL", "http://localhost:8765")
+VERSION = 6
+# notesInfo/cardsInfo ids per request
+CHUNK = 500
+TIMEOUT = 60
+
+
+class AnkiError(Exception):
+    pass
+
+
+class AnkiConnect:
+    def __init__(self, url: str = URL, timeout: float = TIMEOUT):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 8765
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.conn: Optional[HTTPConnection] = None
+        # Round trips made, for tests and diagnostics
+        self.requests = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def post(self, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        while True:
+            reused = self.conn is not None
+            if not reused:
+                self.conn = HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request("POST", self.path, body, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (HTTPException, ConnectionError):
+                self.close()
+                # Only a kept-alive connection the server has since closed is retried
+                if not reused:
+                    raise
+        self.requests += 1
+        if response.status != 200:
+            raise AnkiError(f"HTTP {response.status}")
+        if response.getheader("Connection", "").lower() == "close":
+            self.close()
+        return unwrap(json.loads(data))
+
+    def invoke(self, action: str, **params):
+        return self.post({"action": action, "version": VERSION, "params": params})
+
+    def multi(self, calls: list[tuple[str, dict]]) -> list:
+        """Run several actions in one request. Results are in call order."""
+        if not calls:
+            return []
+        actions = [{"action": action, "version": VERSION, "params": params} for action, params in calls]
+        return [unwrap(result) for result in self.invoke("multi", actions=actions)]
+
+    def chunked(self, action: str, key: str, ids: list[int], chunk: Optional[int] = None) -> Iterator[dict]:
+        """Yield notesInfo/cardsInfo results one chunk of ids at a time."""
+        chunk = chunk or CHUNK
+        for i in range(0, len(ids), chunk):
+            yield from self.invoke(action, **{key: ids[i : i + chunk]})
+
+    def notes_info(self, ids: list[int]) -> Iterator[dict]:
+        return self.chunked("notesInfo", "notes", ids)
+
+    def cards_info(self, ids: list[int]) -> Iterator[dict]:
+        return self.chunked("cardsInfo", "cards", ids)
+
+    def deck_stats(self) -> list[dict]:
+        """Total and due card counts per deck, in two round trips for any number of decks."""
+        decks = self.invoke("deckNamesAndIds")
+        calls = []
+        for name in decks:
+            calls.append(("findCards", {"query": deck_query(name)}))
+            calls.append(("findCards", {"query": f"is:due {deck_query(name)}"}))
+        results = self.multi(calls)
+        return [
+            {"name": name, "id": id, "total": len(results[2 * i]), "due": len(results[2 * i + 1])}
+            for i, (name, id) in enumerate(decks.items())
+        ]
+
+
+def unwrap(response):
+    """The result of a v6 response, raising its error."""
+    if not isinstance(response, dict) or set(response) != {"result", "error"}:
+        raise AnkiError(f"unexpected response: {response!r}")
+    if response["error"] is not None:
+        raise AnkiError(response["error"])
+    return response["result"]
+
+
+def deck_query(name: str) -> str:
+    escaped = name.replace('"', '\\"')
+    return f'deck:"{escaped}"'
+
+
+def split_tags(tags: str) -> list[str]:
+    return [tag for tag in tags.split() if tag]
+
+
+def emit(value, out=None):
+    (out or sys.stdout).write(json.dumps(value, indent=2, ensure_ascii=False) + "\n")
+
+
+def emit_stream(items: Iterable, out=None):
+    """Print a JSON array item by item, so large results never build up in memory."""
+    out = out or sys.stdout
+    first = True
+    for item in items:
+        out.write("[\n" if first else ",\n")
+        out.write("\n".join("  " + line for line in json.dumps(item, indent=2, ensure_ascii=False).splitlines()))
+        out.flush()
+        first = False
+    out.write("[]\n" if first else "\n]\n")
+
+
+# Commands
+
+
+def cmd_sync(anki, args):
+    emit(anki.invoke("sync"))
+
+
+def cmd_decks(anki, args):
+    emit(anki.deck_stats() if args.stats else anki.invoke("deckNamesAndIds"))
+
+
+def cmd_models(anki, args):
+    emit(anki.invoke("modelNames"))
+
+
+def cmd_fields(anki, args):
+    emit(anki.invoke("modelFieldNames", modelName=args.model))
+
+
+def cmd_find(anki, args):
+    emit(anki.invoke("findNotes", query=args.query))
+
+
+def cmd_info(anki, args):
+    emit_stream(anki.notes_info(args.ids))
+
+
+def cmd_add(anki, args):
+    note = {"deckName": args.deck, "modelName": args.model, "fields": args.fields, "tags": split_tags(args.tags)}
+    emit(anki.invoke("addNote", note=note))
+
+
+def cmd_add_bulk(anki, args):
+    tags = split_tags(args.tags)
+    notes = [{"deckName": args.deck, "modelName": args.model, "fields": fields, "tags": tags} for fields in args.notes]
+    emit(anki.invoke("addNotes", notes=notes))
+
+
+def cmd_update(anki, args):
+    emit(anki.invoke("updateNoteFields", note={"id": args.id, "fields": args.fields}))
+
+
+def cmd_delete(anki, args):
+    emit(anki.invoke("deleteNotes", notes=args.ids))
+
+
+def cmd_due(anki, args):
+    query = f"is:due {deck_query(args.deck)}" if args.deck else "is:due"
+    ids = anki.invoke("findCards", query=query)[: args.limit]
+    emit_stream(anki.cards_info(ids))
+
+
+def cmd_review(anki, args):
+    emit(anki.invoke("cardsInfo", cards=[args.card]))
+
+
+def cmd_rate(anki, args):
+    emit(anki.invoke("answerCards", answers=[{"cardId": args.card, "ease": args.ease}]))
+
+
+def cmd_tags(anki, args):
+    tags = anki.invoke("getTags")
+    if args.pattern:
+        tags = [tag for tag in tags if args.pattern.lower() in tag.lower()]
+    emit(tags)
+
+
+def parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="anki.py", description="AnkiConnect client (same actions as anki.sh)")
+    sub = p.add_subparsers(dest="action", required=True, metavar="<action>")
+
+    def add(name, fn, help):
+        cmd = sub.add_parser(name, help=help)
+        cmd.set_defaults(fn=fn)
+        return cmd
+
+    add("sync", cmd_sync, "Trigger AnkiWeb sync")
+    add("decks", cmd_decks, "List decks").add_argument("--stats", action="store_true")
+    add("models", cmd_models, "List note types")
+    add("fields", cmd_fields, "List fields for a model").add_argument("model")
+    add("find", cmd_find, "Search notes (Anki query syntax)").add_argument("query")
+    add("info", cmd_info, "Get note details").add_argument("ids", type=int, nargs="+")
+    cmd = add("add", cmd_add, "Add a note")
+    cmd.add_argument("deck")
+    cmd.add_argument("model")
+    cmd.add_argument("fields", type=json.loads)
+    cmd.add_argument("--tags", default="")
+    cmd = add("add-bulk", cmd_add_bulk, "Add multiple notes")
+    cmd.add_argument("deck")
+    cmd.add_argument("model")
+    cmd.add_argument("notes", type=json.loads)
+    cmd.add_argument("--tags", default="")
+    cmd = add("update", cmd_update, "Update note fields")
+    cmd.add_argument("id", type=int)
+    cmd.add_argument("fields", type=json.loads)
+    add("delete", cmd_delete, "Delete notes").add_argument("ids", type=int, nargs="+")
+    cmd = add("due", cmd_due, "Get due cards")
+    cmd.add_argument("deck", nargs="?", default="")
+    cmd.add_argument("--limit", type=int, default=10)
+    add("review", cmd_review, "Show card for review").add_argument("card", type=int)
+    cmd = add("rate", cmd_rate, "Rate a card")
+    cmd.add_argument("card", type=int)
+    cmd.add_argument("ease", type=int, choices=[1, 2, 3, 4])
+    add("tags", cmd_tags, "List tags").add_argument("--pattern", default="")
+    return p
+
+
+def main(argv: Optional[list[str]] = None, url: str = URL) -> int:
+    args = parser().parse_args(argv)
+    with AnkiConnect(url) as anki:
+        try:
+            args.fn(anki, args)
+        except (AnkiError, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
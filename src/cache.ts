@@ -0,0 +1,151 @@
+// String cache for rendered HTML: an in-memory LRU backed by localStorage.
+// Anki desktop keeps the reviewer document (and this module) alive across
+// cards, so memory hits are the common case; AnkiDroid/AnkiMobile reload the
+// page per card and fall through to storage.
+
+const PREFIX = "anki-md:";
+
+/** 53-bit string hash (cyrb53), base36 with the length appended. */
+export function hash(text: string): string {
+  let h1 = 0xdeadbeef;
+  let h2 = 0x41c6ce57;
+  for (let i = 0; i < text.length; i++) {
+    const ch = text.charCodeAt(i);
+    h1 = Math.imul(h1 ^ ch, 2654435761);
+    h2 = Math.imul(h2 ^ ch, 1597334677);
+  }
+  h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+  h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+  return (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(36) + text.length.toString(36);
+}
+
+function storage(): Storage | null {
+  try {
+    return globalThis.localStorage ?? null;
+  } catch {
+    // Access throws in some sandboxed webviews
+    return null;
+  }
+}
+
+export class Cache {
+  private name: string;
+  private limit: number;
+  private mem = new Map<string, string>();
+  private memSize = 0;
+  // Persisted keys in LRU order (oldest first) with their sizes
+  private disk = new Map<string, number>();
+  private diskSize = 0;
+  private store = storage();
+  private flushing = false;
+
+  /**
+   * @param name storage namespace
+   * @param limit size budget in characters, applied to memory and storage separately
+   */
+  constructor(name: string, limit: number) {
+    this.name = name;
+    this.limit = limit;
+    try {
+      const raw = this.store?.getItem(this.index());
+      for (const [key, size] of raw ? (JSON.parse(raw) as [string, number][]) : []) {
+        this.disk.set(key, size);
+        this.diskSize += size;
+      }
+    } catch {
+      this.disk.clear();
+      this.diskSize = 0;
+    }
+  }
+
+  private index() {
+    return `${PREFIX}${this.name}`;
+  }
+
+  private entry(key: string) {
+    return `${PREFIX}${this.name}:${key}`;
+  }
+
+  get(key: string): string | undefined {
+    let value = this.mem.get(key);
+    if (value === undefined && this.disk.has(key)) {
+      value = this.store?.getItem(this.entry(key)) ?? undefined;
+      if (value === undefined) this.drop(key);
+    }
+    if (value === undefined) return undefined;
+    this.remember(key, value);
+    if (this.disk.has(key)) {
+      // Bump recency
+      const size = this.disk.get(key)!;
+      this.disk.delete(key);
+      this.disk.set(key, size);
+      this.flush();
+    }
+    return value;
+  }
+
+  set(key: string, value: string) {
+    if (value.length > this.limit) return;
+    this.remember(key, value);
+    if (!this.store) return;
+
+    this.drop(key);
+    while (this.diskSize + value.length > this.limit && this.disk.size) this.evict();
+    for (;;) {
+      try {
+        this.store.setItem(this.entry(key), value);
+        break;
+      } catch {
+        // Quota shared with other origins' data: shed old entries and retry
+        if (!this.disk.size) return;
+        this.evict();
+      }
+    }
+    this.disk.set(key, value.length);
+    this.diskSize += value.length;
+    this.flush();
+  }
+
+  private remember(key: string, value: string) {
+    const old = this.mem.get(key);
+    if (old !== undefined) {
+      this.mem.delete(key);
+      this.memSize -= old.length;
+    }
+    this.mem.set(key, value);
+    this.memSize += value.length;
+    for (const [oldest, html] of this.mem) {
+      if (this.memSize <= this.limit) break;
+      this.mem.delete(oldest);
+      this.memSize -= html.length;
+    }
+  }
+
+  private evict() {
+    const oldest = this.disk.keys().next().value;
+    if (oldest !== undefined) this.drop(oldest);
+  }
+
+  private drop(key: string) {
+    const size = this.disk.get(key);
+    if (size === undefined) return;
+    this.disk.delete(key);
+    this.diskSize -= size;
+    this.store?.removeItem(this.entry(key));
+    this.flush();
+  }
+
+  /** Write the key index once per task instead of on every access. */
+  private flush() {
+    if (this.flushing || !this.store) return;
+    this.flushing = true;
+    setTimeout(() => {
+      this.flushing = false;
+      try {
+        this.store?.setItem(this.index(), JSON.stringify([...this.disk]));
+      } catch {
+        console.log(`[anki-md] Failed to persist ${this.name} cache index`);
+      }
+    });
+  }
+}
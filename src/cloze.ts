@@ -41,143 +41,192 @@ function wrap(text: string, start: string, end: string): string {
   return `${start}${text}${end}`;
 }
 
-function tag(text: string): boolean {
-  return /\{[^{}\n]*$/.test(text);
+interface Frame {
+  // Index of the opening "{{" (root: -1)
+  start: number;
+  ords: number[];
+  body: Node[];
+  // Start of the current text run
+  run: number;
+  // Index of "::" once the hint began, else -1
+  hint: number;
+  // Whether the current run ends inside an unclosed `{lang}` tag
+  brace: boolean;
 }
 
-function parseTag(text: string, at: number): [Tag, number] | null {
-  if (!text.startsWith("{{c", at)) return null;
-
+/** Match "{{cN::" or "{{cN,M::" at `at`. Returns [ords, index after "::"] or null. */
+function open(text: string, at: number): [number[], number] | null {
+  if (text.charCodeAt(at) !== 123 || !text.startsWith("{{c", at)) return null;
   let i = at + 3;
-  let num = "";
   while (i < text.length) {
     const ch = text[i];
     if ((ch < "0" || ch > "9") && ch !== ",") break;
-    num += ch;
     i++;
   }
-
-  const ords = nums(num);
+  const ords = nums(text.slice(at + 3, i));
   if (!ords.length || !text.startsWith("::", i)) return null;
-  i += 2;
+  return [ords, i + 2];
+}
 
-  const body: Node[] = [];
-  let buf = "";
-  let hint = "";
-  let seen = false;
+/**
+ * Parse cloze markup into a tree in one left-to-right pass over `text`.
+ * Open tags live on a stack; tags still open at the end are kept as literal
+ * text so malformed notes render as typed.
+ */
+function parse(text: string): Node[] {
+  const root: Frame = { start: -1, ords: [], body: [], run: 0, hint: -1, brace: false };
+  const stack = [root];
+  let i = 0;
 
   while (i < text.length) {
-    if (!seen) {
-      const tag = parseTag(text, i);
+    const top = stack[stack.length - 1];
+
+    if (top.hint === -1) {
+      const tag = open(text, i);
       if (tag) {
-        push(body, buf);
-        buf = "";
-        body.push(tag[0]);
+        push(top.body, text.slice(top.run, i));
+        stack.push({ start: i, ords: tag[0], body: [], run: tag[1], hint: -1, brace: false });
         i = tag[1];
         continue;
       }
 
-      if (text.startsWith("::", i)) {
-        push(body, buf);
-        buf = "";
-        seen = true;
+      if (top !== root && text.startsWith("::", i)) {
+        push(top.body, text.slice(top.run, i));
+        top.hint = i;
+        top.brace = false;
         i += 2;
+        top.run = i;
         continue;
       }
     }
 
-    if (text.startsWith("}}", i)) {
+    if (top !== root && text.startsWith("}}", i)) {
       // Skip }} when followed by } and body ends with an unclosed {lang} tag
       // (handles `code`{js}}} where } closes {lang} and }} closes cloze)
-      if (text[i + 2] === "}" && tag(seen ? hint : buf)) {
-        if (seen) hint += text[i];
-        else buf += text[i];
+      if (text[i + 2] === "}" && top.brace) {
+        top.brace = false;
         i++;
         continue;
       }
-      if (!seen) push(body, buf);
-      return [{ body, hint: seen ? hint : undefined, ords }, i + 2];
+      stack.pop();
+      const parent = stack[stack.length - 1];
+      if (top.hint === -1) {
+        push(top.body, text.slice(top.run, i));
+        parent.body.push({ body: top.body, ords: top.ords });
+      } else {
+        parent.body.push({ body: top.body, hint: text.slice(top.run, i), ords: top.ords });
+      }
+      i += 2;
+      parent.run = i;
+      parent.brace = false;
+      continue;
     }
 
-    if (seen) hint += text[i];
-    else buf += text[i];
+    const ch = text[i];
+    if (ch === "{") top.brace = true;
+    else if (ch === "}" || ch === "\n") top.brace = false;
     i++;
   }
 
-  return null;
+  // Unclosed tags: splice their markers and contents back in as text. Each
+  // frame's body ends where the next one opened, so outermost-first order
+  // keeps the source order (and stays linear for deep nesting).
+  const top = stack[stack.length - 1];
+  for (const frame of stack) {
+    if (frame === root) continue;
+    push(root.body, text.slice(frame.start, open(text, frame.start)![1]));
+    for (const node of frame.body) root.body.push(node);
+  }
+  push(root.body, text.slice(top === root ? root.run : top.hint === -1 ? top.run : top.hint));
+  return root.body;
 }
 
-function parse(text: string): Node[] {
-  const out: Node[] = [];
-  let buf = "";
-  let i = 0;
+// Parsed trees per note text; front and back of a card parse the same text
+const trees = new Map<string, Node[]>();
+const TREES = 32;
 
-  while (i < text.length) {
-    const tag = parseTag(text, i);
-    if (!tag) {
-      buf += text[i];
-      i++;
-      continue;
-    }
-
-    push(out, buf);
-    buf = "";
-    out.push(tag[0]);
-    i = tag[1];
+function tree(text: string): Node[] {
+  let value = trees.get(text);
+  if (!value) {
+    value = parse(text);
+    if (trees.size >= TREES) trees.delete(trees.keys().next().value!);
+    trees.set(text, value);
   }
+  return value;
+}
 
-  push(out, buf);
-  return out;
+interface Level {
+  list: Node[];
+  at: number;
+  // Output buffer; shared with the parent unless this level gets wrapped
+  out: string[];
+  // Ordinal already revealed by an enclosing cloze
+  skip?: number;
+  start?: string;
+  end?: string;
 }
 
-function show(list: Node[], ord: number, side: Side, skip?: number): string {
-  let out = "";
-  for (const node of list) {
-    if (typeof node === "string") {
-      out += node;
-      continue;
-    }
+/** Render a tree for one ordinal. Iterative, so deep nesting can't overflow the stack. */
+function show(list: Node[], ord: number, side: Side): string {
+  const stack: Level[] = [{ list, at: 0, out: [] }];
 
-    const live = node.ords.includes(ord) && ord !== skip;
-    if (!live) {
-      out += show(node.body, ord, side, skip);
+  for (;;) {
+    const top = stack[stack.length - 1];
+    if (top.at === top.list.length) {
+      if (stack.length === 1) return top.out.join("");
+      stack.pop();
+      if (top.start) stack[stack.length - 1].out.push(wrap(top.out.join(""), top.start, top.end!));
       continue;
     }
 
-    if (side === "front") {
-      if (node.hint === "blur") {
-        out += wrap(show(node.body, ord, side, ord), BLUR_OPEN, BLUR_CLOSE);
-      } else {
-        out += node.hint ? `${BLANK_OPEN}[${node.hint}]${BLANK_CLOSE}` : `${BLANK_OPEN}[...]${BLANK_CLOSE}`;
-      }
+    const node = top.list[top.at++];
+    if (typeof node === "string") {
+      top.out.push(node);
       continue;
     }
 
-    const body = show(node.body, ord, side, ord);
-    out += node.hint === "blur" ? wrap(body, REVEAL_OPEN, REVEAL_CLOSE) : wrap(body, ACTIVE_OPEN, ACTIVE_CLOSE);
+    const live = node.ords.includes(ord) && ord !== top.skip;
+    if (!live) {
+      stack.push({ list: node.body, at: 0, out: top.out, skip: top.skip });
+    } else if (side === "front" && node.hint !== "blur") {
+      top.out.push(node.hint ? `${BLANK_OPEN}[${node.hint}]${BLANK_CLOSE}` : `${BLANK_OPEN}[...]${BLANK_CLOSE}`);
+    } else {
+      const [start, end] =
+        side === "front"
+          ? [BLUR_OPEN, BLUR_CLOSE]
+          : node.hint === "blur"
+            ? [REVEAL_OPEN, REVEAL_CLOSE]
+            : [ACTIVE_OPEN, ACTIVE_CLOSE];
+      stack.push({ list: node.body, at: 0, out: [], skip: ord, start, end });
+    }
   }
-
-  return out;
 }
 
 export function processCloze(text: string, ord: number, side: Side): string {
-  return show(parse(text), ord, side);
+  return show(tree(text), ord, side);
 }
 
+// Sentinels alone in a paragraph become wrapper divs; elsewhere, spans
+const BLOCKS: Record<string, string> = {
+  [BLUR_OPEN]: '<div class="cloze-blur">',
+  [BLUR_CLOSE]: "</div>",
+  [ACTIVE_OPEN]: '<div class="cloze-active">',
+  [ACTIVE_CLOSE]: "</div>",
+  [REVEAL_OPEN]: '<div class="cloze-active cloze-reveal">',
+  [REVEAL_CLOSE]: "</div>",
+};
+const SPANS: Record<string, string> = {
+  [BLANK_OPEN]: '<span class="cloze-blank">',
+  [BLANK_CLOSE]: "</span>",
+  [BLUR_OPEN]: '<span class="cloze-blur">',
+  [BLUR_CLOSE]: "</span>",
+  [ACTIVE_OPEN]: '<span class="cloze-active">',
+  [ACTIVE_CLOSE]: "</span>",
+  [REVEAL_OPEN]: '<span class="cloze-active cloze-reveal">',
+  [REVEAL_CLOSE]: "</span>",
+};
+const MARKER = /<p>([\uE002-\uE007])<\/p>|[\uE000-\uE007]/g;
+
 export function postProcessCloze(html: string): string {
-  return html
-    .replaceAll("<p>\uE002</p>", '<div class="cloze-blur">')
-    .replaceAll("<p>\uE003</p>", "</div>")
-    .replaceAll("<p>\uE004</p>", '<div class="cloze-active">')
-    .replaceAll("<p>\uE005</p>", "</div>")
-    .replaceAll("<p>\uE006</p>", '<div class="cloze-active cloze-reveal">')
-    .replaceAll("<p>\uE007</p>", "</div>")
-    .replaceAll("\uE000", '<span class="cloze-blank">')
-    .replaceAll("\uE001", "</span>")
-    .replaceAll("\uE002", '<span class="cloze-blur">')
-    .replaceAll("\uE003", "</span>")
-    .replaceAll("\uE004", '<span class="cloze-active">')
-    .replaceAll("\uE005", "</span>")
-    .replaceAll("\uE006", '<span class="cloze-active cloze-reveal">')
-    .replaceAll("\uE007", "</span>");
+  return html.replace(MARKER, (match, block?: string) => (block ? BLOCKS[block] : SPANS[match]));
 }
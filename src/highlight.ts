@@ -0,0 +1,269 @@
+// Shiki setup shared by the reviewer page and the highlighting worker.
+import { createHighlighterCore, hastToHtml } from "@shikijs/core";
+import { createJavaScriptRegexEngine } from "@shikijs/engine-javascript";
+import type { GrammarState, HighlighterCore } from "@shikijs/core";
+import type { ShikiTransformer } from "shiki";
+import type { Element } from "hast";
+
+// Config published by the add-on as _config.js
+export interface Config {
+  languages: string[];
+  themes: { light: string; dark: string };
+  cardless: boolean;
+  worker: boolean;
+  classes?: boolean;
+  // Token stylesheet and the hex colors it has classes for, published with `classes`
+  tokens?: Tokens;
+}
+
+export interface Tokens {
+  href: string;
+  light: string[];
+  dark: string[];
+}
+
+/** One code snippet to highlight: a fenced block, or inline code. */
+export interface Job {
+  code: string;
+  lang: string;
+  meta?: string;
+  inline?: boolean;
+}
+
+async function loadLanguages(config: Config) {
+  const results = await Promise.allSettled(
+    config.languages.map((name) => import(/* @vite-ignore */ `./_lang-${name}.js`)),
+  );
+  return results.flatMap((r, i) => {
+    if (r.status === "fulfilled") return [r.value.default].flat();
+    console.log(`[anki-md] Failed to load language: ${config.languages[i]}`);
+    return [];
+  });
+}
+
+async function loadThemes(config: Config) {
+  const names = [...new Set([config.themes.light, config.themes.dark])];
+  const results = await Promise.allSettled(names.map((name) => import(/* @vite-ignore */ `./_theme-${name}.js`)));
+  return results.flatMap((r, i) => {
+    if (r.status === "fulfilled") return [r.value.default];
+    console.log(`[anki-md] Failed to load theme: ${names[i]}`);
+    return [];
+  });
+}
+
+let baseTransformers: ShikiTransformer[] | undefined;
+
+/** Whether a block uses meta ranges or notations, which need loadTransformers(). */
+export function needsTransformers(job: Job): boolean {
+  return !job.inline && (!!job.meta || job.code.includes("[!code"));
+}
+
+export function hasTransformers(): boolean {
+  return !!baseTransformers;
+}
+
+export async function loadTransformers() {
+  baseTransformers ??= (await import("./transformers")).default;
+}
+
+export async function createHighlighter(config: Config): Promise<HighlighterCore> {
+  const [langs, themeList] = await Promise.all([loadLanguages(config), loadThemes(config)]);
+  return createHighlighterCore({
+    langs,
+    themes: themeList,
+    engine: createJavaScriptRegexEngine({ forgiving: true }),
+  });
+}
+
+function classes(node: Element): string[] {
+  const value = node.properties.class;
+  if (Array.isArray(value)) return value.filter((value) => typeof value === "string");
+  if (typeof value === "string") return value.split(/\s+/).filter(Boolean);
+  return [];
+}
+
+function lang(node: Element): string {
+  const child = node.children[0];
+  if (child?.type !== "element") return "text";
+  const value = classes(child).find((value) => value.startsWith("language-"));
+  return value?.slice("language-".length) || "text";
+}
+
+const codeBlock: ShikiTransformer = {
+  name: "code-block",
+  pre(node) {
+    const name = typeof this.options.lang === "string" ? this.options.lang : lang(node);
+    const style = node.properties.style;
+    const figure: Element = {
+      type: "element",
+      tagName: "figure",
+      properties: { class: ["code-block", ...classes(node)], style },
+      children: [
+        { ...node } as Element,
+        {
+          type: "element",
+          tagName: "figcaption",
+          properties: { class: "toolbar" },
+          children: [
+            {
+              type: "element",
+              tagName: "span",
+              properties: { class: "lang" },
+              children: [{ type: "text", value: name }],
+            },
+            {
+              type: "element",
+              tagName: "span",
+              properties: { class: "actions" },
+              children: [
+                {
+                  type: "element",
+                  tagName: "button",
+                  properties: { type: "button", class: "toggle" },
+                  children: [{ type: "text", value: "Reveal" }],
+                },
+                {
+                  type: "element",
+                  tagName: "button",
+                  properties: { type: "button", class: "copy" },
+                  children: [{ type: "text", value: "Copy" }],
+                },
+              ],
+            },
+          ],
+        },
+      ],
+    };
+
+    node.properties = {};
+    Object.assign(node, figure);
+  },
+};
+
+const codeInline: ShikiTransformer = {
+  name: "code-inline",
+  pre(node) {
+    const value = classes(node);
+    node.tagName = "code";
+    node.properties.class = ["code-inline", ...value];
+    // Flatten: move inner <code> children up
+    const inner = node.children[0] as Element;
+    if (inner?.tagName === "code") {
+      node.children = inner.children;
+    }
+  },
+};
+
+// Font styles the reviewer stylesheet has classes for, e.g. `li` for light italic
+const FLAGS: Record<string, string> = {
+  "font-style:italic": "i",
+  "font-weight:bold": "b",
+  "text-decoration:underline": "u",
+  "text-decoration:line-through": "s",
+};
+
+const tokenTransformers = new WeakMap<Tokens, ShikiTransformer[]>();
+
+/**
+ * Swap each token's inline style for classes: `l-<hex>` and `d-<hex>` from
+ * the published token stylesheet, and font style flags. Tokens with a color
+ * or style no class covers keep their inline style.
+ */
+function tokenClasses(tokens: Tokens | undefined): ShikiTransformer[] {
+  if (!tokens) return [];
+  let cached = tokenTransformers.get(tokens);
+  if (cached) return cached;
+  const known: Record<string, Set<string>> = { l: new Set(tokens.light), d: new Set(tokens.dark) };
+  const transformer: ShikiTransformer = {
+    name: "token-classes",
+    span(node) {
+      const style = node.properties.style;
+      if (typeof style !== "string") return;
+      const names: string[] = [];
+      for (const decl of style.split(";")) {
+        if (!decl.trim()) continue;
+        const match = /^\s*--shiki-(light|dark)(?:-([a-z-]+))?\s*:\s*(.*?)\s*$/.exec(decl);
+        if (!match) return;
+        const [, theme, prop, value] = match;
+        const side = theme[0];
+        // Shiki fills what only one theme sets with inherit, same as no variable
+        if (value === "inherit") continue;
+        if (!prop) {
+          const hex = value.toLowerCase().slice(1);
+          if (!value.startsWith("#") || !known[side].has(hex)) return;
+          names.push(`${side}-${hex}`);
+        } else {
+          const flag = FLAGS[`${prop}:${value}`];
+          if (!flag) return;
+          names.push(side + flag);
+        }
+      }
+      node.properties.class = [...classes(node), ...names];
+      delete node.properties.style;
+    },
+  };
+  cached = [transformer];
+  tokenTransformers.set(tokens, cached);
+  return cached;
+}
+
+/**
+ * Highlight one job. Returns null when the language is not loaded or Shiki
+ * fails. Callers load transformers first for jobs that need them.
+ */
+export function run(highlighter: HighlighterCore, config: Config, job: Job): string | null {
+  if (!highlighter.getLoadedLanguages().includes(job.lang)) return null;
+  const { themes } = config;
+  try {
+    if (job.inline) {
+      return highlighter.codeToHtml(job.code, {
+        lang: job.lang,
+        themes,
+        defaultColor: false,
+        transformers: [...tokenClasses(config.tokens), codeInline],
+      });
+    }
+    return highlighter.codeToHtml(job.code, {
+      lang: job.lang,
+      themes,
+      meta: { __raw: job.meta },
+      defaultColor: false,
+      // Without meta or notations these transformers change nothing
+      transformers: [...tokenClasses(config.tokens), ...(baseTransformers ?? []), codeBlock],
+    });
+  } catch {
+    return null;
+  }
+}
+
+/** Lines per step when a long block is highlighted progressively. */
+export const CHUNK = 50;
+
+/**
+ * Whether a block can be highlighted in line chunks. Meta ranges and
+ * `[!code ...]` notations need the whole block, so those go in one piece.
+ */
+export function chunkable(job: Job): boolean {
+  if (job.inline || needsTransformers(job)) return false;
+  return job.code.split("\n", CHUNK * 2 + 1).length > CHUNK * 2;
+}
+
+/**
+ * Highlight a block CHUNK lines at a time, carrying grammar state across
+ * chunks so multi-line constructs stay correct. Yields block HTML per chunk.
+ */
+export function* chunks(highlighter: HighlighterCore, config: Config, job: Job): Generator<string> {
+  const lines = job.code.split("\n");
+  let state: GrammarState | undefined;
+  for (let i = 0; i < lines.length; i += CHUNK) {
+    const hast = highlighter.codeToHast(lines.slice(i, i + CHUNK).join("\n"), {
+      lang: job.lang,
+      themes: config.themes,
+      defaultColor: false,
+      grammarState: state,
+      transformers: [...tokenClasses(config.tokens), codeBlock],
+    });
+    state = highlighter.getLastGrammarState(hast);
+    yield hastToHtml(hast);
+  }
+}
@@ -1,160 +1,189 @@
 import "./style.css";
 import mark from "markdown-it-mark";
-import alerts from "markdown-it-github-alerts";
 import { createMarkdownExit } from "markdown-exit";
-import { createHighlighterCore } from "@shikijs/core";
-import { createJavaScriptRegexEngine } from "@shikijs/engine-javascript";
 import type { HighlighterCore } from "@shikijs/core";
-import type { ShikiTransformer } from "shiki";
-import type { Element } from "hast";
-import {
-  transformerMetaHighlight,
-  transformerMetaWordHighlight,
-  transformerNotationErrorLevel,
-  transformerNotationFocus,
-} from "@shikijs/transformers";
-import { processCloze, postProcessCloze, type Side } from "./cloze";
-
-// Config from inline JSON (injected by Python)
-interface Config {
-  languages: string[];
-  themes: { light: string; dark: string };
-  cardless: boolean;
-}
-
-function getConfig(): Config {
+import type { Config, Job } from "./highlight";
+import { onScreen, schedule, whenVisible } from "./schedule";
+import type { Side } from "./cloze";
+import { Cache, hash } from "./cache";
+import { version } from "../package.json";
+
+const DEFAULT_CONFIG: Config = {
+  languages: ["text"],
+  themes: { light: "vitesse-light", dark: "vitesse-dark" },
+  cardless: false,
+  worker: false,
+};
+
+// Published by the add-on next to _review.js. It re-exports a content-hashed
+// _config-<hash>.js, so config changes never touch the note type templates.
+const CONFIG_URL = "./_config.js";
+
+/** The add-on config, from templates that still inline it or from media. */
+async function loadConfig(): Promise<Config> {
   const el = document.getElementById("anki-md-config");
-  if (!el?.textContent) {
-    return {
-      languages: ["text"],
-      themes: { light: "vitesse-light", dark: "vitesse-dark" },
-      cardless: false,
-    };
+  if (el?.textContent) return JSON.parse(el.textContent);
+  try {
+    return (await import(/* @vite-ignore */ CONFIG_URL)).default;
+  } catch {
+    console.log("[anki-md] Failed to load config");
+    return DEFAULT_CONFIG;
   }
-  return JSON.parse(el.textContent);
 }
 
-const config = getConfig();
-const themes = config.themes;
+let config = DEFAULT_CONFIG;
 
-async function loadLanguages() {
-  const results = await Promise.allSettled(
-    config.languages.map((name) => import(/* @vite-ignore */ `./_lang-${name}.js`)),
-  );
-  return results.flatMap((r, i) => {
-    if (r.status === "fulfilled") return [r.value.default].flat();
-    console.log(`[anki-md] Failed to load language: ${config.languages[i]}`);
-    return [];
-  });
+// The highlighter module (Shiki, grammars, themes) is a chunk of its own,
+// imported with the first pending code; cards without code never load it
+let hl: typeof import("./highlight");
+let highlighter: HighlighterCore;
+const warned = new Set<string>();
+// Bumped whenever output falls back to plain text, so degraded HTML is never cached
+let fallbacks = 0;
+
+// Highlighted code per block and final HTML per field, keyed by content hash.
+// Keys cover everything that changes the output: renderer version, themes,
+// token stylesheet and, for fields, the configured languages.
+const codeCache = new Cache("code", 1_500_000);
+const fieldCache = new Cache("field", 2_000_000);
+let salt = "";
+
+function key(...parts: (string | undefined)[]) {
+  return hash([salt, ...parts.map((part) => part ?? "")].join("\0"));
 }
 
-async function loadThemes() {
-  const names = [...new Set([config.themes.light, config.themes.dark])];
-  const results = await Promise.allSettled(names.map((name) => import(/* @vite-ignore */ `./_theme-${name}.js`)));
-  return results.flatMap((r, i) => {
-    if (r.status === "fulfilled") return [r.value.default];
-    console.log(`[anki-md] Failed to load theme: ${names[i]}`);
-    return [];
+// Highlighting runs on this thread by default. With `worker` enabled it moves
+// to a module worker and blocks keep their pending skeleton until results
+// arrive; where module workers are unavailable or fail we fall back here.
+let loading: Promise<HighlighterCore> | undefined;
+const jobs = new Map<number, [Job, (html: string | null) => void]>();
+let seq = 0;
+let worker: Worker | null = null;
+
+/** Add the token stylesheet to the page. Resolves false if it fails to load. */
+function stylesheet(href: string): Promise<boolean> {
+  const link = document.createElement("link");
+  link.rel = "stylesheet";
+  // Next to this module in media, wherever the page itself is served from
+  link.href = new URL(href, import.meta.url).href;
+  const loaded = new Promise<boolean>((resolve) => {
+    link.onload = () => resolve(true);
+    link.onerror = () => resolve(false);
   });
+  document.head.append(link);
+  return loaded;
 }
 
-const baseTransformers = [
-  transformerMetaHighlight(),
-  transformerMetaWordHighlight(),
-  transformerNotationErrorLevel({ matchAlgorithm: "v3" }),
-  transformerNotationFocus({ matchAlgorithm: "v3" }),
-];
+// Loaded once per page; every render awaits it before touching config
+const configured = loadConfig().then(async (value) => {
+  config = value;
+  // From the configured stylesheet, loaded or not: snapshots rendered in
+  // another page must keep matching the reviewer's keys
+  salt = [version, config.themes.light, config.themes.dark, config.tokens?.href ?? ""].join("\0");
+  if (config.tokens && !(await stylesheet(config.tokens.href))) {
+    // Classes would render uncolored, so tokens keep inline styles
+    console.log("[anki-md] Failed to load token stylesheet");
+    config = { ...config, tokens: undefined };
+  }
+  worker = config.worker ? spawn() : null;
+});
 
-let highlighter: HighlighterCore;
-const warned = new Set<string>();
+function load() {
+  loading ??= configured
+    .then(() => import("./highlight"))
+    .then(async (mod) => {
+      hl = mod;
+      return (highlighter = await mod.createHighlighter(config));
+    });
+  return loading;
+}
 
-async function initHighlighter(): Promise<HighlighterCore> {
-  const [langs, themeList] = await Promise.all([loadLanguages(), loadThemes()]);
-  return createHighlighterCore({
-    langs,
-    themes: themeList,
-    engine: createJavaScriptRegexEngine({ forgiving: true }),
-  });
+/** Highlight one job on this thread, loading whatever it needs first. */
+async function later(job: Job): Promise<string | null> {
+  const loaded = await load();
+  if (hl.needsTransformers(job)) await hl.loadTransformers();
+  return hl.run(loaded, config, job);
+}
+
+// Alerts (`> [!NOTE]`) are parsed by a plugin in its own chunk, added to the
+// parser before the first field that has one is rendered
+const ALERT = /^[ \t>]*>[ \t]*\[!/m;
+let alerts: Promise<void> | undefined;
+
+/** Load the parser plugins these texts need. */
+function features(...texts: string[]): Promise<void> | undefined {
+  if (!texts.some((text) => ALERT.test(text))) return;
+  alerts ??= import("markdown-it-github-alerts").then(({ default: plugin }) => void md.use(plugin as never));
+  return alerts;
+}
+
+function moduleWorkers(): boolean {
+  if (typeof Worker === "undefined") return false;
+  let supported = false;
+  const options = {
+    get type() {
+      supported = true;
+      return "module" as const;
+    },
+  };
+  try {
+    new Worker("data:,", options).terminate();
+  } catch {
+    // Only the options probe matters
+  }
+  return supported;
 }
 
-function classes(node: Element): string[] {
-  const value = node.properties.class;
-  if (Array.isArray(value)) return value.filter((value) => typeof value === "string");
-  if (typeof value === "string") return value.split(/\s+/).filter(Boolean);
-  return [];
-}
-
-function lang(node: Element): string {
-  const child = node.children[0];
-  if (child?.type !== "element") return "text";
-  const value = classes(child).find((value) => value.startsWith("language-"));
-  return value?.slice("language-".length) || "text";
-}
-
-const codeBlock: ShikiTransformer = {
-  name: "code-block",
-  pre(node) {
-    const name = typeof this.options.lang === "string" ? this.options.lang : lang(node);
-    const style = node.properties.style;
-    const figure: Element = {
-      type: "element",
-      tagName: "figure",
-      properties: { class: ["code-block", ...classes(node)], style },
-      children: [
-        { ...node } as Element,
-        {
-          type: "element",
-          tagName: "figcaption",
-          properties: { class: "toolbar" },
-          children: [
-            {
-              type: "element",
-              tagName: "span",
-              properties: { class: "lang" },
-              children: [{ type: "text", value: name }],
-            },
-            {
-              type: "element",
-              tagName: "span",
-              properties: { class: "actions" },
-              children: [
-                {
-                  type: "element",
-                  tagName: "button",
-                  properties: { type: "button", class: "toggle" },
-                  children: [{ type: "text", value: "Reveal" }],
-                },
-                {
-                  type: "element",
-                  tagName: "button",
-                  properties: { type: "button", class: "copy" },
-                  children: [{ type: "text", value: "Copy" }],
-                },
-              ],
-            },
-          ],
-        },
-      ],
+function spawn(): Worker | null {
+  if (!moduleWorkers()) return null;
+  try {
+    const value = new Worker(new URL("./worker.ts", import.meta.url), { type: "module" });
+    value.onmessage = (e: MessageEvent<{ id: number; html: string | null }>) => {
+      jobs.get(e.data.id)?.[1](e.data.html);
+      jobs.delete(e.data.id);
     };
+    value.onerror = () => {
+      console.log("[anki-md] Highlighting worker failed, falling back to main thread");
+      value.terminate();
+      worker = null;
+      const pending = [...jobs.values()];
+      jobs.clear();
+      for (const [job, done] of pending) later(job).then(done, () => done(null));
+    };
+    value.postMessage({ config });
+    return value;
+  } catch {
+    return null;
+  }
+}
 
-    node.properties = {};
-    Object.assign(node, figure);
-  },
-};
+function jobKey(job: Job) {
+  return key(job.inline ? "inline" : "block", job.lang, job.meta, job.code);
+}
 
-const codeInline: ShikiTransformer = {
-  name: "code-inline",
-  pre(node) {
-    const value = classes(node);
-    node.tagName = "code";
-    node.properties.class = ["code-inline", ...value];
-    // Flatten: move inner <code> children up
-    const inner = node.children[0] as Element;
-    if (inner?.tagName === "code") {
-      node.children = inner.children;
-    }
-  },
-};
+/** Highlight one job with the page's highlighter, through the code cache. */
+function local(job: Job): string | null {
+  const id = jobKey(job);
+  const hit = codeCache.get(id);
+  if (hit !== undefined) return hit;
+  const html = hl.run(highlighter, config, job);
+  if (html !== null) codeCache.set(id, html);
+  return html;
+}
+
+/** Highlight one job in the worker, through the code cache. */
+async function remote(job: Job): Promise<string | null> {
+  const id = jobKey(job);
+  const hit = codeCache.get(id);
+  if (hit !== undefined) return hit;
+  if (!worker) return later(job);
+  const html = await new Promise<string | null>((done) => {
+    jobs.set(++seq, [job, done]);
+    worker!.postMessage({ id: seq, job });
+  });
+  if (html !== null) codeCache.set(id, html);
+  return html;
+}
 
 /** Parse an HTML string and return its root element. */
 function parse(html: string): HTMLElement | null {
@@ -176,7 +205,9 @@ const skeleton = parse(
 )!;
 
 function warn(name: string) {
-  if (!name || name === "text" || warned.has(name)) return;
+  if (!name || name === "text") return;
+  fallbacks++;
+  if (warned.has(name)) return;
   warned.add(name);
   console.log(
     `[anki-md] Language not loaded: ${name}. Falling back to plain text. Open Anki Markdown settings to enable and download it.`,
@@ -192,34 +223,34 @@ function plain(code: string, name: string, meta?: string, pending = false) {
   return el.outerHTML;
 }
 
-function highlight(code: string, name: string, meta?: string) {
-  if (!highlighter) {
-    return plain(code, name, meta, true);
-  }
+// Synchronous highlighting during md.render stops at this deadline; later
+// blocks render as pending skeletons and are upgraded in idle slices.
+const RENDER_BUDGET = 8;
+let deadline = 0;
 
-  if (!highlighter.getLoadedLanguages().includes(name)) {
-    warn(name);
-    return plain(code, name, meta);
-  }
+// Snapshots are stored, not shown, so they highlight everything in one pass
+let complete = false;
 
-  try {
-    return highlighter.codeToHtml(code, {
-      lang: name,
-      themes,
-      meta: { __raw: meta },
-      defaultColor: false,
-      transformers: [...baseTransformers, codeBlock],
-    });
-  } catch {
-    warn(name);
-    return plain(code, name, meta);
-  }
+/** Whether md.render may still highlight synchronously. */
+function eager() {
+  return !!highlighter && (complete || performance.now() < deadline);
+}
+
+function highlight(code: string, name: string, meta?: string) {
+  const job = { code, lang: name, meta };
+  // Long blocks always go through the progressive path in upgrade(), and
+  // blocks whose transformers aren't loaded yet wait for them there
+  const sync =
+    eager() && (complete || !hl.chunkable(job)) && (!hl.needsTransformers(job) || hl.hasTransformers());
+  const html = sync ? local(job) : (codeCache.get(jobKey(job)) ?? null);
+  if (html !== null) return html;
+  if (!sync) return plain(code, name, meta, true);
+  warn(name);
+  return plain(code, name, meta);
 }
 
 const md = createMarkdownExit({ html: true });
 md.use(mark as never);
-md.use(alerts as never);
-const ready = initHighlighter().then((value) => (highlighter = value));
 
 // Only allow safe HTML tags, strip everything else
 const ALLOWED = /^<\/?(img|a|b|i|em|strong|br|kbd)(\s[^>]*)?>$/i;
@@ -254,24 +285,26 @@ md.renderer.rules.code_inline = (tokens, idx) => {
   const { content, meta } = tokens[idx];
   const escaped = md.utils.escapeHtml(content);
   if (!meta?.lang) return `<code>${escaped}</code>`;
-  if (!highlighter) return `<code data-pending data-lang="${md.utils.escapeHtml(meta.lang)}">${escaped}</code>`;
-  if (!highlighter.getLoadedLanguages().includes(meta.lang)) {
-    warn(meta.lang);
-    return `<code>${escaped}</code>`;
-  }
-  try {
-    return highlighter.codeToHtml(content, {
-      lang: meta.lang,
-      themes,
-      defaultColor: false,
-      transformers: [codeInline],
-    });
-  } catch {
-    warn(meta.lang);
-    return `<code>${escaped}</code>`;
-  }
+  const job = { code: content, lang: meta.lang, inline: true };
+  const sync = eager();
+  const html = sync ? local(job) : (codeCache.get(jobKey(job)) ?? null);
+  if (html !== null) return html;
+  if (!sync) return `<code data-pending data-lang="${md.utils.escapeHtml(meta.lang)}">${escaped}</code>`;
+  warn(meta.lang);
+  return `<code>${escaped}</code>`;
 };
 
+/** Reset toolbar state a user left on live blocks, before their markup is cached. */
+function pristine(blocks: Iterable<Element>) {
+  for (const block of blocks) {
+    block.classList.remove("revealed");
+    const toggle = block.querySelector(".toggle");
+    if (toggle) toggle.textContent = "Reveal";
+    const copy = block.querySelector(".copy");
+    if (copy) copy.textContent = "Copy";
+  }
+}
+
 // Event delegation for toolbar
 const card = document.querySelector(".card");
 if (navigator.clipboard) card?.classList.add("clipboard");
@@ -302,51 +335,134 @@ function decode(text: string): string {
   return decoder.value;
 }
 
+/** Swap highlighted block HTML into a pending figure in-place so layout never shifts. */
+function swapBlock(fig: HTMLElement, code: HTMLElement, lang: string, html: string | null) {
+  fig.removeAttribute("data-pending");
+  if (html === null) {
+    warn(lang);
+    return;
+  }
+  const fresh = parse(html);
+  if (!fresh) return;
+  const inner = fresh.querySelector("code");
+  if (inner) code.innerHTML = inner.innerHTML;
+  fig.className = fresh.className;
+  if (fresh.style.cssText) fig.style.cssText = fresh.style.cssText;
+  fig.removeAttribute("data-meta");
+}
+
+function swapInline(el: HTMLElement, lang: string, html: string | null) {
+  if (html === null) {
+    warn(lang);
+    return;
+  }
+  const fresh = parse(html);
+  if (!fresh) return;
+  el.innerHTML = fresh.innerHTML;
+  el.className = fresh.className;
+  if (fresh.style.cssText) el.style.cssText = fresh.style.cssText;
+}
+
 /**
- * Re-highlight code rendered before Shiki was ready.
- * Swaps content and copies attributes in-place so layout never shifts.
+ * Highlight a long block CHUNK lines per step. Highlighted lines replace the
+ * plain text from the top while the rest stays as-is below them.
  */
-function upgrade(container: HTMLElement) {
-  for (const fig of container.querySelectorAll<HTMLElement>(".code-block[data-pending]")) {
-    const code = fig.querySelector("code");
-    if (!code) continue;
-    const lang = fig.querySelector(".lang")?.textContent || "text";
-    const fresh = parse(highlight(code.textContent?.replace(/\n$/, "") || "", lang, fig.dataset.meta));
-    if (!fresh) continue;
-    const inner = fresh.querySelector("code");
-    if (inner) code.innerHTML = inner.innerHTML;
-    fig.className = fresh.className;
-    if (fresh.style.cssText) fig.style.cssText = fresh.style.cssText;
-    fig.removeAttribute("data-pending");
-    fig.removeAttribute("data-meta");
+function* progressive(fig: HTMLElement, code: HTMLElement, job: Job) {
+  const lines = job.code.split("\n");
+  const rest = document.createTextNode(job.code);
+  const steps = hl.chunks(highlighter, config, job);
+  let done = 0;
+  for (;;) {
+    let step: IteratorResult<string>;
+    try {
+      step = steps.next();
+    } catch {
+      // Fall back to one-shot highlighting from the original text
+      code.textContent = job.code;
+      swapBlock(fig, code, job.lang, local(job));
+      return;
+    }
+    if (step.done) break;
+    const fresh = parse(step.value);
+    if (!done && fresh) {
+      code.replaceChildren(rest);
+      fig.className = fresh.className;
+      if (fresh.style.cssText) fig.style.cssText = fresh.style.cssText;
+    }
+    const tpl = document.createElement("template");
+    tpl.innerHTML = (done ? "\n" : "") + (fresh?.querySelector("code")?.innerHTML ?? "");
+    code.insertBefore(tpl.content, rest);
+    done += hl.CHUNK;
+    rest.data = done < lines.length ? "\n" + lines.slice(done).join("\n") : "";
+    yield;
+  }
+  fig.removeAttribute("data-pending");
+  fig.removeAttribute("data-meta");
+  // The block was live while it was highlighted, so it may have been revealed
+  const copy = fig.cloneNode(true) as HTMLElement;
+  pristine([copy]);
+  codeCache.set(jobKey(job), copy.outerHTML);
+}
+
+function* upgradeBlock(fig: HTMLElement) {
+  const code = fig.querySelector("code");
+  if (!code) return;
+  const lang = fig.querySelector(".lang")?.textContent || "text";
+  const job = { code: code.textContent?.replace(/\n$/, "") || "", lang, meta: fig.dataset.meta };
+  // remote() loads the highlighter here if the worker failed before it was
+  if (worker || !highlighter) {
+    yield remote(job).then((html) => swapBlock(fig, code, lang, html));
+  } else if (hl.chunkable(job) && highlighter.getLoadedLanguages().includes(lang) && !codeCache.get(jobKey(job))) {
+    yield* progressive(fig, code, job);
+  } else {
+    swapBlock(fig, code, lang, local(job));
   }
+}
+
+function* upgradeInline(el: HTMLElement) {
+  const lang = el.dataset.lang || "text";
+  el.removeAttribute("data-pending");
+  el.removeAttribute("data-lang");
+  const job = { code: el.textContent || "", lang, inline: true };
+  if (worker || !highlighter) yield remote(job).then((html) => swapInline(el, lang, html));
+  else swapInline(el, lang, local(job));
+}
 
+/**
+ * Re-highlight code rendered before Shiki was ready, in idle-time slices.
+ * On-screen blocks go first; blocks inside blurred clozes follow; off-screen
+ * or hidden blocks wait until they come into view. Resolves with
+ * [visible, all] promises for the on-screen work and for everything.
+ */
+function upgrade(container: HTMLElement): [Promise<unknown>, Promise<unknown>] {
+  const tasks = new Map<HTMLElement, () => Iterator<unknown>>();
+  for (const el of container.querySelectorAll<HTMLElement>(".code-block[data-pending]")) {
+    tasks.set(el, () => upgradeBlock(el));
+  }
   for (const el of container.querySelectorAll<HTMLElement>("code[data-pending]")) {
-    const lang = el.dataset.lang || "text";
-    el.removeAttribute("data-pending");
-    el.removeAttribute("data-lang");
-    if (!highlighter.getLoadedLanguages().includes(lang)) {
-      warn(lang);
-      continue;
-    }
-    try {
-      const fresh = parse(
-        highlighter.codeToHtml(el.textContent || "", {
-          lang,
-          themes,
-          defaultColor: false,
-          transformers: [codeInline],
+    tasks.set(el, () => upgradeInline(el));
+  }
+
+  const now: Promise<void>[] = [];
+  const rest: Promise<void>[] = [];
+  const blurred: (() => Iterator<unknown>)[] = [];
+  for (const [el, task] of tasks) {
+    if (el.closest(".cloze-blur")) {
+      blurred.push(task);
+    } else if (onScreen(el)) {
+      now.push(schedule(task()));
+    } else {
+      rest.push(
+        new Promise((done) => {
+          if (!whenVisible(el, () => schedule(task(), true).then(done))) schedule(task()).then(done);
         }),
       );
-      if (!fresh) continue;
-      el.innerHTML = fresh.innerHTML;
-      el.className = fresh.className;
-      if (fresh.style.cssText) el.style.cssText = fresh.style.cssText;
-    } catch {
-      warn(lang);
-      console.log(`[anki-md] Failed to highlight inline code for language: ${lang}`);
     }
   }
+  rest.push(...blurred.map((task) => schedule(task())));
+
+  const visible = Promise.all(now);
+  return [visible, Promise.all([visible, ...rest])];
 }
 
 // Mirror the host's dark-mode class onto our wrapper so theming stays scoped.
@@ -367,19 +483,178 @@ function normalizeDarkMode(wrapper: HTMLElement | null) {
   if (dark) wrapper.classList.add("night-mode");
 }
 
-async function upgradeHighlighter(...els: (HTMLElement | null)[]) {
-  if (!highlighter) {
-    try {
-      await ready;
-      for (const el of els) if (el) upgrade(el);
-    } catch {
-      console.log("[anki-md] Failed to load highlighter");
-    }
+/** Load the highlighter, and the transformers if pending blocks use them. */
+async function prepare(els: (HTMLElement | null)[]) {
+  await load();
+  const blocks = els.flatMap((el) => [...(el?.querySelectorAll<HTMLElement>(".code-block[data-pending]") ?? [])]);
+  if (blocks.some((fig) => fig.dataset.meta || fig.querySelector("code")?.textContent?.includes("[!code"))) {
+    await hl.loadTransformers();
+  }
+}
+
+/**
+ * Upgrade pending code once the highlighter is ready. Resolves when on-screen
+ * blocks are done, with `rest` settling once deferred blocks are done too.
+ */
+async function upgradeHighlighter(...els: (HTMLElement | null)[]): Promise<{ rest: Promise<unknown> }> {
+  if (!els.some((el) => el?.querySelector("[data-pending]"))) return { rest: Promise.resolve() };
+  try {
+    if (!worker) await prepare(els);
+    const work = els.flatMap((el) => (el ? [upgrade(el)] : []));
+    await Promise.all(work.map(([visible]) => visible));
+    return { rest: Promise.all(work.map(([, all]) => all)) };
+  } catch {
+    console.log("[anki-md] Failed to load highlighter");
+    return { rest: Promise.resolve() };
+  }
+}
+
+/**
+ * Render markdown into one field element, reusing cached HTML when the same
+ * content was rendered before. Returns a callback that caches the result once
+ * highlighting has finished, or undefined on a cache hit.
+ */
+function fill(el: HTMLElement | null, kind: string, text: string, post = (html: string) => html) {
+  if (!el) return;
+  const id = fieldKey(kind, text);
+  const hit = fieldCache.get(id);
+  if (hit !== undefined) {
+    el.innerHTML = hit;
+    return;
+  }
+  const before = fallbacks;
+  deadline = performance.now() + RENDER_BUDGET;
+  el.innerHTML = post(md.render(text));
+  return () => {
+    if (fallbacks !== before || el.querySelector("[data-pending]")) return;
+    const copy = el.cloneNode(true) as HTMLElement;
+    pristine(copy.querySelectorAll(".code-block"));
+    fieldCache.set(id, copy.innerHTML);
+  };
+}
+
+// Keyed on the exact text: leading indentation changes how it renders
+function fieldKey(kind: string, text: string) {
+  return key(kind, config.languages.join(","), text);
+}
+
+// Templates pass each field as a script element's text, on a line of its own
+// indented by two spaces. Pre-warming and snapshots wrap the bare fields they
+// get the same way, so they render and key like the shown card's.
+function templated(text: string) {
+  return `\n  ${text}\n`;
+}
+
+/**
+ * Render a field off-screen into the field cache, highlighting its code in
+ * idle slices. Skipped when it's cached already or can't be fully highlighted.
+ */
+async function warm(kind: string, text: string, post = (html: string) => html) {
+  const id = fieldKey(kind, text);
+  if (!text.trim() || fieldCache.get(id) !== undefined) return;
+  const el = document.createElement("div");
+  const before = fallbacks;
+  // Everything goes through the idle queue, behind the shown card's work
+  deadline = 0;
+  el.innerHTML = post(md.render(text));
+  if (!worker && el.querySelector("[data-pending]")) await prepare([el]);
+  const tasks = [
+    ...[...el.querySelectorAll<HTMLElement>(".code-block[data-pending]")].map((fig) => upgradeBlock(fig)),
+    ...[...el.querySelectorAll<HTMLElement>("code[data-pending]")].map((code) => upgradeInline(code)),
+  ];
+  await Promise.all(tasks.map((task) => schedule(task)));
+  if (fallbacks !== before || el.querySelector("[data-pending]")) return;
+  fieldCache.set(id, el.innerHTML);
+}
+
+/**
+ * Pre-render the next basic card while the reviewer is idle, so it shows
+ * fully highlighted from the cache. Called by the add-on on desktop.
+ */
+export async function prewarm(front: string, back: string) {
+  await configured;
+  const [f, b] = [templated(decode(front)), templated(decode(back))];
+  await features(f, b);
+  await Promise.all([warm("field", f), warm("field", b)]);
+}
+
+/** Pre-render both sides of the next cloze card, like prewarm(). */
+export async function prewarmCloze(text: string, extra: string, ordinal: number) {
+  await configured;
+  const { processCloze, postProcessCloze } = await import("./cloze");
+  const [raw, extraText] = [templated(decode(text)), templated(decode(extra))];
+  await features(raw, extraText);
+  await Promise.all([
+    warm("cloze", processCloze(raw, ordinal, "front"), postProcessCloze),
+    warm("cloze", processCloze(raw, ordinal, "back"), postProcessCloze),
+    warm("field", extraText),
+  ]);
+}
+
+// Keyed on the exact text, like fields: leading indentation changes the output
+function snapshotKey(front: string, back: string) {
+  return key("snapshot", config.languages.join(","), front, back);
+}
+
+/**
+ * Use the note's pre-rendered snapshot when it matches its fields: it takes
+ * the live wrapper's place and only needs lazy highlighting. A stale one is
+ * dropped. Returns the snapshot wrapper, or null to render live.
+ */
+function useSnapshot(front: string, back: string): HTMLElement | null {
+  const host = document.querySelector<HTMLElement>(".anki-md-snapshots");
+  if (!host) return null;
+  const snap = host.querySelector<HTMLElement>(":scope > .anki-md-snapshot");
+  if (!snap || snap.dataset.key !== snapshotKey(front, back)) {
+    host.remove();
+    return null;
+  }
+  document.querySelector(".anki-md-wrapper:not(.anki-md-snapshot)")?.remove();
+  if (host.dataset.side === "front") snap.querySelector(":scope > .back")?.remove();
+  return snap;
+}
+
+/**
+ * Render fields to snapshot HTML for the add-on to store with each note, as
+ * [front, back, stored snapshot] tuples. Returns null for notes whose stored
+ * snapshot is still current.
+ */
+export async function snapshot(notes: [string, string, string][]): Promise<(string | null)[]> {
+  await configured;
+  // The reviewer renders the templated text, so snapshots do too
+  const fields = notes.map(([front, back]) => [templated(decode(front)), templated(decode(back))]);
+  await Promise.all([load().then(() => hl.loadTransformers()), features(...fields.flat())]);
+  complete = true;
+  try {
+    return notes.map(([, , stored], i) => {
+      const [front, back] = fields[i];
+      const id = snapshotKey(front, back);
+      if (stored.includes(`data-key="${id}"`)) return null;
+      const [f, b] = [front, back].map((text) => md.render(text));
+      // Clients without the renderer still need the token colors
+      const tokens = config.tokens ? `<link rel="stylesheet" href="./${config.tokens.href}">` : "";
+      return (
+        `<div class="anki-md-wrapper anki-md-snapshot ready" data-key="${id}">${tokens}` +
+        `<div class="front">${f}</div><div class="back">${b}</div></div>`
+      );
+    });
+  } finally {
+    complete = false;
   }
 }
 
 /** Render front/back fields to card DOM. */
 export async function render(front: string, back: string) {
+  await configured;
+  const [f, b] = [decode(front), decode(back)];
+  const snap = useSnapshot(f, b);
+  if (snap) {
+    normalizeDarkMode(snap);
+    if (config.cardless) snap.classList.add("cardless");
+    await upgradeHighlighter(snap.querySelector<HTMLElement>(".front"), snap.querySelector<HTMLElement>(".back"));
+    return;
+  }
+
   const wrapper = document.querySelector<HTMLElement>(".anki-md-wrapper");
   normalizeDarkMode(wrapper);
 
@@ -389,11 +664,12 @@ export async function render(front: string, back: string) {
   wrapper?.setAttribute("data-state", "loading");
   if (config.cardless) wrapper?.classList.add("cardless");
 
-  if (frontEl) frontEl.innerHTML = md.render(decode(front));
-  if (backEl) backEl.innerHTML = md.render(decode(back));
+  await features(f, b);
+  const saves = [fill(frontEl, "field", f), fill(backEl, "field", b)];
   wrapper?.classList.add("ready");
 
-  await upgradeHighlighter(frontEl, backEl);
+  const { rest } = await upgradeHighlighter(frontEl, backEl);
+  rest.then(() => saves.forEach((save) => save?.()));
 
   wrapper?.setAttribute("data-state", "ready");
   wrapper?.classList.add("ready");
@@ -401,24 +677,26 @@ export async function render(front: string, back: string) {
 
 /** Render cloze deletion card to DOM. */
 export async function renderCloze(text: string, extra: string, ordinal: number, side: Side) {
+  await configured;
   const wrapper = document.querySelector<HTMLElement>(".anki-md-wrapper");
   normalizeDarkMode(wrapper);
 
   const frontEl = document.querySelector<HTMLElement>(".front");
   const backEl = document.querySelector<HTMLElement>(".back");
-  const raw = decode(text);
+  const [raw, extraText] = [decode(text), decode(extra)];
 
   wrapper?.setAttribute("data-state", "loading");
   if (config.cardless) wrapper?.classList.add("cardless");
 
+  const [{ processCloze, postProcessCloze }] = await Promise.all([import("./cloze"), features(raw, extraText)]);
   const processed = processCloze(raw, ordinal, side);
-  if (frontEl) frontEl.innerHTML = postProcessCloze(md.render(processed));
+  const saves = [fill(frontEl, "cloze", processed, postProcessCloze)];
 
-  const extraText = decode(extra);
-  if (backEl && extraText.trim()) backEl.innerHTML = md.render(extraText);
+  if (extraText.trim()) saves.push(fill(backEl, "field", extraText));
 
   wrapper?.classList.add("ready");
-  await upgradeHighlighter(frontEl, backEl);
+  const { rest } = await upgradeHighlighter(frontEl, backEl);
+  rest.then(() => saves.forEach((save) => save?.()));
 
   wrapper?.setAttribute("data-state", "ready");
   wrapper?.classList.add("ready");
@@ -0,0 +1,83 @@
+// Idle-time scheduler for highlighting work.
+// Tasks are iterators: each next() call does one unit of work (one block or
+// one chunk of a long block). Units run in slices of at most BUDGET ms, and
+// the browser gets to paint and handle input between slices.
+
+const BUDGET = 8;
+
+interface Entry {
+  steps: Iterator<unknown>;
+  pending: unknown[];
+  done: () => void;
+}
+
+const queue: Entry[] = [];
+let busy = false;
+
+function later(fn: () => void) {
+  if (typeof requestIdleCallback === "function") requestIdleCallback(fn, { timeout: 50 });
+  else setTimeout(fn);
+}
+
+function tick() {
+  const end = performance.now() + BUDGET;
+  while (queue.length && performance.now() < end) {
+    const entry = queue[0];
+    let step: IteratorResult<unknown>;
+    try {
+      step = entry.steps.next();
+    } catch {
+      console.log("[anki-md] Failed to highlight code block");
+      step = { done: true, value: undefined };
+    }
+    if (!step.done) {
+      // Steps may yield promises (worker jobs); the task finishes when they settle
+      entry.pending.push(step.value);
+      continue;
+    }
+    queue.shift();
+    Promise.all(entry.pending).then(entry.done, entry.done);
+  }
+  if (queue.length) later(tick);
+  else busy = false;
+}
+
+/**
+ * Queue a task. Urgent tasks (e.g. blocks that just scrolled into view) jump
+ * ahead of queued work. Resolves once every step ran and settled.
+ */
+export function schedule(steps: Iterator<unknown>, urgent = false): Promise<void> {
+  return new Promise((done) => {
+    const entry: Entry = { steps, pending: [], done };
+    if (urgent) queue.unshift(entry);
+    else queue.push(entry);
+    if (busy) return;
+    busy = true;
+    later(tick);
+  });
+}
+
+/**
+ * Call `fn` once `el` comes near the viewport or becomes displayed.
+ * Returns false where IntersectionObserver is unavailable.
+ */
+export function whenVisible(el: Element, fn: () => void): boolean {
+  if (typeof IntersectionObserver === "undefined") return false;
+  const observer = new IntersectionObserver(
+    (entries) => {
+      if (!entries.some((entry) => entry.isIntersecting)) return;
+      observer.disconnect();
+      fn();
+    },
+    { rootMargin: "50% 0px" },
+  );
+  observer.observe(el);
+  return true;
+}
+
+/** Whether an element is displayed and overlaps the viewport. */
+export function onScreen(el: Element): boolean {
+  const rect = el.getBoundingClientRect();
+  if (!rect.width && !rect.height) return false;
+  return rect.bottom >= 0 && rect.top <= (window.innerHeight || document.documentElement.clientHeight);
+}
@@ -0,0 +1,15 @@
+// Meta ranges and `[!code ...]` notations, in their own chunk: only blocks
+// that use them need it.
+import {
+  transformerMetaHighlight,
+  transformerMetaWordHighlight,
+  transformerNotationErrorLevel,
+  transformerNotationFocus,
+} from "@shikijs/transformers";
+
+export default [
+  transformerMetaHighlight(),
+  transformerMetaWordHighlight(),
+  transformerNotationErrorLevel({ matchAlgorithm: "v3" }),
+  transformerNotationFocus({ matchAlgorithm: "v3" }),
+];
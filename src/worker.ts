@@ -0,0 +1,24 @@
+// Module worker that highlights code off the reviewer's main thread.
+// Receives the card config once, then { id, job } messages; replies { id, html }.
+import type { HighlighterCore } from "@shikijs/core";
+import { createHighlighter, loadTransformers, needsTransformers, run, type Config, type Job } from "./highlight";
+
+let config: Config;
+let ready: Promise<HighlighterCore>;
+
+self.onmessage = async (e: MessageEvent<{ config: Config } | { id: number; job: Job }>) => {
+  if ("config" in e.data) {
+    config = e.data.config;
+    ready = createHighlighter(config);
+    return;
+  }
+  const { id, job } = e.data;
+  let html: string | null = null;
+  try {
+    if (needsTransformers(job)) await loadTransformers();
+    html = run(await ready, config, job);
+  } catch {
+    console.log("[anki-md] Failed to load highlighter in worker");
+  }
+  self.postMessage({ id, html });
+};
@@ -0,0 +1,49 @@
+import { afterEach, describe, expect, test } from "bun:test";
+import { Cache, hash } from "../src/cache";
+
+function storage() {
+  const data = new Map<string, string>();
+  (globalThis as any).localStorage = {
+    getItem: (key: string) => data.get(key) ?? null,
+    setItem: (key: string, value: string) => void data.set(key, value),
+    removeItem: (key: string) => void data.delete(key),
+  };
+  return data;
+}
+
+afterEach(() => {
+  delete (globalThis as any).localStorage;
+});
+
+describe("hash", () => {
+  test("is stable and content-sensitive", () => {
+    expect(hash("a")).toBe(hash("a"));
+    expect(hash("a")).not.toBe(hash("b"));
+  });
+});
+
+describe("Cache", () => {
+  test("evicts least recently used entries past the size budget", () => {
+    const data = storage();
+    const cache = new Cache("t", 10);
+    cache.set("a", "12345");
+    cache.set("b", "12345");
+    cache.get("a");
+    cache.set("c", "123");
+    expect(cache.get("b")).toBeUndefined();
+    expect([...data.keys()].sort()).toEqual(["anki-md:t:a", "anki-md:t:c"]);
+  });
+
+  test("reads back persisted entries in a fresh instance", async () => {
+    storage();
+    new Cache("t", 100).set("a", "html");
+    await Bun.sleep(0);
+    expect(new Cache("t", 100).get("a")).toBe("html");
+  });
+
+  test("works without storage", () => {
+    const cache = new Cache("t", 100);
+    cache.set("a", "html");
+    expect(cache.get("a")).toBe("html");
+  });
+});
@@ -221,6 +221,20 @@ describe("processCloze", () => {
     const text = "Just plain text.";
     expect(processCloze(text, 1, "front")).toBe("Just plain text.");
   });
+
+  test("keeps unclosed clozes as literal text", () => {
+    expect(view(processCloze("a {{c1::b {{c2::c}} d", 2, "front"))).toBe("a {{c1::b <blank>[...]</blank> d");
+    expect(view(processCloze("a {{c1::b::hint", 1, "front"))).toBe("a {{c1::b::hint");
+  });
+
+  test("handles deeply nested and unclosed markup in linear time", () => {
+    const nested = `${"{{c1::".repeat(2_000)}x${"}}".repeat(2_000)}`;
+    const unclosed = "{{c1::a".repeat(20_000);
+    const start = performance.now();
+    expect(view(processCloze(nested, 1, "back"))).toBe("<active>x</active>");
+    expect(processCloze(unclosed, 1, "front")).toBe(unclosed);
+    expect(performance.now() - start).toBeLessThan(1000);
+  });
 });
 
 describe("postProcessCloze", () => {
@@ -229,6 +243,12 @@ describe("postProcessCloze", () => {
       '<div class="cloze-active"><p>line</p></div>',
     );
   });
+
+  test("upgrades inline sentinels into spans", () => {
+    expect(postProcessCloze("<p>a \uE000[...]\uE001 \uE006b\uE007</p>")).toBe(
+      '<p>a <span class="cloze-blank">[...]</span> <span class="cloze-active cloze-reveal">b</span></p>',
+    );
+  });
 });
 
 describe("renderCloze", () => {
@@ -283,4 +303,36 @@ describe("render", () => {
       dom.restore();
     }
   });
+
+  test("keys cached fields on their leading indentation", async () => {
+    const dom = mount();
+    const log = console.log;
+    console.log = () => {};
+
+    try {
+      const { render } = await loadRender();
+      await render("    indented", "");
+      expect(dom.front.innerHTML).toContain("<pre><code>indented");
+      await render("indented", "");
+      expect(dom.front.innerHTML).toContain("<p>indented</p>");
+    } finally {
+      console.log = log;
+      dom.restore();
+    }
+  });
+
+  test("loads the alerts plugin for fields with alerts", async () => {
+    const dom = mount();
+    const log = console.log;
+    console.log = () => {};
+
+    try {
+      const { render } = await loadRender();
+      await render("> [!NOTE]\n> Lazily parsed.", "");
+      expect(dom.front.innerHTML).toContain("markdown-alert-note");
+    } finally {
+      console.log = log;
+      dom.restore();
+    }
+  });
 });
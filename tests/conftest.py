@@ -1,4 +1,6 @@
 import importlib.util
+import sqlite3
+import sys
 import re
 from pathlib import Path
 
@@ -36,6 +38,7 @@ def shiki(monkeypatch):
         return (root / f"{match.group(2)}.mjs").read_bytes()
 
     monkeypatch.setattr(mod, "fetch_module", local_fetch)
+    monkeypatch.setattr(mod, "probe", lambda: True)
     return mod
 
 
@@ -47,3 +50,101 @@ def shiki_online():
     mod = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(mod)
     return mod
+
+
+@pytest.fixture
+def esm_server():
+    """scripts/esm_server.py: a local esm.sh stand-in with injectable faults."""
+    spec = importlib.util.spec_from_file_location("esm_server", ROOT / "scripts" / "esm_server.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def load(monkeypatch, name):
+    """Load one add-on module standalone, importable by name (for pool workers)."""
+    monkeypatch.syspath_prepend(str(ROOT / "anki_markdown"))
+    spec = importlib.util.spec_from_file_location(name, ROOT / "anki_markdown" / f"{name}.py")
+    mod = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, mod)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+@pytest.fixture
+def lint(monkeypatch):
+    return load(monkeypatch, "lint")
+
+
+@pytest.fixture
+def checks(monkeypatch):
+    return load(monkeypatch, "lint_checks")
+
+
+@pytest.fixture
+def media(monkeypatch):
+    return load(monkeypatch, "media")
+
+
+@pytest.fixture
+def objects(monkeypatch):
+    return load(monkeypatch, "objects")
+
+
+@pytest.fixture
+def importer(monkeypatch):
+    return load(monkeypatch, "importer")
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    return load(monkeypatch, "exporter")
+
+
+@pytest.fixture
+def prerender(monkeypatch):
+    return load(monkeypatch, "prerender")
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    return load(monkeypatch, "configure")
+
+
+@pytest.fixture
+def prewarm(monkeypatch):
+    return load(monkeypatch, "prewarm")
+
+
+@pytest.fixture
+def reconcile(monkeypatch):
+    return load(monkeypatch, "reconcile")
+
+
+class FakeDb:
+    """Collection db stand-in backed by in-memory notes and cards tables."""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("create table notes (id integer primary key, mid int, mod int, flds text, tags text)")
+        self.conn.execute("create table cards (nid int, ord int, did int, odid int, primary key (nid, ord))")
+
+    def add(self, nid, mid, mod, *fields, tags=""):
+        self.conn.execute(
+            "insert or replace into notes values (?, ?, ?, ?, ?)", (nid, mid, mod, "\x1f".join(fields), tags)
+        )
+
+    def card(self, nid, did, ord=0, odid=0):
+        self.conn.execute("insert or replace into cards values (?, ?, ?, ?)", (nid, ord, did, odid))
+
+    def remove(self, nid):
+        self.conn.execute("delete from notes where id = ?", (nid,))
+        self.conn.execute("delete from cards where nid = ?", (nid,))
+
+    def all(self, sql, *args):
+        return [list(row) for row in self.conn.execute(sql, args)]
+
+
+@pytest.fixture
+def db():
+    return FakeDb()
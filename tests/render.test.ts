@@ -0,0 +1,82 @@
+import { describe, expect, test } from "bun:test";
+import { hash } from "../src/cache";
+import { version } from "../package.json";
+
+const CONFIG = {
+  languages: ["text"],
+  themes: { light: "vitesse-light", dark: "vitesse-dark" },
+  cardless: false,
+  worker: false,
+  tokens: { href: "_tokens-abc.css", light: [], dark: [] },
+};
+
+function el(extra: Record<string, unknown> = {}) {
+  return {
+    dataset: {} as Record<string, string>,
+    classList: { add() {}, contains: () => false },
+    removed: false,
+    remove() {
+      this.removed = true;
+    },
+    querySelector: () => null,
+    querySelectorAll: () => [],
+    setAttribute() {},
+    ...extra,
+  };
+}
+
+/**
+ * A page whose token stylesheet fails to load, like prerender's hidden
+ * webview used to, holding a snapshot keyed the way the reviewer keys it.
+ */
+function page(key: string) {
+  const links: { href: string; onerror?: () => void }[] = [];
+  const snap = el({ dataset: { key } });
+  const host = el({ dataset: { side: "back" }, querySelector: (sel: string) => (sel.includes("snapshot") ? snap : null) });
+  const live = el();
+  (globalThis as any).document = {
+    body: el(),
+    head: {
+      append(link: (typeof links)[number]) {
+        links.push(link);
+        queueMicrotask(() => link.onerror?.());
+      },
+    },
+    getElementById: (id: string) => (id === "anki-md-config" ? { textContent: JSON.stringify(CONFIG) } : null),
+    // decode() reads entities back through a textarea
+    createElement: () => ({
+      value: "",
+      set innerHTML(html: string) {
+        this.value = html;
+      },
+    }),
+    querySelector: (sel: string) => {
+      if (sel === ".anki-md-snapshots") return host;
+      if (sel.startsWith(".anki-md-wrapper")) return live;
+      return null;
+    },
+  };
+  return { links, host, live };
+}
+
+describe("token stylesheet", () => {
+  test("keys snapshots by the configured stylesheet even when it fails to load", async () => {
+    const salt = [version, CONFIG.themes.light, CONFIG.themes.dark, CONFIG.tokens.href].join("\0");
+    const key = hash([salt, "snapshot", "text", "front", "back"].join("\0"));
+    const { links, host, live } = page(key);
+    const log = console.log;
+    console.log = () => {};
+
+    try {
+      // A fresh module instance, so this page's config is the one loaded
+      const { render } = await import("../src/render?tokens");
+      await render("front", "back");
+      expect(links[0].href).toBe(new URL("../src/_tokens-abc.css", import.meta.url).href);
+      expect(host.removed).toBe(false);
+      expect(live.removed).toBe(true);
+    } finally {
+      console.log = log;
+      delete (globalThis as any).document;
+    }
+  });
+});
@@ -1,3 +1,4 @@
+from concurrent.futures import Future
 import importlib.util
 import json
 import sys
@@ -16,6 +17,8 @@ class FakeHooks:
         self.editor_will_munge_html = []
         self.webview_will_set_content = []
         self.editor_did_load_note = []
+        self.media_check_did_finish = []
+        self.reviewer_did_show_question = []
 
 
 class FakeMessageBox:
@@ -37,6 +40,9 @@ class FakeAddonManager:
     def setConfigAction(self, mod, fn):
         self.actions.append((mod, fn))
 
+    def setConfigUpdatedAction(self, mod, fn):
+        self.updated = (mod, fn)
+
     def addonFromModule(self, mod):
         return mod
 
@@ -126,11 +132,12 @@ class FakeWeb:
 
 
 class FakeNote:
-    def __init__(self, name):
+    def __init__(self, name, fields=("Front", "Back")):
         self.name = name
+        self.fields = fields
 
     def note_type(self):
-        return None if self.name is None else {"name": self.name}
+        return None if self.name is None else {"name": self.name, "flds": [{"name": name} for name in self.fields]}
 
 
 class FakeEditor:
@@ -161,6 +168,56 @@ class FakeBackend:
         )
 
 
+class FakeStore:
+    def __init__(self, dir):
+        self.dir = dir
+        self.errors = []
+        self.failed = []
+        # Files retry() downloads; None while offline
+        self.online = None
+        self.synced = []
+        # Theme token colors; None until themes are downloaded
+        self.colors = None
+
+    def sync(self, config, backoff=False):
+        self.synced.append(backoff)
+        return [], list(self.errors)
+
+    def waiting(self):
+        return list(self.failed)
+
+    def retry(self, config):
+        return self.online
+
+    def token_colors(self, config):
+        return self.colors
+
+
+class FakeTimer:
+    def __init__(self, ms, fn, repeat):
+        self.ms, self.fn, self.repeat = ms, fn, repeat
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeProgress:
+    def __init__(self):
+        self.timers = []
+
+    def timer(self, ms, fn, repeat, requiresCollection=True, parent=None):
+        self.timers.append(FakeTimer(ms, fn, repeat))
+        return self.timers[-1]
+
+
+class FakeTaskManager:
+    def run_in_background(self, task, on_done):
+        future = Future()
+        future.set_result(task())
+        on_done(future)
+
+
 @pytest.fixture
 def addon(monkeypatch, tmp_path):
     cfg = {
@@ -187,6 +244,8 @@ def addon(monkeypatch, tmp_path):
         col=types.SimpleNamespace(media=media, models=models, _backend=backend),
         addonManager=addon_manager,
         form=types.SimpleNamespace(menuTools=menu),
+        progress=FakeProgress(),
+        taskman=FakeTaskManager(),
     )
     box = FakeMessageBox()
     hooks = FakeHooks()
@@ -206,9 +265,12 @@ def addon(monkeypatch, tmp_path):
     webview.WebContent = FakeWebContent
 
     shiki = types.ModuleType("anki_markdown.shiki")
-    shiki.store = types.SimpleNamespace(sync=lambda _cfg: ([], []))
+    shiki.store = FakeStore(tmp_path / "user_files" / "shiki")
+    shiki.store.dir.mkdir(parents=True)
     shiki.get_config = lambda: cfg
-    shiki.generate_config_json = lambda: cfg_json
+    shiki.forget_config = lambda *_: None
+    shiki.generate_config_json = lambda **extra: json.dumps({**cfg, **extra}, separators=(",", ":")) if extra else cfg_json
+    shiki.token_css = lambda light, dark: f"{light} {dark}\n"
 
     settings = types.ModuleType("anki_markdown.settings")
     settings.show_settings = lambda: None
@@ -224,8 +286,12 @@ def addon(monkeypatch, tmp_path):
         "anki.stdmodels",
         "anki.utils",
         "anki_markdown",
+        "anki_markdown.media",
+        "anki_markdown.objects",
+        "anki_markdown.prerender",
         "anki_markdown.shiki",
         "anki_markdown.settings",
+        "anki_markdown.timing",
         "aqt",
         "aqt.qt",
         "aqt.editor",
@@ -253,6 +319,7 @@ def addon(monkeypatch, tmp_path):
     spec.loader.exec_module(mod)
 
     monkeypatch.setattr(mod, "ADDON_DIR", tmp_path)
+    monkeypatch.setattr(mod, "OBJECTS_DIR", tmp_path / "user_files" / "objects")
 
     return types.SimpleNamespace(
         mod=mod,
@@ -265,6 +332,7 @@ def addon(monkeypatch, tmp_path):
         addon_manager=addon_manager,
         backend=backend,
         menu=menu,
+        store=shiki.store,
     )
 
 
@@ -286,6 +354,15 @@ class TestOnMungeHtml:
         assert addon.mod.on_munge_html(txt, FakeEditor(FakeNote("Basic"))) == txt
         assert addon.mod.on_munge_html(txt, FakeEditor(FakeNote("Anki Markdown"))) == "**x**"
         assert addon.mod.on_munge_html(txt, FakeEditor(FakeNote("Anki Markdown Cloze"))) == "**x**"
+        assert not addon.mw.progress.timers
+
+    def test_schedules_snapshot(self, addon):
+        editor = FakeEditor(FakeNote("Anki Markdown", ("Front", "Back", "Rendered")))
+        addon.mod.on_munge_html("x", editor)
+        addon.mod.on_munge_html("xy", editor)
+
+        first, second = addon.mw.progress.timers
+        assert first.stopped and not second.stopped and not second.repeat
 
 
 class TestEnsureNotetype:
@@ -303,6 +380,41 @@ class TestEnsureNotetype:
         assert model["tmpls"][0]["afmt"].endswith("<div>back</div>")
         assert all(field["plainText"] is True for field in model["flds"])
 
+    def test_adds_snapshot_field(self, addon):
+        (addon.mod.ADDON_DIR / "templates" / "front.html").write_text(
+            "<!-- snapshot: front -->\n<div>front</div>", encoding="utf-8"
+        )
+        model = {
+            "name": "Anki Markdown",
+            "tmpls": [{"qfmt": "old-front", "afmt": "old-back"}],
+            "flds": [{"name": "Front"}, {"name": "Back"}],
+        }
+        addon.models.models["Anki Markdown"] = model
+
+        addon.mod.ensure_notetype()
+        assert [field["name"] for field in model["flds"]] == ["Front", "Back"]
+        assert model["tmpls"][0]["qfmt"] == "<div>front</div>"
+
+        addon.mod.ensure_notetype(add_snapshot=True)
+        assert model["flds"][2] == {"name": "Rendered", "collapsed": True, "excludeFromSearch": True, "plainText": True}
+        assert model["tmpls"][0]["qfmt"] == (
+            '<div class="anki-md-snapshots" data-side="front">{{Rendered}}</div>\n<div>front</div>'
+        )
+
+        # Kept (with its templates) once added
+        addon.mod.ensure_notetype()
+        assert len(model["flds"]) == 3
+        assert "{{Rendered}}" in model["tmpls"][0]["qfmt"]
+
+    def test_skips_save_when_unchanged(self, addon):
+        addon.mod.ensure_notetype()
+        model = addon.models.added[0]
+
+        addon.mod.ensure_notetype()
+
+        assert addon.models.saved == []
+        assert "anki-md-config" not in model["tmpls"][0]["qfmt"]
+
     def test_creates_missing_model(self, addon):
         addon.mod.ensure_notetype()
 
@@ -379,11 +491,93 @@ class TestSyncMedia:
         addon.mod.sync_media(["_old.js"])
 
         assert not removed.exists()
-        assert set(addon.media.trashed[0]) == {"_review.js", "_review.css"}
-        assert {Path(path).name for path in addon.media.added} == {
-            "_review.js",
-            "_review.css",
-        }
+        assert (addon.media.path / "_review.js").read_text(encoding="utf-8") == "x"
+        assert (addon.media.path / "_review.css").read_text(encoding="utf-8") == "y"
+
+    def test_syncs_downloaded_languages(self, addon):
+        # The store lives in user_files, which add-on updates keep
+        (addon.store.dir / "_lang-rust.js").write_text("rust", encoding="utf-8")
+
+        addon.mod.sync_media([])
+
+        assert (addon.media.path / "_lang-rust.js").read_text(encoding="utf-8") == "rust"
+
+
+class TestGetTemplate:
+    def test_points_at_hashed_assets(self, addon):
+        (addon.mod.ADDON_DIR / "templates" / "front.html").write_text(
+            '<link href="./_review.css" />\nimport { render } from "./_review.js";', encoding="utf-8"
+        )
+        assert addon.mod.get_template("front.html").startswith('<link href="./_review.css" />')
+
+        (addon.mod.ADDON_DIR / "assets.json").write_text(
+            '{"_review.js": "_review-abc.js", "_review.css": "_review-def.css"}', encoding="utf-8"
+        )
+        assert addon.mod.get_template("front.html") == (
+            '<link href="./_review-def.css" />\nimport { render } from "./_review-abc.js";'
+        )
+
+
+class TestPublishConfig:
+    def test_hashed_module_and_pointer(self, addon, monkeypatch):
+        addon.mod.publish_config()
+        pointer = (addon.mod.ADDON_DIR / "_config.js").read_text(encoding="utf-8")
+        name = pointer.split('"./')[1].split('"')[0]
+        assert name.startswith("_config-")
+        assert (addon.mod.ADDON_DIR / name).read_text(encoding="utf-8") == (
+            'export default {"languages":["python"],"themes":{"light":"vitesse-light","dark":"vitesse-dark"},'
+            '"cardless":false};\n'
+        )
+        assert addon.mod.publish_config() == []
+
+        monkeypatch.setattr(sys.modules["anki_markdown.shiki"], "generate_config_json", lambda: '{"cardless":true}')
+        assert addon.mod.publish_config() == [name]
+        assert not (addon.mod.ADDON_DIR / name).exists()
+
+    def test_token_stylesheet(self, addon):
+        addon.cfg["classes"] = True
+        addon.mod.publish_config()
+        assert not list(addon.mod.ADDON_DIR.glob("_tokens-*.css"))
+
+        addon.store.colors = {"light": ["24292e"], "dark": ["e1e4e8"]}
+        addon.mod.publish_config()
+        [sheet] = addon.mod.ADDON_DIR.glob("_tokens-*.css")
+        assert sheet.read_text(encoding="utf-8") == "['24292e'] ['e1e4e8']\n"
+        pointer = (addon.mod.ADDON_DIR / "_config.js").read_text(encoding="utf-8")
+        module = (addon.mod.ADDON_DIR / pointer.split('"./')[1].split('"')[0]).read_text(encoding="utf-8")
+        tokens = json.loads(module.removeprefix("export default ").removesuffix(";\n"))["tokens"]
+        assert tokens == {"href": sheet.name, "light": ["24292e"], "dark": ["e1e4e8"]}
+
+        addon.cfg["classes"] = False
+        assert sheet.name in addon.mod.publish_config()
+        assert not sheet.exists()
+
+    def test_sync_prunes_stale_hashed_files(self, addon):
+        (addon.mod.ADDON_DIR / "_review-new.js").write_text("new", encoding="utf-8")
+        stale = [addon.media.path / name for name in ("_config-000000000000.js", "_review.js", "_review-old.js", "_review-worker.js")]
+        for path in stale:
+            path.write_text("old", encoding="utf-8")
+        (addon.media.path / "_user.js").write_text("keep", encoding="utf-8")
+
+        addon.mod.sync_media(addon.mod.publish_config())
+
+        assert not any(path.exists() for path in stale)
+        assert (addon.media.path / "_review-new.js").exists()
+        assert (addon.media.path / "_user.js").exists()
+        assert (addon.media.path / "_config.js").exists()
+
+    def test_sync_publishes_renderer_chunks(self, addon):
+        # Lazily imported chunks have no template reference, only the entry's import
+        for name in ("_review-new.js", "_review-highlight-new.js", "_review-cloze-new.js"):
+            (addon.mod.ADDON_DIR / name).write_text(name, encoding="utf-8")
+        stale = addon.media.path / "_review-highlight-old.js"
+        stale.write_text("old", encoding="utf-8")
+
+        addon.mod.sync_media([])
+
+        assert (addon.media.path / "_review-highlight-new.js").read_text(encoding="utf-8") == "_review-highlight-new.js"
+        assert (addon.media.path / "_review-cloze-new.js").exists()
+        assert not stale.exists()
 
 
 class TestProfileLoaded:
@@ -392,3 +586,50 @@ class TestProfileLoaded:
         addon.mod.on_profile_loaded()
 
         assert [act.text() for act in addon.menu.added] == ["Anki Markdown"]
+
+    def test_records_startup_steps(self, addon):
+        addon.mod.on_profile_loaded()
+
+        names = [name for name, _ms in addon.mod.timing.spans]
+        assert names == ["import", "shiki sync", "media sync", "note types"]
+        assert addon.mod.timing.report().startswith("startup: ")
+
+    def test_warns_on_download_errors(self, addon):
+        addon.store.errors = ["Failed to download python: HTTP Error 404"]
+        addon.mod.on_profile_loaded()
+
+        assert addon.store.synced == [True]
+        assert addon.box.calls
+        assert not addon.mw.progress.timers
+
+    def test_retries_quietly_when_offline(self, addon):
+        addon.store.errors = ["Failed to download python: no connection to esm.sh"]
+        addon.store.failed = ["_lang-python.js"]
+        addon.mod.on_profile_loaded()
+
+        assert not addon.box.calls
+        [timer] = addon.mw.progress.timers
+        assert timer.repeat
+
+        # Still offline: keep polling
+        timer.fn()
+        assert not timer.stopped
+
+        (addon.store.dir / "_lang-python.js").write_text("lang", encoding="utf-8")
+        addon.store.online = ["_lang-python.js"]
+        timer.fn()
+        assert timer.stopped
+        assert (addon.media.path / "_lang-python.js").exists()
+        assert addon.mod._retry_timer is None
+
+    def test_retry_republishes_token_stylesheet(self, addon):
+        addon.cfg["classes"] = True
+        addon.store.errors = ["Failed to download theme nord: no connection to esm.sh"]
+        addon.store.failed = ["_theme-nord.js"]
+        addon.mod.on_profile_loaded()
+        assert not list(addon.media.path.glob("_tokens-*.css"))
+
+        addon.store.colors = {"light": ["24292e"], "dark": ["e1e4e8"]}
+        addon.store.online = ["_theme-nord.js"]
+        addon.mw.progress.timers[0].fn()
+        assert list(addon.media.path.glob("_tokens-*.css"))
@@ -0,0 +1,169 @@
+"""Tests for skills/anki/scripts/anki.py against a stand-in AnkiConnect server."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import importlib.util
+import json
+import threading
+
+import pytest
+
+from conftest import ROOT
+
+
+class FakeAnki:
+    """Answers the AnkiConnect actions the client uses, counting requests and connections."""
+
+    def __init__(self, decks: int = 3):
+        self.decks = {f"Deck {i}": 1000 + i for i in range(decks)}
+        # card id → (deck, due)
+        self.cards = {n + 1: (f"Deck {n % decks}", n // decks % 2 == 0) for n in range(10 * decks)}
+        self.requests: list[dict] = []
+        self.connections = 0
+        # Drop the connection after the next response without announcing it
+        self.hang_up = False
+
+    def find_cards(self, query):
+        due = query.startswith("is:due")
+        deck = query.split('deck:"', 1)[1][:-1].replace('\\"', '"') if "deck:" in query else None
+        return [n for n, (d, is_due) in self.cards.items() if (deck is None or d == deck) and (is_due or not due)]
+
+    def run(self, action, params):
+        if action == "multi":
+            return [self.answer(call) for call in params["actions"]]
+        if action == "deckNamesAndIds":
+            return self.decks
+        if action == "findCards":
+            return self.find_cards(params["query"])
+        if action == "notesInfo":
+            return [{"noteId": n} for n in params["notes"]]
+        if action == "cardsInfo":
+            return [{"cardId": n, "deckName": self.cards[n][0]} for n in params["cards"]]
+        if action == "getTags":
+            return ["spanish::verb", "Verbs", "cs"]
+        if action == "addNote":
+            return 42
+        raise ValueError(f"unsupported action: {action}")
+
+    def answer(self, request):
+        try:
+            return {"result": self.run(request["action"], request.get("params", {})), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+
+@pytest.fixture
+def server():
+    fake = FakeAnki()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            fake.connections += 1
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            fake.requests.append(request)
+            body = json.dumps(fake.answer(request)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            if fake.hang_up:
+                fake.hang_up = False
+                self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield fake
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client():
+    spec = importlib.util.spec_from_file_location("anki_client", ROOT / "skills" / "anki" / "scripts" / "anki.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+class TestAnkiConnect:
+    def test_reuses_connection(self, client, server):
+        with client.AnkiConnect(server.url) as anki:
+            for _ in range(3):
+                assert anki.invoke("getTags") == ["spanish::verb", "Verbs", "cs"]
+        assert len(server.requests) == 3
+        assert server.connections == 1
+
+    def test_reconnects_after_server_closes(self, client, server):
+        with client.AnkiConnect(server.url) as anki:
+            server.hang_up = True
+            anki.invoke("getTags")
+            assert anki.invoke("getTags")
+        assert server.connections == 2
+
+    def test_errors(self, client, server):
+        with client.AnkiConnect(server.url) as anki:
+            with pytest.raises(client.AnkiError, match="unsupported action: nope"):
+                anki.invoke("nope")
+            with pytest.raises(client.AnkiError, match="unsupported action: nope"):
+                anki.multi([("getTags", {}), ("nope", {})])
+
+    def test_deck_stats_in_one_multi(self, client, server):
+        server.__init__(decks=300)
+        with client.AnkiConnect(server.url) as anki:
+            stats = anki.deck_stats()
+        assert [request["action"] for request in server.requests] == ["deckNamesAndIds", "multi"]
+        assert len(stats) == 300
+        assert stats[0] == {"name": "Deck 0", "id": 1000, "total": 10, "due": 5}
+
+    def test_chunked_info(self, client, server):
+        with client.AnkiConnect(server.url) as anki:
+            ids = list(range(1, 8))
+            assert [note["noteId"] for note in anki.chunked("notesInfo", "notes", ids, chunk=3)] == ids
+        assert [len(request["params"]["notes"]) for request in server.requests] == [3, 3, 1]
+
+
+class TestCli:
+    def run(self, client, server, capsys, *argv):
+        assert client.main(list(argv), url=server.url) == 0
+        return json.loads(capsys.readouterr().out)
+
+    def test_decks_stats(self, client, server, capsys):
+        assert self.run(client, server, capsys, "decks", "--stats")[1] == {
+            "name": "Deck 1",
+            "id": 1001,
+            "total": 10,
+            "due": 5,
+        }
+
+    def test_due_streams_cards(self, client, server, capsys, monkeypatch):
+        monkeypatch.setattr(client, "CHUNK", 2)
+        cards = self.run(client, server, capsys, "due", "Deck 0", "--limit", "3")
+        assert [card["cardId"] for card in cards] == [1, 7, 13]
+        assert [len(request["params"]["cards"]) for request in server.requests[1:]] == [2, 1]
+        assert self.run(client, server, capsys, "due", "Nope") == []
+
+    def test_add(self, client, server, capsys):
+        assert self.run(client, server, capsys, "add", "D", "M", '{"Front":"Q"}', "--tags", "a  b") == 42
+        assert server.requests[-1]["params"]["note"] == {
+            "deckName": "D",
+            "modelName": "M",
+            "fields": {"Front": "Q"},
+            "tags": ["a", "b"],
+        }
+
+    def test_tags_pattern(self, client, server, capsys):
+        assert self.run(client, server, capsys, "tags", "--pattern", "VERB") == ["spanish::verb", "Verbs"]
+
+    def test_error_exit(self, client, server, capsys):
+        assert client.main(["fields", "X"], url=server.url) == 1
+        assert "unsupported action: modelFieldNames" in capsys.readouterr().err
@@ -0,0 +1,52 @@
+"""Tests for configure.py — which stages a config change runs."""
+
+CONFIG = {
+    "languages": ["python", "rust"],
+    "themes": {"light": "vitesse-light", "dark": "vitesse-dark"},
+    "shallow": False,
+    "cardless": False,
+    "worker": False,
+    "classes": False,
+    "prerender": False,
+}
+
+
+def test_unchanged_runs_nothing(configure):
+    assert configure.plan(CONFIG, dict(CONFIG)) == []
+
+
+def test_ui_flag_only_publishes_config(configure):
+    assert configure.plan(CONFIG, {**CONFIG, "cardless": True}) == ["config"]
+
+
+def test_theme_change_fetches_themes(configure):
+    new = {**CONFIG, "themes": {"light": "nord", "dark": "vitesse-dark"}}
+    assert configure.plan(CONFIG, new) == ["themes", "cleanup", "config"]
+
+
+def test_language_change_syncs(configure):
+    assert configure.plan(CONFIG, {**CONFIG, "languages": ["python"]}) == ["languages", "cleanup", "config"]
+    assert configure.plan(CONFIG, {**CONFIG, "shallow": True}) == ["languages", "cleanup", "config"]
+
+
+def test_language_order_needs_no_download(configure):
+    assert configure.plan(CONFIG, {**CONFIG, "languages": ["rust", "python"]}) == ["config"]
+
+
+def test_failed_downloads_retry(configure):
+    assert configure.plan(CONFIG, dict(CONFIG), failed=True) == ["languages", "cleanup", "config"]
+
+
+def test_prerender_updates_note_types(configure):
+    on = {**CONFIG, "prerender": True}
+    assert configure.plan(CONFIG, on) == ["config", "notetypes", "prerender"]
+    assert configure.plan(on, CONFIG) == ["config", "notetypes"]
+    assert configure.plan(on, {**on, "themes": {"light": "nord", "dark": "nord"}}) == ["themes", "cleanup", "config", "prerender"]
+    assert configure.plan(on, {**on, "worker": True}) == ["config"]
+    assert configure.plan(on, {**on, "classes": True}) == ["config", "prerender"]
+    assert configure.plan(CONFIG, {**CONFIG, "classes": True}) == ["config"]
+
+
+def test_missing_flags_count_as_off(configure):
+    old = {key: value for key, value in CONFIG.items() if key != "shallow"}
+    assert configure.plan(old, CONFIG) == ["config"]
@@ -0,0 +1,107 @@
+"""Tests for exporter.py — streaming incremental export to markdown files."""
+
+DECKS = {1: "Default", 2: "Lang::Rust", 3: "Filtered"}
+
+
+def files(root):
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_file() and not p.name.startswith("."))
+
+
+def setup(db):
+    db.add(10, 1, 100, "What is **ser**?", "To be.<br>Permanent &amp; more", tags=" spanish verb ")
+    db.card(10, 1)
+    db.add(20, 1, 100, "Borrow?", "")
+    db.card(20, 2)
+    db.add(30, 2, 100, "{{c1::Ownership}}", "Extra")
+    db.card(30, 3, ord=0, odid=2)
+    db.card(30, 1, ord=1)
+    db.add(40, 9, 100, "other notetype", "")
+    db.card(40, 1)
+
+
+class TestRender:
+    def test_note(self, exporter):
+        assert exporter.render_note("A::B", " x y ", "Q<br/>line\x1fA &lt;b&gt;") == (
+            "---\ndeck: A::B\ntags: x y\n---\n\nQ\nline\n\n<!-- back -->\n\nA <b>\n"
+        )
+        assert exporter.render_note("A", "", "Q\x1f") == "---\ndeck: A\n---\n\nQ\n"
+
+    def test_deck_dir(self, exporter):
+        assert exporter.deck_dir("Lang::C/C++::..").as_posix() == "Lang/C_C++/_"
+
+
+class TestByNote:
+    def test_incremental(self, exporter, db, tmp_path):
+        setup(db)
+        out = exporter.Exporter(tmp_path / "out")
+
+        assert out.run(db, [1, 2], DECKS) == {"written": 3, "deleted": 0, "unchanged": 0}
+        assert files(tmp_path / "out") == ["Default/10.md", "Lang/Rust/20.md", "Lang/Rust/30.md"]
+        assert (tmp_path / "out" / "Default" / "10.md").read_text(encoding="utf-8") == (
+            "---\ndeck: Default\ntags: spanish verb\n---\n\n"
+            "What is **ser**?\n\n<!-- back -->\n\nTo be.\nPermanent & more\n"
+        )
+
+        assert out.run(db, [1, 2], DECKS) == {"written": 0, "deleted": 0, "unchanged": 3}
+
+        # Edited, moved, deleted, and touched without a content change
+        db.add(10, 1, 200, "What is **ser**?", "To be.", tags="spanish verb")
+        db.card(20, 1)
+        db.remove(30)
+        mtime = (tmp_path / "out" / "Default" / "10.md").stat().st_mtime_ns
+        assert out.run(db, [1, 2], DECKS) == {"written": 2, "deleted": 1, "unchanged": 0}
+        assert files(tmp_path / "out") == ["Default/10.md", "Default/20.md"]
+        assert (tmp_path / "out" / "Default" / "10.md").stat().st_mtime_ns >= mtime
+
+        db.add(20, 1, 300, "Borrow?", "")
+        assert out.run(db, [1, 2], DECKS) == {"written": 0, "deleted": 0, "unchanged": 2}
+
+    def test_round_trips_through_importer(self, exporter, importer, db, tmp_path):
+        setup(db)
+        exporter.Exporter(tmp_path / "out").run(db, [1, 2], DECKS)
+        plan = importer.Importer(tmp_path / "out", tmp_path / "index.json").scan()
+        assert sorted((n["deck"], n["cloze"], n["fields"][0], n["tags"]) for n in plan.add) == [
+            ("Default", False, "What is **ser**?", ["spanish", "verb"]),
+            ("Lang::Rust", False, "Borrow?", []),
+            ("Lang::Rust", True, "{{c1::Ownership}}", []),
+        ]
+
+
+class TestByDeck:
+    def test_incremental(self, exporter, db, tmp_path, monkeypatch):
+        monkeypatch.setattr(exporter, "CHUNK", 1)
+        setup(db)
+        out = exporter.Exporter(tmp_path / "out", "deck")
+
+        assert out.run(db, [1, 2], DECKS) == {"written": 2, "deleted": 0, "unchanged": 0}
+        assert files(tmp_path / "out") == ["Default.md", "Lang/Rust.md"]
+        assert (tmp_path / "out" / "Lang" / "Rust.md").read_text(encoding="utf-8") == (
+            "---\ndeck: Lang::Rust\n---\n"
+            "\n<!-- note: 20 -->\n\nBorrow?\n"
+            "\n<!-- note: 30 -->\n\n{{c1::Ownership}}\n\n<!-- back -->\n\nExtra\n"
+        )
+
+        db.add(20, 1, 200, "Borrow checker?", "")
+        assert out.run(db, [1, 2], DECKS) == {"written": 1, "deleted": 0, "unchanged": 1}
+
+        db.remove(10)
+        assert out.run(db, [1, 2], DECKS) == {"written": 0, "deleted": 1, "unchanged": 1}
+        assert files(tmp_path / "out") == ["Lang/Rust.md"]
+
+    def test_colliding_deck_names(self, exporter, db, tmp_path):
+        db.add(10, 1, 100, "slash", "")
+        db.card(10, 4)
+        db.add(20, 1, 100, "colon", "")
+        db.card(20, 5)
+        db.add(30, 1, 100, "case", "")
+        db.card(30, 6)
+        decks = {4: "C/C++", 5: "C:C++", 6: "c_c++"}
+
+        exporter.Exporter(tmp_path / "out", "deck").run(db, [1], decks)
+        assert files(tmp_path / "out") == ["C_C++ (4).md", "C_C++ (5).md", "c_c++ (6).md"]
+        assert "deck: C:C++\n" in (tmp_path / "out" / "C_C++ (5).md").read_text(encoding="utf-8")
+
+    def test_layout_change_starts_over(self, exporter, db, tmp_path):
+        setup(db)
+        exporter.Exporter(tmp_path / "out").run(db, [1, 2], DECKS)
+        assert exporter.Exporter(tmp_path / "out", "deck").run(db, [1, 2], DECKS)["written"] == 2
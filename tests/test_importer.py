@@ -0,0 +1,122 @@
+"""Tests for importer.py — parsing markdown files and incremental import plans."""
+
+import os
+
+BASIC = """---
+deck: Spanish::Verbs
+tags: spanish, verb
+---
+
+What does **ser** mean?
+
+<!-- back -->
+
+To be.
+
+<!-- note: estar -->
+
+{{c1::Estar}} is for states.
+
+<!-- back -->
+Extra
+"""
+
+
+class TestParse:
+    def test_notes(self, importer):
+        notes = importer.parse(BASIC, "es/verbs.md", "cards::es")
+        assert [(n["key"], n["cloze"], n["fields"], n["deck"], n["tags"]) for n in notes] == [
+            ("es/verbs.md#1", False, ["What does **ser** mean?", "To be."], "Spanish::Verbs", ["spanish", "verb"]),
+            ("es/verbs.md#estar", True, ["{{c1::Estar}} is for states.", "Extra"], "Spanish::Verbs", ["spanish", "verb"]),
+        ]
+
+    def test_defaults(self, importer):
+        notes = importer.parse("Front only\n", "a.md", "cards")
+        assert [(n["fields"], n["deck"], n["tags"]) for n in notes] == [(["Front only", ""], "cards", [])]
+
+    def test_markers_in_code_are_content(self, importer):
+        text = "Q\n\n```html\n<!-- back -->\n```\n\n<!-- back -->\nA"
+        assert importer.parse(text, "a.md", "d")[0]["fields"] == ["Q\n\n```html\n<!-- back -->\n```", "A"]
+
+    def test_skips_empty_notes(self, importer):
+        assert [n["key"] for n in importer.parse("<!-- note -->\nA\n<!-- note -->\n\n", "a.md", "d")] == ["a.md#1"]
+
+    def test_default_deck(self, importer, tmp_path):
+        root = tmp_path / "cards"
+        assert importer.default_deck(root, importer.Path("es/verbs/ser.md")) == "cards::es::verbs"
+        assert importer.default_deck(root, importer.Path("top.md")) == "cards"
+
+
+class TestImporter:
+    def setup(self, importer, tmp_path):
+        root = tmp_path / "cards"
+        (root / "es").mkdir(parents=True)
+        (root / ".git").mkdir()
+        (root / ".git" / "x.md").write_text("ignored", encoding="utf-8")
+        (root / "es" / "verbs.md").write_text(BASIC, encoding="utf-8")
+        (root / "cs.md").write_text("CPU?\n<!-- back -->\nProcessor", encoding="utf-8")
+        return root, importer.Importer(root, tmp_path / "index.json")
+
+    def apply(self, imp, plan, start=100):
+        """Pretend notes were added with sequential ids."""
+        added = {note["key"]: start + i for i, note in enumerate(plan.add)}
+        imp.commit(plan, added)
+        return added
+
+    def test_incremental(self, importer, tmp_path):
+        root, imp = self.setup(importer, tmp_path)
+
+        plan = imp.scan()
+        assert [n["key"] for n in plan.add] == ["cs.md#1", "es/verbs.md#1", "es/verbs.md#estar"]
+        assert (plan.update, plan.remove, plan.parsed) == ([], {}, 2)
+        self.apply(imp, plan)
+
+        plan = imp.scan()
+        assert not plan
+        assert (plan.scanned, plan.parsed) == (2, 0)
+
+        # One-line edit: only that file is parsed, only that note updated
+        (root / "es" / "verbs.md").write_text(BASIC.replace("To be.", "To be (permanent)."), encoding="utf-8")
+        plan = imp.scan()
+        assert plan.parsed == 1
+        assert [(nid, n["fields"][1]) for nid, n in plan.update] == [(101, "To be (permanent).")]
+        assert plan.add == [] and plan.remove == {}
+        self.apply(imp, plan)
+        assert not imp.scan()
+
+        # Touched but identical: re-hashed, not parsed
+        os.utime(root / "cs.md", ns=(1, 1))
+        plan = imp.scan()
+        assert not plan and plan.parsed == 0
+
+    def test_removals(self, importer, tmp_path):
+        root, imp = self.setup(importer, tmp_path)
+        self.apply(imp, imp.scan())
+
+        (root / "cs.md").unlink()
+        plan = imp.scan()
+        assert plan.remove == {"cs.md#1": 100}
+
+        # Declined: offered again next time
+        imp.commit(plan, {}, removed=False)
+        assert imp.scan().remove == {"cs.md#1": 100}
+
+        imp.commit(plan, {})
+        assert not imp.scan()
+
+    def test_readded_notes_get_new_ids(self, importer, tmp_path):
+        root, imp = self.setup(importer, tmp_path)
+        self.apply(imp, imp.scan())
+
+        (root / "cs.md").write_text("CPU?\n<!-- back -->\nCentral processor", encoding="utf-8")
+        plan = imp.scan()
+        # The note was deleted in Anki, so applying re-created it
+        imp.commit(plan, {"cs.md#1": 500})
+        assert imp.read()["notes"]["cs.md#1"][0] == 500
+
+    def test_full_keeps_note_ids(self, importer, tmp_path):
+        _root, imp = self.setup(importer, tmp_path)
+        self.apply(imp, imp.scan())
+
+        plan = imp.scan(full=True)
+        assert not plan and plan.parsed == 2
@@ -0,0 +1,155 @@
+"""Tests for lint.py and lint_checks.py — field checks and the incremental engine."""
+
+from concurrent.futures import ProcessPoolExecutor
+import importlib.util
+import multiprocessing
+import sys
+
+from conftest import ROOT
+
+LANGS = frozenset({"python", "js", "javascript"})
+MODELS = {1: (["Front", "Back"], False), 2: (["Text", "Extra"], True)}
+
+
+# Checks
+
+
+class TestClozeTags:
+    def test_closed(self, checks):
+        assert checks.cloze_tags("{{c1::a}} {{c2,3::b::hint}}") == ({1, 2, 3}, [])
+
+    def test_unclosed(self, checks):
+        assert checks.cloze_tags("{{c1::a {{c2::b}} c") == ({2}, ["{{c1::"])
+
+    def test_lang_braces(self, checks):
+        assert checks.cloze_tags("{{c1::`const { a } = b`{js}}} rest") == ({1}, [])
+
+    def test_tags_in_hint_are_text(self, checks):
+        assert checks.cloze_tags("{{c1::a::see {{c2::x}}") == ({1}, [])
+
+
+class TestCheckField:
+    def test_clean(self, checks):
+        text = "Hi **there** <b>bold</b>\n\n```python\nx = 1\n```\n\n`y`{js}"
+        assert checks.check_field(text, LANGS) == []
+
+    def test_unknown_languages(self, checks):
+        text = "```rust\nfn main() {}\n```\n\n`x`{.go} `y`{text}\n\n```\nplain\n```"
+        assert checks.check_field(text, LANGS) == [
+            "language not installed: rust",
+            "language not installed: go",
+        ]
+
+    def test_stripped_html(self, checks):
+        text = "<div>a</div> <br/> <p/> <img src=x.png> <!-- note -->"
+        assert checks.check_field(text, LANGS) == ["HTML removed when rendering: <div>, <p>, <!-- -->"]
+
+    def test_html_in_code_is_ignored(self, checks):
+        text = "`<div>`\n\n```html\n<span>x</span>\n```"
+        assert checks.check_field(text, LANGS | {"html"}) == []
+
+    def test_decodes_entities(self, checks):
+        assert checks.check_field("&lt;div&gt;x&lt;/div&gt;", LANGS) == ["HTML removed when rendering: <div>"]
+
+    def test_cloze(self, checks):
+        assert checks.check_field("{{c1::a}} {{c3::b}} {{c4::c", LANGS, cloze=True) == [
+            "unclosed cloze {{c4::",
+            "cloze numbers skip c2",
+        ]
+        assert checks.check_field("no deletions", LANGS, cloze=True) == ["no cloze deletions"]
+
+
+class TestLint:
+    def rows(self):
+        return [
+            (1, 1, "ok\x1f<div>x</div>"),
+            (2, 2, "{{c1::a}}\x1fok"),
+            (3, 2, "{{c2::a}}\x1f```rust\n```"),
+        ]
+
+    def test_serial(self, lint):
+        assert lint.lint(self.rows(), MODELS, LANGS, workers=1) == {
+            1: ["Back: HTML removed when rendering: <div>"],
+            3: ["Text: cloze numbers skip c1", "Extra: language not installed: rust"],
+        }
+
+    def test_skips_generated_fields(self, lint):
+        models = {1: (["Front", "Back", None], False)}
+        assert lint.lint([(1, 1, "ok\x1fok\x1f<div class='front'></div>")], models, LANGS, workers=1) == {}
+
+    def test_pool_ok_from_anki_entry_points(self, lint, monkeypatch, tmp_path):
+        script = tmp_path / "anki"
+        script.write_text('if __name__ == "__main__":\n    run()\n', encoding="utf-8")
+        main = type(sys)("__main__")
+        main.__file__, main.__spec__ = str(script), None
+        monkeypatch.setitem(sys.modules, "__main__", main)
+        monkeypatch.setattr(sys, "executable", "/usr/bin/python3")
+        assert lint.pool_ok()
+
+        script.unlink()
+        assert not lint.pool_ok()
+        monkeypatch.setattr(main, "__spec__", object())
+        assert lint.pool_ok()
+
+        monkeypatch.setattr(sys, "frozen", True, raising=False)
+        assert not lint.pool_ok()
+
+    def test_pool_matches_serial(self, lint, monkeypatch):
+        monkeypatch.setattr(lint, "CHUNK", 1)
+        rows = self.rows() * 4
+        assert lint.lint(rows, MODELS, LANGS, workers=2) == lint.lint(rows, MODELS, LANGS, workers=1)
+
+    def test_workers_import_only_the_checks(self, monkeypatch):
+        # Loaded as the add-on loads it: inside a package, its folder not on sys.path
+        monkeypatch.delitem(sys.modules, "lint_checks", raising=False)
+        spec = importlib.util.spec_from_file_location("addon.lint", ROOT / "anki_markdown" / "lint.py")
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        path = list(sys.path)
+
+        # lint() falls back to serial on any pool error, so drive the pool directly
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+            with mod.importable(str(ROOT / "anki_markdown")):
+                parts = pool.map(mod.checks.check_chunk, [self.rows()], [MODELS], [LANGS])
+            assert list(parts) == [mod.lint(self.rows(), MODELS, LANGS, workers=1)]
+        assert sys.path == path
+
+
+# Engine
+
+
+class TestLinter:
+    def test_incremental(self, lint, db, tmp_path):
+        db.add(1, 1, 100, "ok", "<div>x</div>")
+        db.add(2, 2, 100, "{{c1::a}}", "")
+        db.add(3, 3, 100, "<div>other notetype</div>", "")
+        linter = lint.Linter(tmp_path / "lint.json")
+
+        found, checked = linter.run(db, MODELS, LANGS)
+        assert checked == 2
+        assert found == {1: ["Back: HTML removed when rendering: <div>"]}
+
+        found, checked = linter.run(db, MODELS, LANGS)
+        assert (found, checked) == ({1: ["Back: HTML removed when rendering: <div>"]}, 0)
+
+        db.add(1, 1, 200, "ok", "fixed")
+        db.add(2, 2, 200, "{{c2::a}}", "")
+        db.add(4, 1, 50, "```go\n```", "")
+        found, checked = linter.run(db, MODELS, LANGS)
+        assert checked == 3
+        assert found == {
+            2: ["Text: cloze numbers skip c1"],
+            4: ["Front: language not installed: go"],
+        }
+
+        db.remove(2)
+        found, checked = linter.run(db, MODELS, LANGS)
+        assert (found, checked) == ({4: ["Front: language not installed: go"]}, 0)
+
+    def test_relints_all_when_languages_change(self, lint, db, tmp_path):
+        db.add(1, 1, 100, "```go\n```", "")
+        linter = lint.Linter(tmp_path / "lint.json")
+
+        assert linter.run(db, MODELS, LANGS)[0] == {1: ["Front: language not installed: go"]}
+        assert linter.run(db, MODELS, LANGS | {"go"}) == ({}, 1)
+        assert linter.run(db, MODELS, LANGS | {"go"}, full=True) == ({}, 1)
@@ -0,0 +1,72 @@
+"""Tests for media.py — reference extraction and the note → media index."""
+
+import types
+
+
+class TestReferences:
+    def test_markdown_images(self, media):
+        text = '![a](foo%20bar.png) ![](<x y.png> "title") ![](img.png?v=2)'
+        assert media.references(text) == {"foo bar.png", "x y.png", "img.png"}
+
+    def test_img_tags(self, media):
+        text = "<img src=\"a.jpg\"> <IMG alt=1 src=b.gif> &lt;img src=&quot;c.png&quot;&gt;"
+        assert media.references(text) == {"a.jpg", "b.gif", "c.png"}
+
+    def test_skips_urls(self, media):
+        text = "![](https://example.com/a.png) ![](//cdn/b.png) ![](/c.png) ![](data:image/png;base64,x)"
+        assert media.references(text) == set()
+
+    def test_note_references(self, media):
+        assert media.note_references("![](b.png)\x1f![](a.png) ![](b.png)") == ["a.png", "b.png"]
+
+
+class TestMediaIndex:
+    def test_refresh_is_incremental(self, media, db, tmp_path):
+        db.add(1, 10, 100, "![](a.png)", "")
+        db.add(2, 10, 100, "![](b.png)", "")
+        db.add(3, 99, 100, "![](other.png)", "")
+        index = media.MediaIndex(tmp_path / "media.json")
+
+        assert index.refresh(db, [10]) == 2
+        assert index.files() == {"a.png", "b.png"}
+        assert index.refresh(db, [10]) == 0
+
+        db.add(2, 10, 200, "![](c.png)", "")
+        db.remove(1)
+        assert index.refresh(db, [10]) == 1
+        assert index.files() == {"c.png"}
+        assert index.notes_using("c.png") == [2]
+
+        reloaded = media.MediaIndex(tmp_path / "media.json")
+        assert reloaded.files() == {"c.png"}
+        assert reloaded.refresh(db, [10]) == 0
+
+    def test_notetype_change_rebuilds(self, media, db, tmp_path):
+        db.add(1, 10, 100, "![](a.png)", "")
+        db.add(2, 11, 100, "![](b.png)", "")
+        index = media.MediaIndex(tmp_path / "media.json")
+        index.refresh(db, [10])
+
+        assert index.refresh(db, [10, 11]) == 2
+        assert index.files() == {"a.png", "b.png"}
+
+
+class TestMediaCheck:
+    def test_keeps_referenced_files(self, media, db, monkeypatch, tmp_path):
+        db.add(1, 10, 100, "![](used.png)", "")
+        index = media.MediaIndex(tmp_path / "media.json")
+        index.refresh(db, [10])
+        monkeypatch.setattr(media, "refresh_index", lambda full=False: index)
+        report = "Unused files: 2\nUnused: used.png\nUnused: stray.png"
+        output = types.SimpleNamespace(unused=["used.png", "stray.png"], report=report)
+
+        media.on_media_check_did_finish(output)
+
+        assert output.unused == ["stray.png"]
+        assert "Unused: used.png" not in output.report
+        assert "Unused: stray.png" in output.report
+        assert "kept 1 file(s)" in output.report
+
+    def test_strip_report_with_localized_labels(self, media):
+        report = "未使用：a.png\nNon utilisé : b.png\nUnused: c.png"
+        assert media.strip_report(report, {"a.png", "b.png"}) == "Unused: c.png"
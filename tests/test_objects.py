@@ -0,0 +1,92 @@
+"""Tests for objects.py — the shared content-addressed store."""
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def setup(objects, tmp_path):
+    addon = tmp_path / "addon"
+    addon.mkdir()
+    (addon / "_review.js").write_text("js", encoding="utf-8")
+    (addon / "_lang-python.js").write_text("py", encoding="utf-8")
+    profiles = [tmp_path / "p1", tmp_path / "p2"]
+    for path in profiles:
+        path.mkdir()
+    store = objects.ObjectStore(tmp_path / "objects")
+    return addon, profiles, store
+
+
+def files(addon):
+    return sorted(addon.glob("_*"))
+
+
+class TestMaterialize:
+    def test_links_once_per_profile(self, objects, setup):
+        addon, (p1, p2), store = setup
+
+        assert store.materialize(files(addon), p1) == {"link": ["_lang-python.js", "_review.js"]}
+        assert store.materialize(files(addon), p2) == {"link": ["_lang-python.js", "_review.js"]}
+        assert os.path.samefile(p1 / "_review.js", p2 / "_review.js")
+
+        # A fresh store reads the index and only stats
+        store = objects.ObjectStore(store.dir)
+        assert store.materialize(files(addon), p1) == {"kept": ["_lang-python.js", "_review.js"]}
+
+    def test_updates_changed_files(self, setup):
+        addon, (p1, _p2), store = setup
+        store.materialize(files(addon), p1)
+
+        (addon / "_review.js").write_text("js v2", encoding="utf-8")
+        assert store.materialize(files(addon), p1) == {
+            "kept": ["_lang-python.js"],
+            "link": ["_review.js"],
+        }
+        assert (p1 / "_review.js").read_text(encoding="utf-8") == "js v2"
+
+    def test_repairs_diverged_object(self, setup):
+        addon, (p1, p2), store = setup
+        store.materialize(files(addon), p1)
+        store.materialize(files(addon), p2)
+
+        # Written in place through one profile's link: every link sees it
+        (p1 / "_review.js").write_text("broken", encoding="utf-8")
+        assert (p2 / "_review.js").read_text(encoding="utf-8") == "broken"
+
+        result = store.materialize(files(addon), p2)
+        assert result["repaired"] == ["_review.js"]
+        assert (p2 / "_review.js").read_text(encoding="utf-8") == "js"
+        assert store.materialize(files(addon), p1)["link"] == ["_review.js"]
+        assert (p1 / "_review.js").read_text(encoding="utf-8") == "js"
+        assert (addon / "_review.js").read_text(encoding="utf-8") == "js"
+
+    def test_prunes_unused_objects(self, setup):
+        addon, (p1, _p2), store = setup
+        store.materialize(files(addon), p1)
+        old = store.path(store.source_hash(addon / "_lang-python.js"))
+
+        (addon / "_lang-python.js").unlink()
+        store.materialize(files(addon), p1)
+
+        assert not old.exists()
+        assert (p1 / "_lang-python.js").exists()
+
+    def test_copies_without_links(self, objects, setup, monkeypatch):
+        addon, (p1, _p2), store = setup
+
+        def fail(*args):
+            raise OSError("unsupported")
+
+        monkeypatch.setattr(objects.os, "link", fail)
+        monkeypatch.setattr(objects, "reflink", lambda src, dst: False)
+
+        assert store.materialize(files(addon), p1) == {"copy": ["_lang-python.js", "_review.js"]}
+        assert store.materialize(files(addon), p1) == {"kept": ["_lang-python.js", "_review.js"]}
+        assert (p1 / "_review.js").read_text(encoding="utf-8") == "js"
+
+    def test_relinks_identical_copy(self, setup):
+        addon, (p1, _p2), store = setup
+        (p1 / "_review.js").write_text("js", encoding="utf-8")
+
+        assert store.materialize(files(addon), p1)["link"] == ["_lang-python.js", "_review.js"]
@@ -0,0 +1,53 @@
+"""Tests for prerender.py — the plain helpers; rendering itself runs in a webview."""
+
+
+def test_field_index(prerender):
+    assert prerender.field_index(["Front", "Back", "Rendered"], "Rendered") == 2
+    assert prerender.field_index(["Front", "Back"], "Rendered") is None
+
+
+def test_request_pads_missing_fields(prerender):
+    assert prerender.request(["# Q", "A", "<div></div>"], 2) == ["# Q", "A", "<div></div>"]
+    assert prerender.request(["# Q"], 2) == ["# Q", "", ""]
+
+
+def test_changed_keeps_new_snapshots(prerender):
+    assert prerender.changed([1, 2, 3], ["<a>", None, "<c>"]) == {1: "<a>", 3: "<c>"}
+
+
+def test_chunks(prerender):
+    assert list(prerender.chunks([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+
+
+def renderer(prerender):
+    """A Renderer without its webview, for the request bookkeeping."""
+    render = prerender.Renderer.__new__(prerender.Renderer)
+    render.ready, render.failed, render.queue, render.callbacks, render.seq = False, False, [], {}, 0
+    return render
+
+
+def test_failed_page_fails_pending_and_later_requests(prerender):
+    render = renderer(prerender)
+    results = []
+    render.callbacks[1] = results.append
+    render.queue.append("ankiMdSnapshot(1, [])")
+
+    render.on_message("ankimd:failed")
+    assert (results, render.queue, render.callbacks) == ([None], [], {})
+
+    render.render([["a", "b", ""]], results.append)
+    assert results == [None, None]
+
+
+def test_expire(prerender):
+    render = renderer(prerender)
+    results = []
+    render.ready = True
+    render.callbacks = {1: results.append, 2: results.append}
+    render.expire(1)
+    assert (results, list(render.callbacks)) == ([None], [2])
+
+    # A page that never got ready won't answer the rest either
+    render.ready = False
+    render.expire(3)
+    assert (results, render.callbacks, render.failed) == ([None, None], {}, True)
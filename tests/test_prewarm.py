@@ -0,0 +1,28 @@
+"""Tests for prewarm.py — the script handed to the reviewer page."""
+
+URL = "./_review-abc.js"
+
+
+def test_basic_card(prewarm):
+    js = prewarm.script(URL, "basic", {"Front": "# Q", "Back": "A &amp; B", "Rendered": "<div></div>"}, 0)
+    assert js == 'import("./_review-abc.js").then((m) => m.prewarm(...["# Q", "A &amp; B"])).catch(() => {});'
+
+
+def test_cloze_card_passes_ordinal(prewarm):
+    js = prewarm.script(URL, "cloze", {"Text": "{{c2::x}}", "Extra": ""}, 1)
+    assert 'm.prewarmCloze(...["{{c2::x}}", "", 2])' in js
+
+
+def test_fields_are_json_quoted(prewarm):
+    js = prewarm.script(URL, "basic", {"Front": '`a"b`', "Back": "</script>\n"}, 0)
+    assert '["`a\\"b`", "</script>\\n"]' in js
+
+
+def test_fields_by_name(prewarm):
+    fields = {"Source": "ignored", "Back": "A", "Front": "Q"}
+    assert 'm.prewarm(...["Q", "A"])' in prewarm.script(URL, "basic", fields, 0)
+
+
+def test_needs_both_fields(prewarm):
+    assert prewarm.script(URL, "basic", {"Front": "only"}, 0) is None
+    assert prewarm.script(URL, "other", {"Front": "a", "Back": "b"}, 0) is None
@@ -0,0 +1,41 @@
+"""Tests for reconcile.py — finding add-on files in media that nothing needs."""
+
+CONFIG = {"languages": ["html"], "themes": {"light": "nord", "dark": "nord"}}
+
+
+def media_dir(tmp_path, names):
+    for name in names:
+        (tmp_path / name).write_text("x" * 10, encoding="utf-8")
+    return tmp_path
+
+
+def test_scan_lists_owned_files(reconcile, tmp_path):
+    media_dir(tmp_path, ["_lang-go.js", "_review-abc.js", "_review.css", "_user.js", "photo.png", "_config.js"])
+    (tmp_path / "_theme-dir.js").mkdir()
+    assert reconcile.scan(tmp_path) == {"_lang-go.js": 10, "_review-abc.js": 10, "_review.css": 10}
+
+
+def test_needed_includes_missing_and_deps(reconcile):
+    assert reconcile.needed(CONFIG, {"css"}) == {"_lang-html.js", "_lang-css.js", "_theme-nord.js"}
+
+
+def test_extras_keep_published_and_needed(reconcile, tmp_path):
+    media_dir(tmp_path, ["_lang-html.js", "_lang-css.js", "_lang-rust.js", "_theme-nord.js", "_theme-dracula.js", "_review-old.js", "_review-new.js"])
+    keep = {"_review-new.js", "_lang-html.js"} | reconcile.needed(CONFIG, {"css"})
+    found = reconcile.extras(reconcile.scan(tmp_path), keep)
+    assert found == {"_lang-rust.js": 10, "_review-old.js": 10, "_theme-dracula.js": 10}
+
+
+def test_report_and_summary(reconcile):
+    found = {f"_lang-{i:02}.js": 2048 for i in range(reconcile.SHOWN + 2)}
+    text = reconcile.report(found)
+    assert text.splitlines()[0] == "_lang-00.js (2.0 KB)"
+    assert text.splitlines()[-1] == "… and 2 more"
+    assert reconcile.summary(found) == f"{reconcile.SHOWN + 2} file(s), {2 * (reconcile.SHOWN + 2)} KB"
+    assert reconcile.summary({"_lang-a.js": 10}) == "1 file(s), 10 bytes"
+
+
+def test_remove_skips_missing(reconcile, tmp_path):
+    media_dir(tmp_path, ["_lang-rust.js"])
+    assert reconcile.remove(tmp_path, ["_lang-rust.js", "_lang-go.js"]) == ["_lang-rust.js"]
+    assert not (tmp_path / "_lang-rust.js").exists()
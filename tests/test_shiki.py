@@ -3,14 +3,27 @@
 Most tests read from node_modules (offline). Tests marked @online hit esm.sh.
 """
 
+import importlib.util
+import json
+import time
+
 import pytest
 
+from conftest import ROOT
+
 online = pytest.mark.online
 
 
 # Pure function tests
 
 
+def test_bundled_data_loads_lazily(shiki):
+    assert "SHIKI_VERSION" not in vars(shiki)
+    assert "store" not in vars(shiki)
+    assert shiki.SHIKI_VERSION == shiki.ShikiStore(shiki.ADDON_DIR).version
+    assert "SHIKI_VERSION" in vars(shiki)
+
+
 class TestIsAliasModule:
     def test_alias(self, shiki):
         content = b'import{default as o}from"./shellscript.mjs";export{o as default};'
@@ -192,6 +205,581 @@ class TestSync:
         assert (tmp_path / "_lang-c.js").exists()
 
 
+# Version index and delta upgrades (synthetic modules, offline)
+
+
+class TestUpgrade:
+    def fake(self, shiki, monkeypatch, modules):
+        calls = []
+
+        def fetch(url):
+            calls.append(url)
+            name = url.rsplit("/", 1)[1].removesuffix(".mjs")
+            if isinstance(modules[name], Exception):
+                raise modules[name]
+            return modules[name]
+
+        monkeypatch.setattr(shiki, "fetch_module", fetch)
+        return calls
+
+    def test_tags_downloads(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"nord": b"var a;"})
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.download_theme("nord")
+        assert s.read_index() == {
+            "_theme-nord.js": {"version": "1", "hash": shiki.digest(b"var a;")},
+        }
+        assert s.stale() == []
+
+    def test_retags_unchanged(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"nord": b"var a;"})
+        shiki.ShikiStore(tmp_path, version="1").download_theme("nord")
+        calls = self.fake(shiki, monkeypatch, {})
+
+        s = shiki.ShikiStore(tmp_path, version="2", hashes={"themes": {"nord": shiki.digest(b"var a;")}})
+        assert s.stale() == ["_theme-nord.js"]
+        downloaded, errors = s.upgrade()
+        assert (downloaded, errors, calls) == ([], [], [])
+        assert s.read_index()["_theme-nord.js"]["version"] == "2"
+
+    def test_retags_untagged_files_that_match(self, shiki, monkeypatch, tmp_path):
+        # Copied in without an index: kept when the embedded JSON matches
+        (tmp_path / "_theme-nord.js").write_bytes(self.ESM_THEME)
+        (tmp_path / "_theme-dusk.js").write_bytes(self.ESM_THEME.replace(b"it", b"is"))
+        calls = self.fake(shiki, monkeypatch, {"dusk": self.ESM_THEME})
+
+        npm = shiki.source_hash(self.NPM_THEME)
+        s = shiki.ShikiStore(tmp_path, version="2", hashes={"themes": {"nord": npm, "dusk": npm}})
+        downloaded, errors = s.upgrade()
+        assert (downloaded, errors) == (["_theme-dusk.js"], [])
+        assert len(calls) == 1
+        assert s.read_index()["_theme-nord.js"] == {"version": "2", "hash": npm}
+        assert s.stale() == []
+
+    def test_fetches_changed(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"nord": b"var a;", "rust": b"var r;"})
+        old = shiki.ShikiStore(tmp_path, version="1")
+        old.download_theme("nord")
+        old.download_lang("rust")
+        calls = self.fake(shiki, monkeypatch, {"nord": b"var b;", "rust": b"var r;"})
+
+        s = shiki.ShikiStore(
+            tmp_path,
+            version="2",
+            hashes={"themes": {"nord": shiki.digest(b"var b;")}, "langs": {"rust": shiki.digest(b"var r;")}},
+        )
+        downloaded, errors = s.upgrade()
+        assert not errors
+        assert downloaded == ["_theme-nord.js"]
+        assert len(calls) == 1
+        assert (tmp_path / "_theme-nord.js").read_bytes() == b"var b;"
+        assert s.stale() == []
+
+    # The npm build generate.ts hashes and esm.sh's minified rebuild of it
+    NPM_THEME = b"""const nord = Object.freeze(JSON.parse("{\\"name\\":\\"nord\\",\\"fg\\":\\"it's\\"}"))
+
+export { nord as default }
+"""
+    ESM_THEME = b"""var t=Object.freeze(JSON.parse('{"name":"nord","fg":"it\\'s"}'));export{t as default};"""
+    ESM_ALIAS = b'import{default as o}from"./nord.mjs";export{o as default};'
+
+    def test_source_hash_ignores_build(self, shiki):
+        assert self.NPM_THEME != self.ESM_THEME
+        assert shiki.source_hash(self.NPM_THEME) == shiki.source_hash(self.ESM_THEME)
+        assert shiki.source_hash(self.ESM_THEME) != shiki.source_hash(self.ESM_THEME.replace(b"it", b"is"))
+
+    def test_retags_esm_modules_by_npm_hash(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"nord": self.ESM_THEME, "arctic": self.ESM_ALIAS})
+        old = shiki.ShikiStore(tmp_path, version="1")
+        old.download_theme("nord")
+        old.download_lang("arctic")
+        calls = self.fake(shiki, monkeypatch, {})
+
+        npm = shiki.source_hash(self.NPM_THEME)
+        s = shiki.ShikiStore(tmp_path, version="2", hashes={"themes": {"nord": npm}, "langs": {"arctic": npm}})
+        downloaded, errors = s.upgrade()
+        assert (downloaded, errors, calls) == ([], [], [])
+        assert s.stale() == []
+
+    def test_keeps_old_set_on_failure(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"nord": b"var a;", "rust": b"var r;"})
+        old = shiki.ShikiStore(tmp_path, version="1")
+        old.download_theme("nord")
+        old.download_lang("rust")
+        self.fake(shiki, monkeypatch, {"nord": b"var b;", "rust": ConnectionError("simulated")})
+
+        s = shiki.ShikiStore(tmp_path, version="2")
+        downloaded, errors = s.upgrade()
+        assert not downloaded
+        assert len(errors) == 1
+        assert (tmp_path / "_theme-nord.js").read_bytes() == b"var a;"
+        assert s.stale() == ["_lang-rust.js", "_theme-nord.js"]
+
+    def test_cleanup_drops_entries(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"nord": b"var a;"})
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.download_theme("nord")
+        s.cleanup({"languages": [], "themes": {"light": "a", "dark": "b"}})
+        assert s.read_index() == {}
+
+
+# Offline fast-fail and failure backoff (synthetic modules, offline)
+
+
+class TestOffline:
+    CONFIG = {"languages": ["rust", "go"], "themes": {"light": "nord", "dark": "dracula"}}
+
+    def fake(self, shiki, monkeypatch, modules):
+        return TestUpgrade.fake(self, shiki, monkeypatch, modules)
+
+    def test_network_errors(self, shiki):
+        import urllib.error
+
+        assert shiki.is_network_error(urllib.error.URLError("no route"))
+        assert shiki.is_network_error(TimeoutError())
+        assert shiki.is_network_error(shiki.Offline())
+        assert not shiki.is_network_error(urllib.error.HTTPError("u", 404, "Not Found", {}, None))
+        assert not shiki.is_network_error(ValueError())
+
+    def test_backoff_doubles_up_to_max(self, shiki):
+        assert [shiki.backoff_delay(n) for n in (1, 2, 3)] == [60, 120, 240]
+        assert shiki.backoff_delay(50) == shiki.BACKOFF_MAX
+
+    def test_probe_failure_skips_fetches(self, shiki, monkeypatch, tmp_path):
+        calls = self.fake(shiki, monkeypatch, {})
+        monkeypatch.setattr(shiki, "probe", lambda: False)
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG)
+        assert not downloaded and len(errors) == 4
+        assert s.offline and calls == []
+        assert s.waiting() == ["_lang-go.js", "_lang-rust.js", "_theme-dracula.js", "_theme-nord.js"]
+
+    def test_first_network_failure_short_circuits(self, shiki, monkeypatch, tmp_path):
+        calls = self.fake(shiki, monkeypatch, {"rust": ConnectionError("reset"), "go": b"var g;", "nord": b"var n;", "dracula": b"var d;"})
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        _, errors = s.sync(self.CONFIG)
+        assert len(calls) == 1 and len(errors) == 4
+        assert not (tmp_path / "_lang-go.js").exists()
+
+    def test_bad_response_does_not_short_circuit(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"rust": ValueError("bad module"), "go": b"var g;", "nord": b"var n;", "dracula": b"var d;"})
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG)
+        assert downloaded == ["_lang-go.js", "_theme-nord.js", "_theme-dracula.js"]
+        assert len(errors) == 1
+        assert not s.offline
+        assert s.waiting() == []
+
+    def test_backoff_defers_failed_files(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch, {"rust": ValueError("bad module"), "go": b"var g;", "nord": b"var n;", "dracula": b"var d;"})
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.sync(self.CONFIG)
+        s.sync(self.CONFIG)
+        assert s.read_failures()["_lang-rust.js"][0] == 2
+
+        calls = self.fake(shiki, monkeypatch, {"rust": b"var r;"})
+        assert s.sync(self.CONFIG, backoff=True) == ([], [])
+        assert calls == []
+
+        # A new session after the retry time (or an explicit sync) tries again
+        assert s.deferred(now=time.time() + shiki.BACKOFF_MAX) == set()
+        assert s.sync(self.CONFIG) == (["_lang-rust.js"], [])
+        assert s.read_failures() == {}
+
+    def test_retry_waits_for_connection(self, shiki, monkeypatch, tmp_path):
+        monkeypatch.setattr(shiki, "probe", lambda: False)
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.sync(self.CONFIG, backoff=True)
+        assert s.retry(self.CONFIG) is None
+
+        self.fake(shiki, monkeypatch, {"rust": b"var r;", "go": b"var g;", "nord": b"var n;", "dracula": b"var d;"})
+        monkeypatch.setattr(shiki, "probe", lambda: True)
+        assert s.retry(self.CONFIG) == ["_lang-rust.js", "_lang-go.js", "_theme-nord.js", "_theme-dracula.js"]
+        assert s.waiting() == []
+
+
+# Shallow mode (synthetic modules in esm.sh form, offline)
+
+
+def grammar_module(name: str, scope: str, patterns: list, repository: dict = None, deps: tuple = ()) -> bytes:
+    data = {"name": name, "scopeName": scope, "patterns": patterns, "repository": repository or {}}
+    if deps:
+        data["embeddedLangs"] = list(deps)
+    imports = "".join(f'import d{i} from"./{dep}.mjs";' for i, dep in enumerate(deps))
+    spread = "".join(f"...d{i}," for i in range(len(deps)))
+    return f"{imports}const g=Object.freeze(JSON.parse({json.dumps(json.dumps(data))}));var a=[{spread}g];export{{a as default}};".encode()
+
+
+MODULES = {
+    # Script and style tags embed javascript and css
+    "html": grammar_module(
+        "html",
+        "text.html.basic",
+        [{"begin": "<script>", "end": "</script>", "patterns": [{"include": "source.js"}]}, {"include": "#style"}],
+        {"style": {"begin": "<style>", "end": "</style>", "patterns": [{"include": "source.css"}]}},
+        ("javascript", "css"),
+    ),
+    # glsl builds on c through an include-only repository rule
+    "glsl": grammar_module("glsl", "source.glsl", [{"include": "#base"}], {"base": {"patterns": [{"include": "source.c"}]}}, ("c",)),
+    "c": grammar_module("c", "source.c", []),
+    "javascript": grammar_module("javascript", "source.js", []),
+    "css": grammar_module("css", "source.css", []),
+    "nord": b"var n;",
+    "dracula": b"var d;",
+}
+
+
+class TestShallow:
+    CONFIG = {"languages": ["html", "glsl"], "themes": {"light": "nord", "dark": "dracula"}, "shallow": True}
+    FULL = {**CONFIG, "shallow": False}
+
+    def fake(self, shiki, monkeypatch):
+        return TestUpgrade.fake(self, shiki, monkeypatch, MODULES)
+
+    def test_reads_grammar(self, shiki):
+        data = shiki.module_json(MODULES["html"].decode())
+        assert data["scopeName"] == "text.html.basic"
+        assert data["embeddedLangs"] == ["javascript", "css"]
+        assert shiki.module_json("export default [];") is None
+
+    def test_reads_single_quoted_grammar(self, shiki):
+        text = """const g=JSON.parse('{"name":"x","patterns":[{"match":"it\\'s"}]}');"""
+        assert shiki.module_json(text)["patterns"][0]["match"] == "it's"
+
+    def test_extended_scopes(self, shiki):
+        assert shiki.extended_scopes(shiki.module_json(MODULES["html"].decode())) == set()
+        assert shiki.extended_scopes(shiki.module_json(MODULES["glsl"].decode())) == {"source.c"}
+
+    def test_prune_deps(self, shiki):
+        text = shiki.prune_deps(MODULES["html"].decode(), {"javascript"})
+        assert shiki.lang_deps(text) == ["css"]
+        assert "const d0=[];" in text
+        assert shiki.module_json(text)["embeddedLangs"] == ["css"]
+
+    def test_keeps_hard_deps_only(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch)
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG)
+        assert not errors
+        assert sorted(downloaded) == ["_lang-glsl.js", "_lang-html.js", "_theme-dracula.js", "_theme-nord.js"]
+        assert s.local_langs() == {"html", "glsl", "c"}
+        assert s.local_deps("html") == []
+        assert s.pruned() == {"html": ["css", "javascript"]}
+        assert s.read_index()["_lang-glsl.js"]["pruned"] == []
+        assert not any(s.needs_redownload(lang) for lang in self.CONFIG["languages"])
+
+    def test_debug_shows_pruned(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch)
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.sync(self.CONFIG)
+
+        data = s.debug_data(self.CONFIG)
+        assert data["shallow"] is True
+        assert data["pruned"] == {"html": ["css", "javascript"]}
+        assert "  - html: css, javascript" in s.debug_text(self.CONFIG)
+
+    def test_switching_modes(self, shiki, monkeypatch, tmp_path):
+        self.fake(shiki, monkeypatch)
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.sync(self.FULL)
+        assert s.local_deps("html") == ["css", "javascript"]
+
+        # Full grammars are fetched again pruned, and cleanup drops the embedded ones
+        downloaded, _ = s.sync(self.CONFIG)
+        assert downloaded == ["_lang-html.js", "_lang-glsl.js"]
+        assert s.local_deps("glsl") == ["c"]
+        assert sorted(s.cleanup(self.CONFIG)) == ["_lang-css.js", "_lang-javascript.js"]
+
+        downloaded, _ = s.sync(self.FULL)
+        assert downloaded == ["_lang-html.js"]
+        assert s.local_langs() == {"html", "glsl", "c", "javascript", "css"}
+        assert s.pruned() == {}
+        assert "pruned" not in s.read_index()["_lang-html.js"]
+
+
+# End to end over HTTP (local esm.sh stand-in serving MODULES, offline)
+
+
+@pytest.fixture
+def http(esm_server, monkeypatch):
+    """An unpatched shiki module pointed at a local server, and that server."""
+    spec = importlib.util.spec_from_file_location("shiki", ROOT / "anki_markdown" / "shiki.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    server = esm_server.EsmServer(lambda kind, name: MODULES.get(name)).start()
+    monkeypatch.setattr(mod, "ESM_BASE", server.base)
+    monkeypatch.setattr(mod, "PROBE_HOST", server.address)
+    yield mod, server
+    server.stop()
+
+
+class TestHttp:
+    CONFIG = {"languages": ["html", "glsl"], "themes": {"light": "nord", "dark": "dracula"}}
+
+    def test_sync(self, http, tmp_path):
+        shiki, server = http
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG)
+        assert not errors
+        assert downloaded == ["_lang-html.js", "_lang-glsl.js", "_theme-nord.js", "_theme-dracula.js"]
+        assert s.local_langs() == {"html", "javascript", "css", "glsl", "c"}
+        assert sorted(server.requests) == sorted((name, None) for name in ["html", "javascript", "css", "glsl", "c", "nord", "dracula"])
+        assert s.sync(self.CONFIG) == ([], [])
+        assert len(server.requests) == 7
+
+    def test_latency(self, http, esm_server, tmp_path):
+        shiki, server = http
+        server.faults = esm_server.Faults(latency=0.02, bandwidth=20_000)
+        start = time.perf_counter()
+        _, errors = shiki.ShikiStore(tmp_path, version="1").sync(self.CONFIG)
+        assert not errors
+        assert time.perf_counter() - start >= 0.02 * 7 + server.sent / 20_000 * 0.9
+
+    def test_reset_waits_for_retry(self, http, tmp_path):
+        shiki, server = http
+        server.faults.rules["javascript"] = "reset"
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG, backoff=True)
+        assert not downloaded and len(errors) == 4
+        assert s.offline
+        assert [name for name, _ in server.requests] == ["html", "javascript"]
+        assert s.waiting() == ["_lang-glsl.js", "_lang-html.js", "_theme-dracula.js", "_theme-nord.js"]
+
+        server.faults.rules.clear()
+        assert s.retry(self.CONFIG) == ["_lang-html.js", "_lang-glsl.js", "_theme-nord.js", "_theme-dracula.js"]
+        assert s.read_failures() == {}
+
+    def test_server_error_backs_off(self, http, tmp_path):
+        shiki, server = http
+        server.faults.rules["c"] = "error"
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG, backoff=True)
+        assert downloaded == ["_lang-html.js", "_theme-nord.js", "_theme-dracula.js"]
+        assert len(errors) == 1 and "503" in errors[0]
+        assert not s.offline
+        assert s.waiting() == []
+        assert s.deferred() == {"_lang-glsl.js"}
+
+    def test_truncated_body_is_not_stored(self, http, tmp_path):
+        shiki, server = http
+        server.faults.rules["nord"] = "truncate"
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG)
+        assert downloaded == ["_lang-html.js", "_lang-glsl.js"]
+        assert len(errors) == 2
+        assert s.offline
+        assert not (tmp_path / "_theme-nord.js").exists()
+
+    def test_unreachable(self, http, tmp_path):
+        shiki, server = http
+        server.stop()
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG)
+        assert not downloaded and len(errors) == 4
+        assert s.offline
+        assert server.requests == []
+
+    def test_cleanup(self, http, tmp_path):
+        shiki, _ = http
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.sync(self.CONFIG)
+
+        removed = s.cleanup({**self.CONFIG, "languages": ["glsl"]})
+        assert sorted(removed) == ["_lang-css.js", "_lang-html.js", "_lang-javascript.js"]
+        assert sorted(s.read_index()) == ["_lang-c.js", "_lang-glsl.js", "_theme-dracula.js", "_theme-nord.js"]
+
+    def test_seeded_faults(self, esm_server):
+        a, b = esm_server.Faults(reset=0.2, error=0.2, seed=3), esm_server.Faults(reset=0.2, error=0.2, seed=3)
+        assert [a.pick("x") for _ in range(50)] == [b.pick("x") for _ in range(50)]
+        assert {a.pick("x") for _ in range(200)} == {"reset", "error", None}
+        a.rules["x"] = "truncate"
+        assert a.pick("x") == "truncate"
+
+
+class TestParallel:
+    CONFIG = {"languages": ["html", "css", "glsl", "javascript"], "themes": {"light": "nord", "dark": "nord"}}
+
+    def test_parallel_sync_fetches_each_module_once(self, http, tmp_path):
+        shiki, server = http
+        s = shiki.ShikiStore(tmp_path, version="1")
+
+        downloaded, errors = s.sync(self.CONFIG, workers=4)
+        assert not errors
+        assert set(downloaded) >= {"_lang-html.js", "_lang-glsl.js", "_theme-nord.js"}
+        assert downloaded.index("_lang-html.js") < downloaded.index("_lang-glsl.js") < downloaded.index("_theme-nord.js")
+        assert sorted(name for name, _ in server.requests) == ["c", "css", "glsl", "html", "javascript", "nord"]
+        assert s.verify(self.CONFIG) == {"missing": [], "stale": [], "unreadable": ["_theme-nord.js"], "untracked": [], "dangling": []}
+
+    def test_verify_finds_problems(self, http, tmp_path):
+        shiki, _ = http
+        s = shiki.ShikiStore(tmp_path, version="1")
+        s.sync(self.CONFIG)
+        (tmp_path / "_lang-c.js").unlink()
+        (tmp_path / "_lang-rust.js").write_text("var r;", encoding="utf-8")
+
+        problems = s.verify(self.CONFIG)
+        assert problems["missing"] == ["_lang-glsl.js"]
+        assert problems["unreadable"] == ["_lang-rust.js", "_theme-nord.js"]
+        assert problems["untracked"] == ["_lang-rust.js"]
+        assert problems["dangling"] == ["_lang-c.js"]
+        assert s.unused(self.CONFIG) == ["_lang-rust.js"]
+
+
+@pytest.fixture
+def store_cli(http, monkeypatch):
+    """scripts/store.py, using the shiki module the http fixture points at its server."""
+    spec = importlib.util.spec_from_file_location("store_cli", ROOT / "scripts" / "store.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    monkeypatch.setattr(mod, "load_shiki", lambda: http[0])
+    return mod
+
+
+class TestStoreCli:
+    def config(self, tmp_path, **config):
+        path = tmp_path / "config.json"
+        path.write_text(json.dumps({**TestHttp.CONFIG, **config}), encoding="utf-8")
+        return str(path)
+
+    def run(self, store_cli, capsys, *argv):
+        code = store_cli.main(list(argv))
+        return code, json.loads(capsys.readouterr().out)
+
+    def test_sync_then_verify(self, store_cli, capsys, tmp_path):
+        store = tmp_path / "store"
+        config = self.config(tmp_path)
+        code, report = self.run(store_cli, capsys, "sync", "--dir", str(store), "--config", config, "--jobs", "4")
+        assert code == 0
+        assert report["downloaded"] == ["_lang-html.js", "_lang-glsl.js", "_theme-nord.js", "_theme-dracula.js"]
+
+        code, report = self.run(store_cli, capsys, "verify", "--dir", str(store), "--config", config)
+        assert report["missing"] == [] and report["stale"] == []
+
+        code, report = self.run(store_cli, capsys, "verify", "--dir", str(store), "--config", self.config(tmp_path, languages=["css", "go"]))
+        assert code == 1 and report["missing"] == ["_lang-go.js"]
+
+    def test_cleanup_dry_run_and_size(self, store_cli, capsys, tmp_path):
+        store = tmp_path / "store"
+        self.run(store_cli, capsys, "sync", "--dir", str(store), "--config", self.config(tmp_path))
+        glsl_only = self.config(tmp_path, languages=["glsl"])
+
+        code, report = self.run(store_cli, capsys, "size", "--dir", str(store), "--config", glsl_only)
+        assert report["total"] == report["langs"] + report["themes"] == sum(report["files"].values())
+        assert report["needed"] == report["total"] - sum(report["files"][f"_lang-{n}.js"] for n in ("html", "javascript", "css"))
+
+        code, report = self.run(store_cli, capsys, "cleanup", "--dir", str(store), "--config", glsl_only, "--dry-run")
+        assert sorted(report["removed"]) == ["_lang-css.js", "_lang-html.js", "_lang-javascript.js"]
+        assert (store / "_lang-html.js").exists()
+
+        self.run(store_cli, capsys, "cleanup", "--dir", str(store), "--config", glsl_only)
+        assert not (store / "_lang-html.js").exists()
+        code, report = self.run(store_cli, capsys, "graph", "--dir", str(store), "--config", glsl_only)
+        assert report["graph"] == {"c": [], "glsl": ["c"]}
+
+    def test_failed_sync_exits_nonzero(self, store_cli, capsys, tmp_path):
+        code, report = self.run(store_cli, capsys, "sync", "--dir", str(tmp_path / "s"), "--config", self.config(tmp_path, languages=["nope"]))
+        assert code == 1 and len(report["errors"]) == 1
+
+
+class TestConfig:
+    def manager(self, monkeypatch, config):
+        import sys
+        import types
+
+        reads, writes = [], []
+        manager = types.SimpleNamespace(
+            getConfig=lambda name: reads.append(name) or config,
+            writeConfig=lambda name, value: writes.append(value),
+        )
+        monkeypatch.setitem(sys.modules, "aqt", types.SimpleNamespace(mw=types.SimpleNamespace(addonManager=manager)))
+        return reads, writes
+
+    def test_reads_once(self, shiki, monkeypatch):
+        reads, _ = self.manager(monkeypatch, {"languages": ["rust"]})
+        config = shiki.get_config()
+        config["languages"].append("go")
+        assert shiki.get_config() == {"languages": ["rust"]}
+        assert len(reads) == 1
+
+    def test_set_and_forget(self, shiki, monkeypatch):
+        reads, writes = self.manager(monkeypatch, {"languages": ["rust"]})
+        shiki.set_config({"languages": ["go"]})
+        assert writes == [{"languages": ["go"]}]
+        assert shiki.get_config() == {"languages": ["go"]} and reads == []
+        shiki.forget_config()
+        assert shiki.get_config() == {"languages": ["rust"]} and len(reads) == 1
+
+    def test_defaults_without_anki(self, shiki, monkeypatch):
+        import sys
+
+        monkeypatch.setitem(sys.modules, "aqt", None)
+        assert shiki.get_config() == shiki.DEFAULT_CONFIG
+
+    def test_read_config_file(self, shiki, tmp_path):
+        path = tmp_path / "config.json"
+        path.write_text('{"languages": ["go"], "shallow": true}', encoding="utf-8")
+        config = shiki.read_config(path)
+        assert config["languages"] == ["go"] and config["shallow"] is True
+        assert config["themes"] == shiki.DEFAULT_CONFIG["themes"]
+
+    def test_theme_only_sync(self, shiki, monkeypatch, tmp_path):
+        calls = TestUpgrade.fake(self, shiki, monkeypatch, {"nord": b"var n;", "dracula": b"var d;"})
+        s = shiki.ShikiStore(tmp_path, version="1")
+        downloaded, errors = s.sync(TestHttp.CONFIG, langs=False)
+        assert (downloaded, errors) == (["_theme-nord.js", "_theme-dracula.js"], [])
+        assert len(calls) == 2
+
+
+def theme_module(data: dict) -> str:
+    """A theme module in esm.sh's form."""
+    return f"var t=Object.freeze(JSON.parse({json.dumps(json.dumps(data))}));export{{t as default}};"
+
+
+class TestTokenColors:
+    LIGHT = {
+        "type": "light",
+        "colors": {"editor.foreground": "#24292E"},
+        "tokenColors": [
+            {"scope": "comment", "settings": {"foreground": "#6A737D", "fontStyle": "italic"}},
+            {"scope": "keyword", "settings": {"foreground": "#d73a49"}},
+            {"scope": "invalid", "settings": {"foreground": "var(--red)"}},
+            {"scope": "markup.bold", "settings": {"fontStyle": "bold"}},
+        ],
+    }
+    DARK = {"type": "dark", "settings": [{"settings": {"foreground": "#fff"}}]}
+    CONFIG = {"themes": {"light": "nord", "dark": "dracula"}}
+
+    def test_theme_colors(self, shiki):
+        assert shiki.theme_colors(self.LIGHT) == ["24292e", "333333", "6a737d", "d73a49"]
+        assert shiki.theme_colors(self.DARK) == ["bbbbbb", "fff"]
+
+    def test_token_css(self, shiki):
+        assert shiki.token_css(["24292e"], ["fff"]) == (
+            ".shiki span.l-24292e{color:#24292e}\n"
+            ".anki-md-wrapper.night-mode .shiki span.d-fff{color:#fff}\n"
+        )
+
+    def test_reads_downloaded_themes(self, shiki, tmp_path):
+        s = shiki.ShikiStore(tmp_path)
+        (tmp_path / "_theme-nord.js").write_text(theme_module(self.LIGHT), encoding="utf-8")
+        assert s.token_colors(self.CONFIG) is None
+
+        (tmp_path / "_theme-dracula.js").write_text(theme_module(self.DARK), encoding="utf-8")
+        assert s.token_colors(self.CONFIG) == {"light": ["24292e", "333333", "6a737d", "d73a49"], "dark": ["bbbbbb", "fff"]}
+
+        (tmp_path / "_theme-dracula.js").write_text("var d;", encoding="utf-8")
+        assert s.token_colors(self.CONFIG) is None
+
+
 # Cleanup tests (synthetic files, offline)
 
 
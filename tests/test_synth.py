@@ -0,0 +1,83 @@
+"""Tests for scripts/synth.py — the synthetic deck generator."""
+
+import importlib.util
+import json
+import re
+import sqlite3
+import zipfile
+
+import pytest
+
+from conftest import ROOT
+
+
+@pytest.fixture
+def synth():
+    spec = importlib.util.spec_from_file_location("synth", ROOT / "scripts" / "synth.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def langs(text):
+    fences = re.findall(r"^```(\S+)", text, re.MULTILINE)
+    return set(fences + re.findall(r"`[^`\n]+`\{\.?([^{}\s]+)\}", text))
+
+
+class TestGenerator:
+    def test_deterministic(self, synth):
+        assert list(synth.Generator(seed=7).notes(200)) == list(synth.Generator(seed=7).notes(200))
+        assert list(synth.Generator(seed=7).notes(200)) != list(synth.Generator(seed=8).notes(200))
+
+    def test_mix(self, synth):
+        gen = synth.Generator(seed=1, langs={"rust": 1, "go": 1}, cloze=0.8, decks=3)
+        notes = list(gen.notes(1000))
+        assert 750 < sum(cloze for cloze, *_ in notes) < 850
+        assert set().union(*(langs(f) for _c, fields, *_ in notes for f in fields)) == {"rust", "go"}
+        assert {deck for _c, _f, deck, _t in notes} == {f"Synthetic::Deck {i:03}" for i in (1, 2, 3)}
+
+    def test_cloze_density_is_well_formed(self, synth, checks):
+        def mean(deletions):
+            counts = []
+            for _cloze, fields, *_ in synth.Generator(seed=2, cloze=1, deletions=deletions).notes(300):
+                ords, unclosed = checks.cloze_tags(fields[0])
+                assert unclosed == [] and ords == set(range(1, max(ords) + 1))
+                counts.append(len(ords))
+            return sum(counts) / len(counts)
+
+        assert 1.5 < mean(2) < 2.5
+        assert mean(1) < mean(2) < mean(4)
+
+    def test_length(self, synth):
+        short = sum(len(f[1]) for _c, f, *_ in synth.Generator(seed=3).notes(300))
+        long = sum(len(f[1]) for _c, f, *_ in synth.Generator(seed=3, length=4).notes(300))
+        assert long > 2 * short
+
+
+class TestOutput:
+    def test_apkg(self, synth, tmp_path):
+        out = tmp_path / "deck.apkg"
+        synth.write_apkg(synth.Generator(seed=4, cloze=0.5), 500, out)
+        again = tmp_path / "again.apkg"
+        synth.write_apkg(synth.Generator(seed=4, cloze=0.5), 500, again)
+        assert out.read_bytes() == again.read_bytes()
+
+        with zipfile.ZipFile(out) as z:
+            z.extractall(tmp_path / "x")
+            assert json.loads(z.read("media")) == {"0": "_review.css", "1": "_review.js"}
+        db = sqlite3.connect(tmp_path / "x" / "collection.anki21")
+        models = {int(mid): m["name"] for mid, m in json.loads(db.execute("select models from col").fetchone()[0]).items()}
+        rows = db.execute("select id, mid, flds from notes").fetchall()
+        assert len(rows) == 500
+        assert {models[mid] for _id, mid, _f in rows} == {"Anki Markdown", "Anki Markdown Cloze"}
+        # One card per cloze ordinal
+        expected = sum(len(synth.cloze_ords(f)) if models[mid] == "Anki Markdown Cloze" else 1 for _id, mid, f in rows)
+        assert db.execute("select count(*) from cards").fetchone()[0] == expected
+        decks = json.loads(db.execute("select decks from col").fetchone()[0])
+        assert {str(did) for (did,) in db.execute("select distinct did from cards")} <= set(decks)
+
+    def test_md_imports(self, synth, importer, tmp_path):
+        synth.write_md(synth.Generator(seed=5, decks=2), 250, tmp_path / "md")
+        plan = importer.Importer(tmp_path / "md", tmp_path / "index.json").scan()
+        assert len(plan.add) == 250
+        assert {note["deck"] for note in plan.add} == {"Synthetic::Deck 001", "Synthetic::Deck 002"}
@@ -1,24 +1,62 @@
-import { defineConfig } from "vite";
+import { defineConfig, type Plugin } from "vite";
+import { readdirSync, rmSync, writeFileSync } from "fs";
 
 const target = process.env.BUILD_TARGET || "all";
+const outDir = "anki_markdown";
+
+// Renderer files are content-hashed (_review-<hash>.js, ...) so webviews can
+// cache them forever. Python rewrites template references from assets.json.
+// Lazily imported chunks (_review-<name>-<hash>.js) are only imported by the
+// entry, so they need no template reference; sync_media publishes them too.
+const REVIEW = /^_review(?:-worker)?(?:-[\w-]+)?\.(?:js|css)$/;
+
+function publishAssets(): Plugin {
+  return {
+    name: "publish-assets",
+    buildStart() {
+      for (const file of readdirSync(outDir)) if (REVIEW.test(file)) rmSync(`${outDir}/${file}`);
+    },
+    writeBundle(_options, bundle) {
+      const assets: Record<string, string> = {};
+      for (const file of Object.values(bundle)) {
+        if (file.type === "chunk" && file.isEntry) assets["_review.js"] = file.fileName;
+        else if (file.fileName.endsWith(".css")) assets["_review.css"] = file.fileName;
+      }
+      writeFileSync(`${outDir}/assets.json`, JSON.stringify(assets, null, 2) + "\n");
+    },
+  };
+}
+
+// Keep dynamic imports external - they load from collection.media at runtime
+// Match ./_lang-*.js and ./_theme-*.js dynamic imports
+const media = (id: string) => /^\.\/_(?:lang|theme)-.*\.js$/.test(id);
 
 const renderer = defineConfig({
   build: {
     lib: {
       entry: "src/render.ts",
       formats: ["es"],
-      fileName: () => "_review.js",
     },
-    outDir: "anki_markdown",
+    outDir,
     emptyOutDir: false,
     rollupOptions: {
-      // Keep dynamic imports external - they load from collection.media at runtime
-      external: (id) => {
-        // Match ./_lang-*.js and ./_theme-*.js dynamic imports
-        return /^\.\/_(?:lang|theme)-.*\.js$/.test(id);
+      external: media,
+      output: {
+        entryFileNames: "_review-[hash].js",
+        // Highlighter, transformers, cloze and alerts load when a card needs them
+        chunkFileNames: "_review-[name]-[hash].js",
+        assetFileNames: "_review-[hash][extname]",
       },
+    },
+  },
+  plugins: [publishAssets()],
+  // Optional highlighting worker, published next to the renderer
+  worker: {
+    format: "es",
+    rollupOptions: {
+      external: media,
       output: {
-        assetFileNames: "_review[extname]",
+        entryFileNames: "_review-worker-[hash].js",
         inlineDynamicImports: true,
       },
     },
@@ -32,7 +70,7 @@ const editor = defineConfig({
       formats: ["es"],
       fileName: () => "web/editor.js",
     },
-    outDir: "anki_markdown",
+    outDir,
     emptyOutDir: false,
     rollupOptions: {
       external: (id) => /^(anki|svelte)(\/|$)/.test(id),